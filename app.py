@@ -1,28 +1,59 @@
+import json
 import logging
 import os
 import time
 from urllib.parse import urlparse, urlunparse
 import secrets
 
-from flask import Flask, flash, jsonify, make_response, redirect, render_template, request, session, url_for
+from flask import (
+    Flask, Response, flash, jsonify, make_response, redirect, render_template, request, session,
+    stream_with_context, url_for
+)
 from flask_login import LoginManager, current_user
 from requests_oauthlib import OAuth2Session
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-from config import JOHN_DEERE_AUTHORIZE_URL
+from config import (
+    ALERT_BATCH_MAX_MACHINES, ALERT_MAX_DAYS, BBOX_MAX_MACHINES, DTC_LOOKUP_MAX, ENGINE_HOURS_AVAILABLE_PER_DAY,
+    JOHN_DEERE_API_BASE_URL, JOHN_DEERE_AUTHORIZE_URL, METRICS_TOKEN, MOVEMENT_DEFAULT_DAYS, MOVEMENT_MAX_DAYS,
+    TRAJECTORY_DEFAULT_TOLERANCE, TRAJECTORY_ZOOM_PIXELS, UTILIZATION_DEFAULT_DAYS, UTILIZATION_MAX_DAYS
+)
 from john_deere_api import (
     JOHN_DEERE_CLIENT_ID,
     JOHN_DEERE_CLIENT_SECRET,
     exchange_code_for_token,
+    alert_definition_id,
     fetch_alert_definition,
+    fetch_alert_definitions,
+    fetch_equipment_by_organization,
+    fetch_equipment_items,
     fetch_machine_alerts,
+    fetch_machine_alerts_batch,
     fetch_machine_details,
     fetch_machine_engine_hours,
     fetch_machine_location,
-    fetch_machines_by_organization,
+    fetch_machine_location_history,
+    fetch_machine_overview,
+    fetch_fleet_columns,
     fetch_organizations,
-    get_oauth_session
+    get_oauth_session,
+    iter_location_history_syncs,
+    stored_alerts,
+    sync_location_histories
 )
+from cache import get_cache
+from dtc_catalog import get_catalog
+from engine_hours import PERIODS as UTILIZATION_PERIODS, utilization_report
+from fleet_poller import start_background_poller
+from fleet_snapshot import FleetSnapshot
+from http_pool import get_http_client
+from movement_analytics import fleet_totals, movement_summary
+from spatial_index import MAX_MAP_ZOOM, get_spatial_index, parse_bbox, spatial_index_stats
+from telemetry_store import get_store
+from trajectory import METHODS as TRAJECTORY_METHODS, simplify, tolerance_for_zoom
+from token_manager import get_token_manager
+from upstream import get_scheduler
+from session_store import init_session_store, regenerate_session, session_stats
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", os.urandom(24).hex())
@@ -34,9 +65,36 @@ app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hora
 
+# Sesiones en el servidor: la cookie solo lleva el ID de sesión (ver session_store)
+init_session_store(app)
+
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Poller de flota en segundo plano (solo si FLEET_POLLER_MODE=thread)
+start_background_poller()
+
+@app.before_request
+def refresh_session_token():
+    """Renueva el token de la sesión antes de que expire y guarda el nuevo en la sesión.
+    
+    El refresco (único para todos los workers) lo hace el gestor de tokens; aquí
+    solo se actualiza la cookie para que las siguientes peticiones ya lleven el
+    token nuevo.
+    """
+    token = session.get('oauth_token')
+    if not token or request.endpoint == 'static':
+        return
+    if token.get('access_token') in ['simulated_token_manual', 'test_token']:
+        return
+    try:
+        fresh = get_token_manager().ensure_fresh(token)
+    except Exception as e:
+        logger.warning(f"No se pudo refrescar el token de la sesión: {str(e)}")
+        return
+    if fresh != token:
+        session['oauth_token'] = fresh
+
 def get_base_url():
     """Obtiene la URL base de la aplicación actual, con el protocolo correcto."""
     # Intentar usar X-Forwarded-Proto/Host en entornos como Replit
@@ -61,6 +119,136 @@ def get_full_redirect_uri():
     logger.info(f"URL de redirección calculada: {redirect_uri}")
     return redirect_uri
 
+def wants_links():
+    """True si la petición pide los links de la API de cada máquina (?include=links)."""
+    return 'links' in request.args.get('include', '').split(',')
+
+def user_can_access_organization(token, organization_id):
+    """Comprueba que la organización está entre las del usuario (lista cacheada)."""
+    organizations = fetch_organizations(token)
+    return any(str(org.get('id')) == str(organization_id) for org in organizations)
+
+def read_fleet_from_store(organization_id):
+    """Devuelve (FleetSnapshot, edad) desde el almacén del poller, o (None, None)."""
+    try:
+        store = get_store()
+        machines = store.get_fleet(organization_id, with_links=False)
+        if machines is None:
+            return None, None
+        return FleetSnapshot.from_machines(machines), time.time() - store.fleet_synced_at(organization_id)
+    except Exception as e:
+        logger.warning(f"No se pudo leer la flota del almacén local: {str(e)}")
+        return None, None
+
+def read_machines_from_store(token, machine_ids, reader, organizations=None):
+    """Lee datos por máquina del almacén local, solo para máquinas de organizaciones del usuario.
+    
+    Devuelve {machine_id: valor} con las máquinas que tenían copia reciente.
+    `organizations` evita consultar la lista del usuario si ya se tiene (modo async).
+    """
+    try:
+        store = get_store()
+        machine_orgs = store.get_machine_organizations(machine_ids)
+        if not machine_orgs:
+            return {}
+        if organizations is None:
+            organizations = fetch_organizations(token)
+        allowed_orgs = {str(org.get('id')) for org in organizations}
+        result = {}
+        for machine_id in machine_ids:
+            if machine_orgs.get(str(machine_id)) in allowed_orgs:
+                value = reader(store, machine_id)
+                if value is not None:
+                    result[machine_id] = value
+        return result
+    except Exception as e:
+        logger.warning(f"No se pudieron leer datos del almacén local: {str(e)}")
+        return {}
+
+def parse_days_back(value, default=30):
+    """Días de alertas pedidos (1..ALERT_MAX_DAYS); lanza ValueError si no es válido."""
+    if value is None or value == '':
+        return default
+    days_back = int(value)
+    if not 1 <= days_back <= ALERT_MAX_DAYS:
+        raise ValueError(f"'days_back' debe estar entre 1 y {ALERT_MAX_DAYS}")
+    return days_back
+
+def parse_bbox_args(args):
+    """(rectángulo, límite) de ?minLat&minLon&maxLat&maxLon[&limit]; lanza ValueError si no son válidos."""
+    names = ('minLat', 'minLon', 'maxLat', 'maxLon')
+    missing = [name for name in names if not args.get(name)]
+    if missing:
+        raise ValueError(f"Faltan parámetros: {', '.join(missing)}")
+    bbox = parse_bbox(*(args.get(name) for name in names))
+    limit = args.get('limit')
+    if limit is None or limit == '':
+        return bbox, BBOX_MAX_MACHINES
+    limit = int(limit)
+    if not 1 <= limit <= BBOX_MAX_MACHINES:
+        raise ValueError(f"'limit' debe estar entre 1 y {BBOX_MAX_MACHINES}")
+    return bbox, limit
+
+def load_fleet_snapshot(token, organization_id):
+    """(FleetSnapshot, edad, estado de caché) de una organización.
+
+    Primero el almacén local que mantiene el poller de flota; si no, la última
+    instantánea conocida, que si está expirada se refresca en segundo plano
+    (un único refresco por organización).
+    """
+    snapshot, data_age = read_fleet_from_store(organization_id)
+    if snapshot is not None:
+        return snapshot, data_age, 'store'
+    logger.info(f"Obteniendo máquinas para la organización {organization_id}")
+    columns, data_age, cache_state = get_cache().get_stale_while_revalidate(
+        'machines',
+        (organization_id, 'columns'),
+        lambda: fetch_fleet_columns(token, organization_id)
+    )
+    return FleetSnapshot.from_columns(columns), data_age, cache_state
+
+def parse_cluster_args(args):
+    """(zoom, rectángulo) de ?zoom&bbox=minLon,minLat,maxLon,maxLat; lanza ValueError si no son válidos."""
+    zoom = args.get('zoom')
+    if zoom is None or zoom == '':
+        raise ValueError("Falta el parámetro 'zoom'")
+    try:
+        zoom = int(float(zoom))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("'zoom' debe ser un número")
+    if not 0 <= zoom <= MAX_MAP_ZOOM:
+        raise ValueError(f"'zoom' debe estar entre 0 y {MAX_MAP_ZOOM}")
+    bbox = args.get('bbox', '').split(',')
+    if len(bbox) != 4:
+        raise ValueError("'bbox' debe ser minLon,minLat,maxLon,maxLat")
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return zoom, parse_bbox(min_lat, min_lon, max_lat, max_lon)
+
+def machine_clusters(organization_id, snapshot, zoom, bbox):
+    """Clusters y máquinas sueltas de la vista (como mucho BBOX_MAX_MACHINES sueltas)."""
+    index = get_spatial_index(organization_id)
+    index.sync(snapshot)
+    clusters, singles = index.clusters(zoom, *bbox)
+    positions = sorted(
+        position for position in (snapshot.position(machine_id) for machine_id in singles) if position is not None
+    )
+    return {
+        'zoom': zoom,
+        'clusters': clusters,
+        'machines': [snapshot.machine(position) for position in positions[:BBOX_MAX_MACHINES]],
+        'total': sum(cluster['count'] for cluster in clusters) + len(positions)
+    }
+
+def machines_in_bbox(organization_id, snapshot, bbox, limit):
+    """Posiciones en la instantánea de las máquinas dentro del rectángulo (como mucho limit) y total."""
+    index = get_spatial_index(organization_id)
+    index.sync(snapshot)
+    positions = sorted(
+        position for position in (snapshot.position(machine_id) for machine_id in index.query(*bbox))
+        if position is not None
+    )
+    return positions[:limit], len(positions)
+
 @app.route('/')
 def index():
     """Landing page that checks if user is authenticated and redirects accordingly."""
@@ -185,7 +373,8 @@ def callback():
             # Intercambiar código por token de acceso
             token = exchange_code_for_token(code, redirect_uri=redirect_uri)
             
-            # Guardar el token en la sesión
+            # Guardar el token en la sesión, con un ID de sesión nuevo (evita la fijación de sesión)
+            regenerate_session(session)
             session['oauth_token'] = token
             # Guardar el código para referencia (solo para depuración)
             session['last_auth_code'] = code
@@ -238,7 +427,8 @@ def auth_complete():
         # Intercambiar código por token de acceso
         token = exchange_code_for_token(code, redirect_uri=redirect_uri)
         
-        # Guardar el token en la sesión
+        # Guardar el token en la sesión, con un ID de sesión nuevo (evita la fijación de sesión)
+        regenerate_session(session)
         session['oauth_token'] = token
         # Guardar el código para referencia (solo para depuración)
         session['last_auth_code'] = code
@@ -288,75 +478,280 @@ def location_history():
         flash(f"Error al cargar el historial de ubicaciones: {str(e)}", "danger")
         return render_template('error.html', error=str(e))
 
+def date_range_bounds(start_date, end_date):
+    """Convierte fechas 'YYYY-MM-DD' en los límites ISO (UTC) del rango, inclusive."""
+    from datetime import datetime
+    start = end = None
+    if start_date:
+        start = datetime.strptime(start_date, '%Y-%m-%d').strftime('%Y-%m-%dT00:00:00.000Z')
+    if end_date:
+        end = datetime.strptime(end_date, '%Y-%m-%d').strftime('%Y-%m-%dT23:59:59.999Z')
+    return start, end
+
+def location_history_record(machine, latest, with_history):
+    """Construye el registro de historial de una máquina, o None si queda fuera del rango."""
+    machine_id = str(machine.get('id'))
+    point = latest.get(machine_id)
+    
+    # Las máquinas con historial pero sin puntos en el rango se omiten;
+    # las que no tienen ningún punto se incluyen sin ubicación
+    if point is None and machine_id in with_history:
+        return None
+    
+    return {
+        'id': machine.get('id'),
+        'vin': machine.get('serialNumber') or machine.get('id'),
+        'name': machine.get('name'),
+        'timestamp': point['timestamp'] if point else None,
+        'latitude': point['latitude'] if point else None,
+        'longitude': point['longitude'] if point else None
+    }
+
+def with_serial_numbers(token, machines):
+    """Añade el serialNumber de cada equipo (llamadas /isg/equipment?ids= por lotes, o ninguna si está en caché)."""
+    try:
+        items = fetch_equipment_items(token, [machine.get('id') for machine in machines])
+    except Exception as e:
+        logger.warning(f"No se pudieron obtener los números de serie de los equipos: {str(e)}")
+        return machines
+    return [
+        dict(machine, serialNumber=items.get(str(machine.get('id')), {}).get('serialNumber'))
+        for machine in machines
+    ]
+
+def wants_ndjson_stream():
+    """True si el cliente pide la respuesta como NDJSON en streaming."""
+    return request.args.get('stream') in ('1', 'true', 'ndjson') or \
+        'application/x-ndjson' in request.headers.get('Accept', '')
+
 @app.route('/api/location-history/<organization_id>')
 def get_location_history(organization_id):
-    """API endpoint to get location history for all machines in an organization."""
+    """API endpoint to get location history for all machines in an organization.
+    
+    Devuelve el último punto de cada máquina dentro del rango de fechas. Los
+    puntos salen del almacén local de locationHistory, que solo se completa
+    con los puntos nuevos de cada máquina.
+    
+    Con ?stream=1 (o Accept: application/x-ndjson) la respuesta es NDJSON: una
+    línea por máquina, enviada en cuanto su historial está al día.
+    """
     if 'oauth_token' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
     try:
-        from datetime import datetime
         token = session.get('oauth_token')
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        
-        machines = fetch_machines_by_organization(token, organization_id)
+        try:
+            start, end = date_range_bounds(request.args.get('start_date'), request.args.get('end_date'))
+        except ValueError:
+            return jsonify({'error': "Formato de fecha inválido, se espera YYYY-MM-DD"}), 400
         
-        location_history = []
+        machines = with_serial_numbers(token, fetch_equipment_by_organization(token, organization_id))
+        machine_ids = [machine.get('id') for machine in machines if machine.get('id')]
         logger.info(f"Procesando {len(machines)} máquinas para historial de ubicaciones")
         
+        if wants_ndjson_stream():
+            machines_by_id = {str(machine.get('id')): machine for machine in machines if machine.get('id')}
+            
+            def generate():
+                # Máquinas sin ID: no tienen historial que esperar
+                for machine in machines:
+                    if not machine.get('id'):
+                        yield json.dumps(location_history_record(machine, {}, set())) + '\n'
+                
+                store = get_store()
+                for machine_id, _requested in iter_location_history_syncs(token, machine_ids):
+                    latest, with_history = store.get_latest_points([machine_id], start, end)
+                    record = location_history_record(machines_by_id[str(machine_id)], latest, with_history)
+                    if record is not None:
+                        yield json.dumps(record) + '\n'
+            
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        # Pedir a la API solo lo que falta y responder desde el índice (machine_id, eventTimestamp)
+        sync_location_histories(token, machine_ids)
+        latest, with_history = get_store().get_latest_points(machine_ids, start, end)
+        
+        location_history = []
         for machine in machines:
-            # Incluir todas las máquinas, con o sin ubicación
-            machine_data = {
+            record = location_history_record(machine, latest, with_history)
+            if record is not None:
+                location_history.append(record)
+        
+        return jsonify(location_history)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def parse_day_range(start_date, end_date, default_days, max_days):
+    """(primer día, último día) de ?start_date y ?end_date; lanza ValueError si no son válidos.
+    
+    Sin fechas, los últimos `default_days` días hasta hoy (UTC).
+    """
+    from datetime import datetime, timedelta, timezone
+    try:
+        last_day = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else datetime.now(timezone.utc).date()
+        first_day = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else \
+            last_day - timedelta(days=default_days - 1)
+    except ValueError:
+        raise ValueError("Formato de fecha inválido, se espera YYYY-MM-DD")
+    if first_day > last_day:
+        raise ValueError("'start_date' no puede ser posterior a 'end_date'")
+    if (last_day - first_day).days + 1 > max_days:
+        raise ValueError(f"El rango no puede superar {max_days} días")
+    return first_day, last_day
+
+@app.route('/api/location-history/<organization_id>/summary')
+def get_location_history_summary(organization_id):
+    """Resumen de movimiento de las máquinas de una organización en un rango de fechas.
+    
+    ?start_date y ?end_date (YYYY-MM-DD, por defecto los últimos
+    MOVEMENT_DEFAULT_DAYS días). Para cada máquina: distancia recorrida, tiempo
+    en movimiento, parado y en campo, tramos y velocidad máxima y media,
+    calculados sobre los puntos de locationHistory guardados (ver
+    movement_analytics.py); además, los totales de la flota.
+    """
+    if 'oauth_token' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    try:
+        first_day, last_day = parse_day_range(
+            request.args.get('start_date'), request.args.get('end_date'), MOVEMENT_DEFAULT_DAYS, MOVEMENT_MAX_DAYS
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        token = session.get('oauth_token')
+        machines = with_serial_numbers(token, fetch_equipment_by_organization(token, organization_id))
+        machines = [machine for machine in machines if machine.get('id')]
+        machine_ids = [machine.get('id') for machine in machines]
+        sync_location_histories(token, machine_ids)
+        
+        started = time.perf_counter()
+        summaries = movement_summary(get_store(), machine_ids, first_day, last_day)
+        logger.info(
+            f"Resumen de movimiento de {len(machine_ids)} máquinas ({first_day} a {last_day}) "
+            f"en {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+        records = [
+            {
+                'id': machine.get('id'),
                 'vin': machine.get('serialNumber') or machine.get('id'),
                 'name': machine.get('name'),
-                'timestamp': None,
-                'latitude': None,
-                'longitude': None
+                **summaries[str(machine.get('id'))]
             }
-            
-            if machine.get('location'):
-                timestamp = machine.get('location', {}).get('timestamp')
-                if timestamp:
-                    try:
-                        # Parsear la fecha para validar el formato
-                        try:
-                            location_date = datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%S.%fZ')
-                        except ValueError:
-                            # Intentar otro formato común
-                            location_date = datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%SZ')
-                        
-                        # Verificar si la fecha está dentro del rango
-                        should_include = True
-                        if start_date:
-                            start = datetime.strptime(start_date, '%Y-%m-%d')
-                            if location_date.date() < start.date():
-                                should_include = False
-                                
-                        if end_date and should_include:
-                            end = datetime.strptime(end_date, '%Y-%m-%d')
-                            end = end.replace(hour=23, minute=59, second=59)
-                            if location_date > end:
-                                should_include = False
-                        
-                        # Actualizar datos de ubicación
-                        machine_data.update({
-                            'timestamp': timestamp,
-                            'latitude': machine.get('location', {}).get('latitude'),
-                            'longitude': machine.get('location', {}).get('longitude')
-                        })
-                        
-                        # Si no cumple con los filtros de fecha, saltamos esta máquina
-                        if not should_include:
-                            continue
-                    except (ValueError, TypeError) as e:
-                        logger.error(f"Error processing date for machine {machine.get('id')}: {str(e)}")
-            
-            # Agregar la máquina al historial
-            location_history.append(machine_data)
+            for machine in machines
+        ]
+        return jsonify({
+            'start_date': first_day.isoformat(),
+            'end_date': last_day.isoformat(),
+            'machines': records,
+            'totals': fleet_totals(summaries.values())
+        })
+    except Exception as e:
+        logger.error(f"Error calculando el resumen de movimiento de la organización {organization_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def sync_machine_history(token, machine_id):
+    """Pone al día el historial guardado de una máquina; False si el usuario no tiene acceso."""
+    # Los puntos guardados pueden venir de otro usuario: comprobar el acceso
+    machine_org = get_store().get_machine_organizations([machine_id]).get(str(machine_id))
+    if machine_org is not None:
+        if not user_can_access_organization(token, machine_org):
+            return False
+        sync_location_histories(token, [machine_id])
+    else:
+        # Máquina desconocida: la propia API valida el acceso con el token del usuario
+        fetch_machine_location_history(token, machine_id)
+    return True
+
+def parse_trajectory_args(args):
+    """(método, tolerancia en metros o None, zoom o None); lanza ValueError si no son válidos."""
+    method = args.get('method', 'dp')
+    if method not in TRAJECTORY_METHODS:
+        raise ValueError(f"'method' debe ser uno de: {', '.join(TRAJECTORY_METHODS)}")
+    if args.get('zoom'):
+        zoom = int(args['zoom'])
+        if not 0 <= zoom <= MAX_MAP_ZOOM:
+            raise ValueError(f"'zoom' debe estar entre 0 y {MAX_MAP_ZOOM}")
+        return method, None, zoom
+    tolerance = float(args.get('tolerance') or TRAJECTORY_DEFAULT_TOLERANCE)
+    if not 0 <= tolerance < float('inf'):
+        raise ValueError("'tolerance' debe ser un número de metros positivo")
+    return method, tolerance, None
+
+@app.route('/api/machine/<machine_id>/location-history')
+def get_machine_location_history(machine_id):
+    """API endpoint con todos los puntos guardados de una máquina en un rango de fechas."""
+    if 'oauth_token' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    try:
+        token = session.get('oauth_token')
+        try:
+            start, end = date_range_bounds(request.args.get('start_date'), request.args.get('end_date'))
+        except ValueError:
+            return jsonify({'error': "Formato de fecha inválido, se espera YYYY-MM-DD"}), 400
         
-        return jsonify(location_history)
+        if not sync_machine_history(token, machine_id):
+            return jsonify({'error': f'No tiene acceso a la máquina {machine_id}.'}), 403
+        
+        points = get_store().get_location_points(machine_id, start, end)
+        return jsonify({'machine_id': machine_id, 'points': points})
+    except Exception as e:
+        logger.error(f"Error obteniendo historial de la máquina {machine_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/machine/<machine_id>/trajectory')
+def get_machine_trajectory(machine_id):
+    """Recorrido simplificado de una máquina en un rango de fechas, para dibujarlo como polilínea.
+    
+    ?start_date y ?end_date (YYYY-MM-DD), ?method=dp|vw (Douglas-Peucker por
+    defecto) y la tolerancia en metros (?tolerance) o el zoom del mapa (?zoom,
+    TRAJECTORY_ZOOM_PIXELS píxeles a ese zoom). El resultado se guarda en la
+    caché con el último punto de la máquina en la clave, así que se recalcula
+    cuando llegan puntos nuevos.
+    """
+    if 'oauth_token' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    try:
+        start, end = date_range_bounds(request.args.get('start_date'), request.args.get('end_date'))
+    except ValueError:
+        return jsonify({'error': "Formato de fecha inválido, se espera YYYY-MM-DD"}), 400
+    try:
+        method, tolerance, zoom = parse_trajectory_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        token = session.get('oauth_token')
+        if not sync_machine_history(token, machine_id):
+            return jsonify({'error': f'No tiene acceso a la máquina {machine_id}.'}), 403
+        store = get_store()
+        
+        def load():
+            points = store.get_location_points(machine_id, start, end)
+            used_tolerance = tolerance
+            if used_tolerance is None:
+                latitude = points[0]['latitude'] if points else 0
+                used_tolerance = tolerance_for_zoom(zoom, latitude, TRAJECTORY_ZOOM_PIXELS)
+            started = time.perf_counter()
+            simplified = simplify(points, used_tolerance, method)
+            logger.info(
+                f"Trayectoria de la máquina {machine_id}: {len(points)} -> {len(simplified)} puntos "
+                f"({method}, {used_tolerance:.2f} m) en {(time.perf_counter() - started) * 1000:.0f} ms"
+            )
+            return {'original_points': len(points), 'tolerance': round(used_tolerance, 3), 'points': simplified}
+        
+        result = get_cache().get_or_load(
+            'trajectory',
+            (machine_id, start, end, method, tolerance if zoom is None else f"z{zoom}",
+             store.latest_point_timestamp(machine_id)),
+            load
+        )
+        return jsonify({'machine_id': machine_id, 'method': method, **result})
     except Exception as e:
+        logger.error(f"Error obteniendo la trayectoria de la máquina {machine_id}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/dashboard')
@@ -438,7 +833,11 @@ def dashboard():
 
 @app.route('/api/machines/<organization_id>')
 def get_machines(organization_id):
-    """API endpoint to get machines for a specific organization."""
+    """API endpoint to get machines for a specific organization.
+    
+    Las máquinas se guardan y se sirven como FleetSnapshot (por columnas, sin
+    links); con ?include=links cada máquina lleva también los links de la API.
+    """
     if 'oauth_token' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
@@ -450,16 +849,27 @@ def get_machines(organization_id):
             if token.get('access_token') in ['simulated_token_manual', 'test_token']:
                 return jsonify({'error': 'Modo de desarrollo: Se está utilizando un token simulado. Para conectar con datos reales, por favor autentíquese con credenciales válidas de John Deere.'}), 401
                 
-            # Intentar obtener máquinas reales desde la API de John Deere
-            logger.info(f"Obteniendo máquinas reales para la organización {organization_id}")
-            machines = fetch_machines_by_organization(token, organization_id)
-            logger.info(f"Máquinas obtenidas: {len(machines)}")
+            # La instantánea se comparte entre usuarios de la misma organización,
+            # así que antes comprobamos que el usuario tiene acceso a ella
+            if not user_can_access_organization(token, organization_id):
+                return jsonify({'error': f'No tiene acceso a la organización {organization_id}.'}), 403
             
-            if not machines:
+            snapshot, data_age, cache_state = load_fleet_snapshot(token, organization_id)
+            logger.info(f"Máquinas obtenidas: {len(snapshot)} (caché: {cache_state}, edad: {data_age:.0f}s)")
+            
+            if not len(snapshot):
                 logger.warning(f"No se obtuvieron máquinas para la organización {organization_id}")
-                # Retornar lista vacía pero con mensaje informativo
-                return jsonify([])
-                
+            
+            links = None
+            if wants_links():
+                if cache_state == 'store':
+                    links = get_store().get_machine_links(organization_id)
+                else:
+                    links = {
+                        str(machine.get('id')): machine.get('links', [])
+                        for machine in fetch_equipment_by_organization(token, organization_id)
+                    }
+            
         except Exception as m_error:
             logger.error(f"Error fetching machines from API: {str(m_error)}")
             error_msg = str(m_error)
@@ -474,11 +884,166 @@ def get_machines(organization_id):
                 
             # No usamos datos simulados, solo retornamos el error
         
-        return jsonify(machines)
+        response = app.response_class(snapshot.to_json(links) + '\n', mimetype='application/json')
+        response.headers['X-Data-Age'] = str(int(data_age))
+        response.headers['X-Cache'] = cache_state
+        return response
     except Exception as e:
         logger.error(f"Error general en get_machines: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/machines/<organization_id>/in-bbox')
+def get_machines_in_bbox(organization_id):
+    """Máquinas de la organización cuya última ubicación está dentro del rectángulo.
+    
+    ?minLat&minLon&maxLat&maxLon en grados (minLon > maxLon si cruza el
+    antimeridiano) y ?limit opcional. Usa el índice espacial del proceso, que
+    se pone al día con la misma instantánea que /api/machines/<org>.
+    """
+    if 'oauth_token' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    try:
+        bbox, limit = parse_bbox_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    token = session.get('oauth_token')
+    if token.get('access_token') in ['simulated_token_manual', 'test_token']:
+        return jsonify({'error': 'Modo de desarrollo: Se está utilizando un token simulado. Para conectar con datos reales, por favor autentíquese con credenciales válidas de John Deere.'}), 401
+    
+    try:
+        if not user_can_access_organization(token, organization_id):
+            return jsonify({'error': f'No tiene acceso a la organización {organization_id}.'}), 403
+        snapshot, data_age, cache_state = load_fleet_snapshot(token, organization_id)
+        positions, total = machines_in_bbox(organization_id, snapshot, bbox, limit)
+    except Exception as e:
+        logger.error(f"Error fetching machines in bbox: {str(e)}")
+        error_msg = str(e)
+        if "401" in error_msg:
+            return jsonify({'error': 'Error de autenticación (401): No autorizado para acceder a la API de John Deere.'}), 401
+        elif "404" in error_msg:
+            return jsonify({'error': 'Error 404: El recurso solicitado no existe en la API de John Deere.'}), 404
+        return jsonify({'error': f'Error al obtener máquinas: {error_msg}'}), 500
+    
+    logger.info(f"Máquinas en el rectángulo {bbox}: {total} de {len(snapshot)} (devueltas: {len(positions)})")
+    response = app.response_class(snapshot.to_json(indexes=positions) + '\n', mimetype='application/json')
+    response.headers['X-Fleet-Size'] = str(len(snapshot))
+    response.headers['X-Total-Count'] = str(total)
+    response.headers['X-Data-Age'] = str(int(data_age))
+    response.headers['X-Cache'] = cache_state
+    return response
+
+@app.route('/api/machines/<organization_id>/clusters')
+def get_machine_clusters(organization_id):
+    """Máquinas de la vista agrupadas según el zoom del mapa.
+    
+    ?zoom (0-22) y ?bbox=minLon,minLat,maxLon,maxLat. Devuelve los clusters de
+    la vista (centro, número de máquinas y zoom al que se separan) y las
+    máquinas que a ese zoom no se agrupan con ninguna otra.
+    """
+    if 'oauth_token' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    try:
+        zoom, bbox = parse_cluster_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    token = session.get('oauth_token')
+    if token.get('access_token') in ['simulated_token_manual', 'test_token']:
+        return jsonify({'error': 'Modo de desarrollo: Se está utilizando un token simulado. Para conectar con datos reales, por favor autentíquese con credenciales válidas de John Deere.'}), 401
+    
+    try:
+        if not user_can_access_organization(token, organization_id):
+            return jsonify({'error': f'No tiene acceso a la organización {organization_id}.'}), 403
+        snapshot, data_age, cache_state = load_fleet_snapshot(token, organization_id)
+        result = machine_clusters(organization_id, snapshot, zoom, bbox)
+    except Exception as e:
+        logger.error(f"Error fetching machine clusters: {str(e)}")
+        error_msg = str(e)
+        if "401" in error_msg:
+            return jsonify({'error': 'Error de autenticación (401): No autorizado para acceder a la API de John Deere.'}), 401
+        elif "404" in error_msg:
+            return jsonify({'error': 'Error 404: El recurso solicitado no existe en la API de John Deere.'}), 404
+        return jsonify({'error': f'Error al obtener máquinas: {error_msg}'}), 500
+    
+    logger.info(
+        f"Clusters a zoom {zoom}: {len(result['clusters'])} clusters y {len(result['machines'])} máquinas "
+        f"({result['total']} de {len(snapshot)})"
+    )
+    response = jsonify(result)
+    response.headers['X-Fleet-Size'] = str(len(snapshot))
+    response.headers['X-Data-Age'] = str(int(data_age))
+    response.headers['X-Cache'] = cache_state
+    return response
+
+def parse_utilization_args(args):
+    """(periodo, primer día, último día) de ?period, ?start_date y ?end_date; lanza ValueError si no son válidos."""
+    period = args.get('period', 'day')
+    if period not in UTILIZATION_PERIODS:
+        raise ValueError(f"'period' debe ser uno de: {', '.join(UTILIZATION_PERIODS)}")
+    first_day, last_day = parse_day_range(
+        args.get('start_date'), args.get('end_date'), UTILIZATION_DEFAULT_DAYS, UTILIZATION_MAX_DAYS
+    )
+    return period, first_day, last_day
+
+def organization_utilization(snapshot, period, first_day, last_day):
+    """Respuesta de /api/utilization/<org>: utilización por periodo de cada máquina y de la flota."""
+    by_machine, totals = utilization_report(get_store(), snapshot.ids, period, first_day, last_day)
+    return {
+        'period': period,
+        'start_date': first_day.isoformat(),
+        'end_date': last_day.isoformat(),
+        'available_hours_per_day': ENGINE_HOURS_AVAILABLE_PER_DAY,
+        'machines': [
+            {'id': machine_id, 'name': name, **by_machine[str(machine_id)]}
+            for machine_id, name in zip(snapshot.ids, snapshot.names)
+        ],
+        'totals': totals
+    }
+
+@app.route('/api/utilization/<organization_id>')
+def get_organization_utilization(organization_id):
+    """Utilización (horas de motor) de las máquinas de una organización por día, semana o mes.
+    
+    ?period=day|week|month y ?start_date/?end_date (YYYY-MM-DD, por defecto los
+    últimos UTILIZATION_DEFAULT_DAYS días). Se responde con los acumulados de
+    las lecturas de horómetro guardadas (ver engine_hours.py), sin una llamada
+    a la API por máquina.
+    """
+    if 'oauth_token' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    try:
+        period, first_day, last_day = parse_utilization_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    token = session.get('oauth_token')
+    try:
+        if not user_can_access_organization(token, organization_id):
+            return jsonify({'error': f'No tiene acceso a la organización {organization_id}.'}), 403
+        snapshot, data_age, cache_state = load_fleet_snapshot(token, organization_id)
+        result = organization_utilization(snapshot, period, first_day, last_day)
+    except Exception as e:
+        logger.error(f"Error obteniendo la utilización de la organización {organization_id}: {str(e)}")
+        error_msg = str(e)
+        if "401" in error_msg:
+            return jsonify({'error': 'Error de autenticación (401): No autorizado para acceder a la API de John Deere.'}), 401
+        elif "404" in error_msg:
+            return jsonify({'error': 'Error 404: El recurso solicitado no existe en la API de John Deere.'}), 404
+        return jsonify({'error': f'Error al obtener la utilización: {error_msg}'}), 500
+    
+    logger.info(
+        f"Utilización de {len(snapshot)} máquinas por {period} ({first_day} a {last_day}): "
+        f"{result['totals']['machines_with_readings']} con lecturas"
+    )
+    response = jsonify(result)
+    response.headers['X-Data-Age'] = str(int(data_age))
+    response.headers['X-Cache'] = cache_state
+    return response
+
 @app.route('/api/machine/<machine_id>')
 def get_machine_details(machine_id):
     """API endpoint to get details for a specific machine."""
@@ -518,15 +1083,74 @@ def get_machine_details(machine_id):
         logger.error(f"Error general en get_machine_details: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/machine/<machine_id>/overview')
+def get_machine_overview(machine_id):
+    """API endpoint with details, location, engine hours and alerts of a machine in one response.
+    
+    Las consultas a John Deere se hacen en paralelo; el equipo se reutiliza de la
+    caché si ya se listó la organización, y las alertas y el horómetro se leen del
+    almacén local cuando el poller los tiene.
+    """
+    if 'oauth_token' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    try:
+        token = session.get('oauth_token')
+        
+        # Verificar si estamos usando un token simulado o de prueba
+        if token.get('access_token') in ['simulated_token_manual', 'test_token']:
+            return jsonify({'error': 'Modo de desarrollo: Se está utilizando un token simulado. Para conectar con datos reales, por favor autentíquese con credenciales válidas de John Deere.'}), 401
+        
+        organizations = fetch_organizations(token)
+        alerts_in_store = read_machines_from_store(token, [machine_id], stored_alerts, organizations)
+        stored_hours = read_machines_from_store(token, [machine_id], lambda store, m: store.get_engine_hours(m), organizations)
+        
+        try:
+            overview = fetch_machine_overview(
+                token, machine_id,
+                include_alerts=machine_id not in alerts_in_store,
+                include_engine_hours=machine_id not in stored_hours
+            )
+        except Exception as mo_error:
+            error_msg = str(mo_error)
+            
+            # Personalizar respuesta según el tipo de error
+            if "401" in error_msg:
+                return jsonify({'error': 'Error de autenticación (401): No autorizado para acceder a la API de John Deere.'}), 401
+            elif "404" in error_msg:
+                return jsonify({'error': f'Error 404: No se encontró la máquina con ID {machine_id} en la API de John Deere.'}), 404
+            else:
+                return jsonify({'error': f'Error al obtener detalles de la máquina: {error_msg}'}), 500
+        
+        if machine_id in alerts_in_store:
+            overview['alerts'] = alerts_in_store[machine_id]
+        if machine_id in stored_hours:
+            overview['engineHours'] = stored_hours[machine_id]
+        overview['alerts'] = overview['alerts'] or []
+        
+        return jsonify(overview)
+    except Exception as e:
+        logger.error(f"Error general en get_machine_overview: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/machine/<machine_id>/alerts')
 def get_machine_alerts(machine_id):
-    """API endpoint to get alerts for a specific machine."""
+    """API endpoint to get alerts for a specific machine.
+    
+    Acepta ?days_back=N (por defecto 30, máximo ALERT_MAX_DAYS). Solo se piden a
+    John Deere las alertas nuevas desde la última sincronización de la máquina.
+    """
     logger.info(f"INICIO endpoint get_machine_alerts para máquina: {machine_id}")
     
     if 'oauth_token' not in session:
         logger.error("No hay token OAuth en la sesión")
         return jsonify({'error': 'Not authenticated'}), 401
     
+    try:
+        days_back = parse_days_back(request.args.get('days_back'))
+    except ValueError as e:
+        return jsonify({'error': f"Parámetro 'days_back' no válido: {str(e)}"}), 400
+    
     try:
         token = session.get('oauth_token')
         logger.info(f"Token presente: {bool(token)}")
@@ -537,9 +1161,13 @@ def get_machine_alerts(machine_id):
                 logger.warning("Usando token simulado")
                 return jsonify({'error': 'Modo de desarrollo: Se está utilizando un token simulado. Para conectar con datos reales, por favor autentíquese con credenciales válidas de John Deere.'}), 401
                 
-            # Intentar obtener alertas reales desde la API de John Deere
-            logger.info(f"Obteniendo alertas reales para la máquina {machine_id}")
-            alerts = fetch_machine_alerts(token, machine_id)
+            # Intentar primero el almacén local; si no, la API de John Deere
+            stored = read_machines_from_store(token, [machine_id], lambda store, m: stored_alerts(store, m, days_back))
+            if machine_id in stored:
+                alerts = stored[machine_id]
+            else:
+                logger.info(f"Obteniendo alertas reales para la máquina {machine_id}")
+                alerts = fetch_machine_alerts(token, machine_id, days_back=days_back)
             
             if not alerts:
                 logger.warning(f"No se encontraron alertas para la máquina {machine_id}")
@@ -564,6 +1192,49 @@ def get_machine_alerts(machine_id):
         logger.error(f"Error general en get_machine_alerts: {str(e)}")
         return jsonify({'error': str(e)}), 500
         
+@app.route('/api/alerts/batch', methods=['POST'])
+def get_alerts_batch():
+    """API endpoint to get alerts for many machines in a single request.
+    
+    Espera un JSON {"machine_ids": [...], "days_back": N (opcional)} y devuelve
+    {machine_id: [alertas]}. Las consultas a John Deere se hacen en paralelo en el servidor.
+    """
+    if 'oauth_token' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    payload = request.get_json(silent=True) or {}
+    machine_ids = payload.get('machine_ids')
+    if not isinstance(machine_ids, list) or not all(isinstance(m, (str, int)) for m in machine_ids):
+        return jsonify({'error': "Se requiere 'machine_ids' como lista de IDs"}), 400
+    if len(machine_ids) > ALERT_BATCH_MAX_MACHINES:
+        return jsonify({'error': f'Se admiten como máximo {ALERT_BATCH_MAX_MACHINES} máquinas por petición'}), 400
+    try:
+        days_back = parse_days_back(payload.get('days_back'))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f"Parámetro 'days_back' no válido: {str(e)}"}), 400
+    
+    try:
+        token = session.get('oauth_token')
+        
+        # Verificar si estamos usando un token simulado o de prueba
+        if token.get('access_token') in ['simulated_token_manual', 'test_token']:
+            return jsonify({'error': 'Modo de desarrollo: Se está utilizando un token simulado. Para conectar con datos reales, por favor autentíquese con credenciales válidas de John Deere.'}), 401
+        
+        machine_ids = [str(m) for m in machine_ids]
+        
+        # Las máquinas sincronizadas por el poller se leen del almacén local
+        alerts_by_machine = read_machines_from_store(token, machine_ids, lambda store, m: stored_alerts(store, m, days_back))
+        missing = [m for m in machine_ids if m not in alerts_by_machine]
+        
+        logger.info(f"Obteniendo alertas en lote para {len(machine_ids)} máquinas ({len(missing)} desde la API)")
+        if missing:
+            alerts_by_machine.update(fetch_machine_alerts_batch(token, missing, days_back=days_back))
+        
+        return jsonify(alerts_by_machine)
+    except Exception as e:
+        logger.error(f"Error general en get_alerts_batch: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/machine/<machine_id>/engine-hours')
 def get_machine_engine_hours(machine_id):
     """API endpoint to get engine hours data for a specific machine."""
@@ -583,9 +1254,13 @@ def get_machine_engine_hours(machine_id):
                 logger.warning("Usando token simulado")
                 return jsonify({'error': 'Modo de desarrollo: Se está utilizando un token simulado. Para conectar con datos reales, por favor autentíquese con credenciales válidas de John Deere.'}), 401
                 
-            # Intentar obtener datos de horómetro reales desde la API de John Deere
-            logger.info(f"Obteniendo datos de horómetro reales para la máquina {machine_id}")
-            engine_hours_data = fetch_machine_engine_hours(token, machine_id)
+            # Intentar primero el almacén local; si no, la API de John Deere
+            stored = read_machines_from_store(token, [machine_id], lambda store, m: store.get_engine_hours(m))
+            if machine_id in stored:
+                engine_hours_data = stored[machine_id]
+            else:
+                logger.info(f"Obteniendo datos de horómetro reales para la máquina {machine_id}")
+                engine_hours_data = fetch_machine_engine_hours(token, machine_id)
             
             if not engine_hours_data:
                 logger.warning(f"No se encontraron datos de horómetro para la máquina {machine_id}")
@@ -619,6 +1294,10 @@ def get_alert_definition():
     definition_uri = request.args.get('uri')
     if not definition_uri:
         return jsonify({"error": "Se requiere el parámetro 'uri'", "success": False}), 400
+    try:
+        alert_definition_id(definition_uri)
+    except ValueError as e:
+        return jsonify({"error": str(e), "success": False}), 400
     
     try:
         # Obtener la definición de la alerta
@@ -649,6 +1328,39 @@ def get_alert_definition():
             "message": "Error interno del servidor al procesar la solicitud."
         }), 500
 
+@app.route('/api/alert/definitions', methods=['POST'])
+def get_alert_definitions():
+    """API endpoint to resolve many alert definitions in a single request.
+    
+    Espera un JSON {"uris": [...], "codes": ["SPN.FMI", ...]} (ambas listas
+    opcionales) y devuelve {uri o código: definición}. Las definiciones del
+    catálogo local se responden sin llamar a John Deere.
+    """
+    if 'oauth_token' not in session:
+        return jsonify({"error": "No estás autenticado", "success": False}), 401
+    
+    payload = request.get_json(silent=True) or {}
+    uris = payload.get('uris') or []
+    codes = payload.get('codes') or []
+    if not isinstance(uris, list) or not isinstance(codes, list) or \
+            not all(isinstance(value, (str, int)) for value in uris + codes):
+        return jsonify({'error': "Se requieren 'uris' y/o 'codes' como listas"}), 400
+    if len(uris) + len(codes) > DTC_LOOKUP_MAX:
+        return jsonify({'error': f'Se admiten como máximo {DTC_LOOKUP_MAX} definiciones por petición'}), 400
+    try:
+        for uri in uris:
+            alert_definition_id(uri)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        token = session.get('oauth_token')
+        logger.info(f"Obteniendo {len(uris)} definiciones de alerta y {len(codes)} códigos en lote")
+        return jsonify(fetch_alert_definitions(token, [str(uri) for uri in uris], codes))
+    except Exception as e:
+        logger.error(f"Error general en get_alert_definitions: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/auth-setup')
 def auth_setup():
     """Página con instrucciones para configurar la autenticación automática."""
@@ -769,17 +1481,16 @@ def test_location(machine_id):
     
     try:
         # Importamos aquí para no interferir con las importaciones principales
-        from requests_oauthlib import OAuth2Session
         from john_deere_api import refresh_token_if_needed, fetch_machine_location
         
         # Refrescar token si es necesario
         token = refresh_token_if_needed(token)
         
-        # Crear sesión OAuth
-        oauth = OAuth2Session(JOHN_DEERE_CLIENT_ID, token=token)
+        # Crear sesión OAuth (sobre el pool de conexiones compartido)
+        oauth = get_oauth_session(token=token)
         
         # Probar el endpoint locationHistory
-        history_endpoint = f"https://partnerapi.deere.com/platform/machines/{machine_id}/locationHistory"
+        history_endpoint = f"{JOHN_DEERE_API_BASE_URL}/platform/machines/{machine_id}/locationHistory"
         logger.info(f"Probando endpoint locationHistory: {history_endpoint}")
         
         # Agregar header para desactivar paginación
@@ -797,7 +1508,7 @@ def test_location(machine_id):
             history_error = str(e)
         
         # Probar endpoint location directo
-        location_endpoint = f"https://partnerapi.deere.com/platform/machines/{machine_id}/location"
+        location_endpoint = f"{JOHN_DEERE_API_BASE_URL}/platform/machines/{machine_id}/location"
         logger.info(f"Probando endpoint location: {location_endpoint}")
         
         location_response = oauth.get(location_endpoint, headers=headers)
@@ -811,8 +1522,8 @@ def test_location(machine_id):
         except Exception as e:
             location_error = str(e)
         
-        # Probar nuestra función actualizada de obtención de ubicación
-        location_result = fetch_machine_location(token, machine_id)
+        # Probar nuestra función actualizada de obtención de ubicación (sin caché)
+        location_result = fetch_machine_location.uncached(token, machine_id)
         
         # Resultado de todas las pruebas
         result = {
@@ -838,6 +1549,30 @@ def test_location(machine_id):
         logger.error(f"Error en prueba de ubicación: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def metrics_authorized(session_data, authorization):
+    """True si la petición puede ver /api/metrics: con sesión iniciada o con el METRICS_TOKEN."""
+    if session_data.get('oauth_token'):
+        return True
+    expected = f"Bearer {METRICS_TOKEN}".encode()
+    return bool(METRICS_TOKEN) and secrets.compare_digest((authorization or '').encode(), expected)
+
+@app.route('/api/metrics')
+def get_metrics():
+    """Endpoint con métricas internas del worker (pool HTTP, caché y almacén local)."""
+    if not metrics_authorized(session, request.headers.get('Authorization')):
+        return jsonify({'error': 'Not authenticated'}), 401
+    return jsonify({
+        'pid': os.getpid(),
+        'http_pool': get_http_client().stats_snapshot(),
+        'cache': get_cache().stats(),
+        'telemetry_store': get_store().stats(),
+        'tokens': get_token_manager().stats(),
+        'upstream': get_scheduler().stats(),
+        'dtc_catalog': get_catalog().stats(),
+        'spatial_index': spatial_index_stats(),
+        'sessions': session_stats(app)
+    })
+
 @app.errorhandler(404)
 def page_not_found(e):
     return render_template('error.html', error="Page not found."), 404
@@ -0,0 +1,442 @@
+"""Modo de servicio asíncrono (ASGI).
+
+Las rutas /api/* que esperan a la API de John Deere se sirven con corrutinas
+(john_deere_async), así un worker no queda bloqueado mientras dura cada
+consulta y un solo proceso puede tener cientos de llamadas en curso. El resto
+de rutas (páginas, login, flujos NDJSON de historial) las sigue atendiendo la
+aplicación Flask a través de asgiref.WsgiToAsgi, con la misma sesión.
+
+    gunicorn -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:5000 asgi:application
+    uvicorn asgi:application --port 5000
+
+El modo síncrono (gunicorn main:app) sigue funcionando igual.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.http import parse_cookie
+
+from app import (
+    app as flask_app,
+    machine_clusters,
+    machines_in_bbox,
+    metrics_authorized,
+    organization_utilization,
+    parse_bbox_args,
+    parse_cluster_args,
+    parse_days_back,
+    parse_utilization_args,
+    read_fleet_from_store,
+    read_machines_from_store
+)
+from cache import get_cache
+from config import ALERT_BATCH_MAX_MACHINES
+from dtc_catalog import get_catalog
+from fleet_snapshot import FleetSnapshot
+from http_pool import get_http_client
+from john_deere_async import (
+    fetch_machine_alerts,
+    fetch_machine_alerts_batch,
+    fetch_machine_details,
+    fetch_machine_engine_hours,
+    fetch_machine_overview,
+    fetch_equipment_by_organization,
+    fetch_fleet_columns,
+    fetch_organizations,
+    get_async_client,
+    valid_token
+)
+from john_deere_api import stored_alerts
+from session_store import read_session_cookie, session_stats
+from spatial_index import spatial_index_stats
+from telemetry_store import get_store
+from token_manager import get_token_manager
+from upstream import get_scheduler
+
+logger = logging.getLogger(__name__)
+
+SIMULATED_TOKEN_ERROR = (
+    'Modo de desarrollo: Se está utilizando un token simulado. Para conectar con datos reales, '
+    'por favor autentíquese con credenciales válidas de John Deere.'
+)
+
+
+class AsyncRequest:
+    """Lo necesario de una petición ASGI: método, ruta, parámetros, sesión y cuerpo."""
+
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.receive = receive
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        self.args = {
+            name: values[0] for name, values in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()
+        }
+
+    def session(self):
+        """Datos de la sesión de Flask de esta petición (en servidor o en cookie)."""
+        cookie = parse_cookie(self.headers.get('cookie', '')).get(flask_app.config['SESSION_COOKIE_NAME'])
+        return read_session_cookie(flask_app, cookie)
+
+    async def json(self):
+        body = b''
+        more_body = True
+        while more_body:
+            message = await self.receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+        try:
+            return json.loads(body or b'null')
+        except ValueError:
+            return None
+
+
+class JSONResponse:
+    def __init__(self, body, status=200, headers=None):
+        # Un str se envía tal cual (JSON ya codificado, p. ej. FleetSnapshot.to_json())
+        self.body = (body if isinstance(body, str) else json.dumps(body)).encode('utf-8')
+        self.status = status
+        self.headers = headers or {}
+
+    async def __call__(self, send):
+        headers = [(b'content-type', b'application/json'), (b'content-length', str(len(self.body)).encode())]
+        headers += [(name.lower().encode(), str(value).encode()) for name, value in self.headers.items()]
+        await send({'type': 'http.response.start', 'status': self.status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': self.body})
+
+
+def upstream_error(error, not_found_message, context):
+    """Traduce un error de la API de John Deere a la respuesta que da la ruta Flask."""
+    error_msg = str(error)
+    if "401" in error_msg:
+        return JSONResponse({'error': 'Error de autenticación (401): No autorizado para acceder a la API de John Deere.'}, 401)
+    if "404" in error_msg:
+        return JSONResponse({'error': not_found_message}, 404)
+    return JSONResponse({'error': f'{context}: {error_msg}'}, 500)
+
+
+def authenticated(handler):
+    """Pasa el token de la sesión al handler, con las mismas respuestas 401 que Flask."""
+    async def wrapper(request, **params):
+        # La sesión puede estar en SQLite (session_store): se lee en un hilo
+        token = (await asyncio.to_thread(request.session)).get('oauth_token')
+        if not token:
+            return JSONResponse({'error': 'Not authenticated'}, 401)
+        if token.get('access_token') in ['simulated_token_manual', 'test_token']:
+            return JSONResponse({'error': SIMULATED_TOKEN_ERROR}, 401)
+        try:
+            # Token vigente compartido por todos los workers (ver token_manager)
+            token = await valid_token(token)
+            return await handler(request, token, **params)
+        except Exception as e:
+            logger.error(f"Error general en {handler.__name__}: {str(e)}")
+            return JSONResponse({'error': str(e)}, 500)
+    wrapper.__name__ = handler.__name__
+    return wrapper
+
+
+async def load_fleet_snapshot(token, organization_id):
+    """Versión async de app.load_fleet_snapshot: (FleetSnapshot, edad, estado de caché)."""
+    snapshot, data_age = await asyncio.to_thread(read_fleet_from_store, organization_id)
+    if snapshot is not None:
+        return snapshot, data_age, 'store'
+    columns, data_age, cache_state = await get_cache().get_stale_while_revalidate_async(
+        'machines',
+        (organization_id, 'columns'),
+        lambda: fetch_fleet_columns(token, organization_id)
+    )
+    return FleetSnapshot.from_columns(columns), data_age, cache_state
+
+
+@authenticated
+async def get_machines(request, token, organization_id):
+    organizations = await fetch_organizations(token)
+    if not any(str(org.get('id')) == str(organization_id) for org in organizations):
+        return JSONResponse({'error': f'No tiene acceso a la organización {organization_id}.'}, 403)
+
+    links = None
+    try:
+        snapshot, data_age, cache_state = await load_fleet_snapshot(token, organization_id)
+        if 'links' in request.args.get('include', '').split(','):
+            if cache_state == 'store':
+                links = await asyncio.to_thread(get_store().get_machine_links, organization_id)
+            else:
+                links = {
+                    str(machine.get('id')): machine.get('links', [])
+                    for machine in await fetch_equipment_by_organization(token, organization_id)
+                }
+    except Exception as e:
+        logger.error(f"Error fetching machines from API: {str(e)}")
+        return upstream_error(
+            e, 'Error 404: El recurso solicitado no existe en la API de John Deere.', 'Error al obtener máquinas'
+        )
+
+    logger.info(f"Máquinas obtenidas: {len(snapshot)} (caché: {cache_state}, edad: {data_age:.0f}s)")
+    return JSONResponse(snapshot.to_json(links), headers={'X-Data-Age': int(data_age), 'X-Cache': cache_state})
+
+
+@authenticated
+async def get_machines_in_bbox(request, token, organization_id):
+    try:
+        bbox, limit = parse_bbox_args(request.args)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, 400)
+
+    organizations = await fetch_organizations(token)
+    if not any(str(org.get('id')) == str(organization_id) for org in organizations):
+        return JSONResponse({'error': f'No tiene acceso a la organización {organization_id}.'}, 403)
+
+    try:
+        snapshot, data_age, cache_state = await load_fleet_snapshot(token, organization_id)
+    except Exception as e:
+        logger.error(f"Error fetching machines in bbox: {str(e)}")
+        return upstream_error(
+            e, 'Error 404: El recurso solicitado no existe en la API de John Deere.', 'Error al obtener máquinas'
+        )
+    # Poner al día el índice puede recorrer toda la flota: fuera del bucle de eventos
+    positions, total = await asyncio.to_thread(machines_in_bbox, organization_id, snapshot, bbox, limit)
+    logger.info(f"Máquinas en el rectángulo {bbox}: {total} de {len(snapshot)} (devueltas: {len(positions)})")
+    return JSONResponse(snapshot.to_json(indexes=positions), headers={
+        'X-Fleet-Size': len(snapshot), 'X-Total-Count': total, 'X-Data-Age': int(data_age), 'X-Cache': cache_state
+    })
+
+
+@authenticated
+async def get_machine_clusters(request, token, organization_id):
+    try:
+        zoom, bbox = parse_cluster_args(request.args)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, 400)
+
+    organizations = await fetch_organizations(token)
+    if not any(str(org.get('id')) == str(organization_id) for org in organizations):
+        return JSONResponse({'error': f'No tiene acceso a la organización {organization_id}.'}, 403)
+
+    try:
+        snapshot, data_age, cache_state = await load_fleet_snapshot(token, organization_id)
+    except Exception as e:
+        logger.error(f"Error fetching machine clusters: {str(e)}")
+        return upstream_error(
+            e, 'Error 404: El recurso solicitado no existe en la API de John Deere.', 'Error al obtener máquinas'
+        )
+    result = await asyncio.to_thread(machine_clusters, organization_id, snapshot, zoom, bbox)
+    logger.info(
+        f"Clusters a zoom {zoom}: {len(result['clusters'])} clusters y {len(result['machines'])} máquinas "
+        f"({result['total']} de {len(snapshot)})"
+    )
+    return JSONResponse(result, headers={
+        'X-Fleet-Size': len(snapshot), 'X-Data-Age': int(data_age), 'X-Cache': cache_state
+    })
+
+
+@authenticated
+async def get_organization_utilization(request, token, organization_id):
+    try:
+        period, first_day, last_day = parse_utilization_args(request.args)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, 400)
+
+    organizations = await fetch_organizations(token)
+    if not any(str(org.get('id')) == str(organization_id) for org in organizations):
+        return JSONResponse({'error': f'No tiene acceso a la organización {organization_id}.'}, 403)
+
+    try:
+        snapshot, data_age, cache_state = await load_fleet_snapshot(token, organization_id)
+    except Exception as e:
+        logger.error(f"Error obteniendo la utilización de la organización {organization_id}: {str(e)}")
+        return upstream_error(
+            e, 'Error 404: El recurso solicitado no existe en la API de John Deere.', 'Error al obtener la utilización'
+        )
+    # Consultas de SQLite por máquina: fuera del bucle de eventos
+    result = await asyncio.to_thread(organization_utilization, snapshot, period, first_day, last_day)
+    logger.info(
+        f"Utilización de {len(snapshot)} máquinas por {period} ({first_day} a {last_day}): "
+        f"{result['totals']['machines_with_readings']} con lecturas"
+    )
+    return JSONResponse(result, headers={'X-Data-Age': int(data_age), 'X-Cache': cache_state})
+
+
+@authenticated
+async def get_machine_details(request, token, machine_id):
+    try:
+        machine_details = await fetch_machine_details(token, machine_id)
+    except Exception as e:
+        return upstream_error(
+            e, f'Error 404: No se encontró la máquina con ID {machine_id} en la API de John Deere.',
+            'Error al obtener detalles de la máquina'
+        )
+    if not machine_details:
+        return JSONResponse({'error': f'No se encontraron detalles para la máquina {machine_id}'}, 404)
+    return JSONResponse(machine_details)
+
+
+@authenticated
+async def get_machine_overview(request, token, machine_id):
+    organizations = await fetch_organizations(token)
+    alerts_in_store = await asyncio.to_thread(read_machines_from_store, token, [machine_id], stored_alerts, organizations)
+    stored_hours = await asyncio.to_thread(
+        read_machines_from_store, token, [machine_id], lambda store, m: store.get_engine_hours(m), organizations
+    )
+    try:
+        overview = await fetch_machine_overview(
+            token, machine_id,
+            include_alerts=machine_id not in alerts_in_store,
+            include_engine_hours=machine_id not in stored_hours
+        )
+    except Exception as e:
+        return upstream_error(
+            e, f'Error 404: No se encontró la máquina con ID {machine_id} en la API de John Deere.',
+            'Error al obtener detalles de la máquina'
+        )
+    if machine_id in alerts_in_store:
+        overview['alerts'] = alerts_in_store[machine_id]
+    if machine_id in stored_hours:
+        overview['engineHours'] = stored_hours[machine_id]
+    overview['alerts'] = overview['alerts'] or []
+    return JSONResponse(overview)
+
+
+@authenticated
+async def get_machine_alerts(request, token, machine_id):
+    try:
+        days_back = parse_days_back(request.args.get('days_back'))
+    except ValueError as e:
+        return JSONResponse({'error': f"Parámetro 'days_back' no válido: {str(e)}"}, 400)
+    organizations = await fetch_organizations(token)
+    stored = await asyncio.to_thread(
+        read_machines_from_store, token, [machine_id], lambda store, m: stored_alerts(store, m, days_back), organizations
+    )
+    if machine_id in stored:
+        alerts = stored[machine_id]
+    else:
+        alerts = await fetch_machine_alerts(token, machine_id, days_back=days_back)
+    return JSONResponse(alerts or [])
+
+
+@authenticated
+async def get_alerts_batch(request, token):
+    payload = await request.json() or {}
+    machine_ids = payload.get('machine_ids') if isinstance(payload, dict) else None
+    if not isinstance(machine_ids, list) or not all(isinstance(m, (str, int)) for m in machine_ids):
+        return JSONResponse({'error': "Se requiere 'machine_ids' como lista de IDs"}, 400)
+    if len(machine_ids) > ALERT_BATCH_MAX_MACHINES:
+        return JSONResponse({'error': f'Se admiten como máximo {ALERT_BATCH_MAX_MACHINES} máquinas por petición'}, 400)
+    try:
+        days_back = parse_days_back(payload.get('days_back'))
+    except (TypeError, ValueError) as e:
+        return JSONResponse({'error': f"Parámetro 'days_back' no válido: {str(e)}"}, 400)
+
+    machine_ids = [str(m) for m in machine_ids]
+    organizations = await fetch_organizations(token)
+    alerts_by_machine = await asyncio.to_thread(
+        read_machines_from_store, token, machine_ids, lambda store, m: stored_alerts(store, m, days_back), organizations
+    )
+    missing = [m for m in machine_ids if m not in alerts_by_machine]
+    logger.info(f"Obteniendo alertas en lote para {len(machine_ids)} máquinas ({len(missing)} desde la API)")
+    if missing:
+        alerts_by_machine.update(await fetch_machine_alerts_batch(token, missing, days_back=days_back))
+    return JSONResponse(alerts_by_machine)
+
+
+@authenticated
+async def get_machine_engine_hours(request, token, machine_id):
+    organizations = await fetch_organizations(token)
+    stored = await asyncio.to_thread(
+        read_machines_from_store, token, [machine_id], lambda store, m: store.get_engine_hours(m), organizations
+    )
+    if machine_id in stored:
+        engine_hours_data = stored[machine_id]
+    else:
+        engine_hours_data = await fetch_machine_engine_hours(token, machine_id)
+    if not engine_hours_data:
+        return JSONResponse({'error': 'No se encontraron datos de horómetro'}, 404)
+    return JSONResponse(engine_hours_data)
+
+
+def collect_metrics():
+    return {
+        'pid': os.getpid(),
+        'mode': 'asgi',
+        'http_pool': get_http_client().stats_snapshot(),
+        'async_http': get_async_client().stats_snapshot(),
+        'cache': get_cache().stats(),
+        'telemetry_store': get_store().stats(),
+        'tokens': get_token_manager().stats(),
+        'upstream': get_scheduler().stats(),
+        'dtc_catalog': get_catalog().stats(),
+        'spatial_index': spatial_index_stats(),
+        'sessions': session_stats(flask_app)
+    }
+
+
+async def get_metrics(request):
+    session_data = await asyncio.to_thread(request.session)
+    if not metrics_authorized(session_data, request.headers.get('authorization')):
+        return JSONResponse({'error': 'Not authenticated'}, 401)
+    # Las estadísticas de la caché, el almacén y las sesiones consultan SQLite
+    return JSONResponse(await asyncio.to_thread(collect_metrics))
+
+
+ROUTES = [
+    ('GET', re.compile(r'^/api/machines/(?P<organization_id>[^/]+)$'), get_machines),
+    ('GET', re.compile(r'^/api/machines/(?P<organization_id>[^/]+)/in-bbox$'), get_machines_in_bbox),
+    ('GET', re.compile(r'^/api/machines/(?P<organization_id>[^/]+)/clusters$'), get_machine_clusters),
+    ('GET', re.compile(r'^/api/utilization/(?P<organization_id>[^/]+)$'), get_organization_utilization),
+    ('GET', re.compile(r'^/api/machine/(?P<machine_id>[^/]+)$'), get_machine_details),
+    ('GET', re.compile(r'^/api/machine/(?P<machine_id>[^/]+)/overview$'), get_machine_overview),
+    ('GET', re.compile(r'^/api/machine/(?P<machine_id>[^/]+)/alerts$'), get_machine_alerts),
+    ('POST', re.compile(r'^/api/alerts/batch$'), get_alerts_batch),
+    ('GET', re.compile(r'^/api/machine/(?P<machine_id>[^/]+)/engine-hours$'), get_machine_engine_hours),
+    ('GET', re.compile(r'^/api/metrics$'), get_metrics)
+]
+
+
+class AsyncApplication:
+    """Despacha las rutas async y delega el resto en la aplicación Flask."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi = WsgiToAsgi(wsgi_app)
+
+    def match(self, method, path):
+        for route_method, pattern, handler in ROUTES:
+            if route_method == method:
+                found = pattern.match(path)
+                if found:
+                    return handler, found.groupdict()
+        return None, None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        if scope['type'] == 'http':
+            handler, params = self.match(scope['method'], scope['path'])
+            if handler is not None:
+                started = time.perf_counter()
+                response = await handler(AsyncRequest(scope, receive), **params)
+                await response(send)
+                logger.debug(f"{scope['method']} {scope['path']} {response.status} "
+                             f"({(time.perf_counter() - started) * 1000:.0f} ms, async)")
+                return
+
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await get_async_client().aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = AsyncApplication(flask_app)
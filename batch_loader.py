@@ -0,0 +1,146 @@
+"""Agrupación de consultas por ID (patrón dataloader).
+
+Varias peticiones que llegan a la vez (p. ej. el mapa abriendo la ficha de
+varias máquinas, o el detalle y el resumen de la misma máquina) piden cada una
+un único equipo. BatchLoader junta los IDs pedidos por el mismo usuario dentro
+de una ventana corta y los resuelve con una sola llamada fetch_many(token, ids);
+cada llamante recibe solo su resultado.
+
+El primer llamante de cada lote espera la ventana y hace la consulta para
+todos, así que no hace falta ningún hilo en segundo plano. Si el lote llega a
+max_batch antes, lo lanza quien lo completa. AsyncBatchLoader hace lo mismo
+con corrutinas (modo ASGI).
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+
+from cache import user_scope
+
+
+class _Batch:
+    __slots__ = ('token', 'futures')
+
+    def __init__(self, token):
+        self.token = token
+        self.futures = {}
+
+
+def _resolve(batch, results, missing_error):
+    """Reparte el resultado de fetch_many entre los futures del lote."""
+    for key, future in batch.futures.items():
+        if future.done():
+            continue
+        if key in results:
+            future.set_result(results[key])
+        else:
+            future.set_exception(missing_error(key))
+
+
+class BatchLoader:
+    """Agrupa load(token, key) concurrentes en llamadas fetch_many(token, keys)."""
+
+    def __init__(self, fetch_many, window, max_batch, missing_error=KeyError):
+        self.fetch_many = fetch_many
+        self.window = window
+        self.max_batch = max_batch
+        self.missing_error = missing_error
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.loads = 0
+
+    def load(self, token, key):
+        scope = user_scope(token)
+        dispatch = None
+        with self._lock:
+            self.loads += 1
+            batch = self._pending.get(scope)
+            leader = batch is None
+            if leader:
+                batch = self._pending[scope] = _Batch(token)
+            future = batch.futures.get(key)
+            if future is None:
+                future = batch.futures[key] = Future()
+            if len(batch.futures) >= self.max_batch:
+                # Lote completo: lo lanza este hilo sin esperar la ventana
+                del self._pending[scope]
+                dispatch = batch
+
+        if dispatch is None and leader:
+            time.sleep(self.window)
+            with self._lock:
+                if self._pending.get(scope) is batch:
+                    del self._pending[scope]
+                    dispatch = batch
+
+        if dispatch is not None:
+            self._dispatch(dispatch)
+        return future.result()
+
+    def _dispatch(self, batch):
+        with self._lock:
+            self.batches += 1
+        try:
+            results = self.fetch_many(batch.token, list(batch.futures))
+        except Exception as e:
+            for future in batch.futures.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        _resolve(batch, results, self.missing_error)
+
+    def stats(self):
+        with self._lock:
+            return {'loads': self.loads, 'batches': self.batches}
+
+
+class AsyncBatchLoader:
+    """Versión async de BatchLoader (un lote pendiente por usuario y bucle de eventos)."""
+
+    def __init__(self, fetch_many, window, max_batch, missing_error=KeyError):
+        self.fetch_many = fetch_many
+        self.window = window
+        self.max_batch = max_batch
+        self.missing_error = missing_error
+        self._pending = {}
+        self.batches = 0
+        self.loads = 0
+
+    async def load(self, token, key):
+        # Todo se ejecuta en el hilo del bucle: no hace falta lock
+        slot = (asyncio.get_running_loop(), user_scope(token))
+        self.loads += 1
+        batch = self._pending.get(slot)
+        leader = batch is None
+        if leader:
+            batch = self._pending[slot] = _Batch(token)
+        future = batch.futures.get(key)
+        if future is None:
+            future = batch.futures[key] = asyncio.get_running_loop().create_future()
+
+        if len(batch.futures) >= self.max_batch:
+            if self._pending.get(slot) is batch:
+                del self._pending[slot]
+                await self._dispatch(batch)
+        elif leader:
+            await asyncio.sleep(self.window)
+            if self._pending.get(slot) is batch:
+                del self._pending[slot]
+                await self._dispatch(batch)
+        return await future
+
+    async def _dispatch(self, batch):
+        self.batches += 1
+        try:
+            results = await self.fetch_many(batch.token, list(batch.futures))
+        except Exception as e:
+            for future in batch.futures.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        _resolve(batch, results, self.missing_error)
+
+    def stats(self):
+        return {'loads': self.loads, 'batches': self.batches}
@@ -0,0 +1,2 @@
+"""Benchmarks de rendimiento. Se ejecutan desde la raíz del proyecto con
+python -m benchmarks.<nombre>."""
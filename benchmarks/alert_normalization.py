@@ -0,0 +1,201 @@
+"""Micro-benchmark de la normalización de alertas de /platform/machines/<id>/alerts.
+
+Compara la implementación anterior (comprobaciones de subcadenas de la
+severidad y unos 15 logger.info por alerta formateando el payload) con
+normalize_alerts (severidad por tabla precalculada, una pasada por los campos
+y sin log por alerta), sobre respuestas sintéticas con todas las variantes de
+campos que trata el normalizador. Comprueba además que ambas dan el mismo
+resultado.
+
+    python -m benchmarks.alert_normalization --alerts 1000 10000 50000
+"""
+import argparse
+import logging
+import random
+import timeit
+from datetime import datetime, timedelta
+
+from john_deere_api import normalize_alerts
+
+logger = logging.getLogger('benchmarks.alert_normalization')
+
+SEVERITY_VALUES = ('HIGH', 'high', 'Critical', 'ERROR', 'MEDIUM', 'Warning', 'warn', 'LOW', 'INFO', 'DTC', 'other', None)
+
+
+def synthetic_alerts(count, seed=7):
+    """Respuesta de alertas con `count` alertas de formas variadas."""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    values = []
+    for i in range(count):
+        alert = {
+            'id': f"alert-{i}",
+            'severity': rng.choice(SEVERITY_VALUES),
+            'status': rng.choice(('ACTIVE', 'RESOLVED')),
+            'type': 'DTC',
+            'links': [
+                {'rel': 'definition', 'uri': f"/platform/alertDefinitions/{i}"},
+                {'rel': 'machine', 'uri': f"/platform/machines/{1000 + i % 50}"}
+            ]
+        }
+        timestamp = (start + timedelta(minutes=i)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        alert['time' if i % 2 else 'timestamp'] = timestamp
+        shape = i % 5
+        if shape == 0:
+            alert['definition'] = {'id': str(100000 + i), 'description': f"Código de diagnóstico {i}"}
+        elif shape == 1:
+            alert['definition'] = {
+                'suspectParameterName': rng.randint(1, 5000),
+                'failureModeIndicator': rng.randint(1, 31),
+                'threeLetterAcronym': 'ECU'
+            }
+            alert['description'] = f"Descripción directa {i}"
+        elif shape == 2:
+            alert['content'] = {'title': f"Título {i}", 'description': f"Descripción en content {i}"}
+        elif shape == 3:
+            alert['title'] = f"Título directo {i}"
+            alert['message'] = f"Mensaje {i}"
+        values.append(alert)
+        if i % 1000 == 999:
+            # Entradas que no son objetos: ambos normalizadores las omiten
+            values.append(f"alerta-no-valida-{i}")
+    return {'values': values}
+
+
+def legacy_normalize_alerts(data):
+    """Implementación previa, copiada tal cual: cadena de comprobaciones y ~15 logs por alerta."""
+    alerts = []
+
+    if 'values' in data:
+        logger.info(f"Encontradas {len(data['values'])} alertas en la respuesta")
+        for alert in data['values']:
+            try:
+                logger.info(f"Procesando alerta: {str(alert)[:200]}...")
+                # Normalizar el tipo de severidad según la tabla proporcionada
+                # HIGH: rojo, MEDIUM: amarillo, LOW: gris, INFO: azul, DTC/UNKNOWN: gris
+                severity = 'unknown'  # valor por defecto
+                if alert.get('severity'):
+                    sev_upper = str(alert.get('severity')).upper()
+                    logger.info(f"Severidad original: {sev_upper}")
+                    if 'HIGH' in sev_upper or 'CRITICAL' in sev_upper or 'ERROR' in sev_upper:
+                        severity = 'high'
+                    elif 'MEDIUM' in sev_upper or 'WARNING' in sev_upper or 'WARN' in sev_upper:
+                        severity = 'medium'
+                    elif 'LOW' in sev_upper:
+                        severity = 'low'
+                    elif 'INFO' in sev_upper:
+                        severity = 'info'
+                    elif 'DTC' in sev_upper:
+                        severity = 'dtc'
+                    logger.info(f"Severidad normalizada: {severity}")
+            except Exception as err:
+                logger.error(f"Error procesando severidad de alerta: {str(err)}")
+                severity = 'unknown'
+
+            try:
+                # Extraer datos del contenido si disponibles
+                description = 'Sin descripción'
+                title = 'Alerta sin título'
+
+                logger.info(f"Procesando alerta con datos: {str(alert)[:300]}...")
+
+                # Intentar obtener descripción y título desde la definición
+                if 'definition' in alert and isinstance(alert['definition'], dict):
+                    definition = alert['definition']
+
+                    # Obtener descripción de la definición
+                    if definition.get('description'):
+                        logger.info(f"Descripción encontrada en definición: {definition['description']}")
+                        description = definition['description']
+
+                    # Si hay un ID o suspectParameterName, usarlo para el título
+                    if definition.get('id'):
+                        logger.info(f"ID encontrado en definición: {definition['id']}")
+                        title = f"Alerta DTC {definition['id']}"
+                    elif definition.get('suspectParameterName') and definition.get('failureModeIndicator'):
+                        spn = definition.get('suspectParameterName')
+                        fmi = definition.get('failureModeIndicator')
+                        title = f"Alerta {definition.get('threeLetterAcronym', 'DTC')} {spn}.{fmi}"
+
+                # Si no se encontró en la definición, intentar obtener directamente
+                if description == 'Sin descripción' and 'description' in alert:
+                    logger.info(f"Descripción encontrada directamente: {alert['description']}")
+                    description = alert['description']
+
+                if title == 'Alerta sin título' and 'title' in alert:
+                    logger.info(f"Título encontrado directamente: {alert['title']}")
+                    title = alert['title']
+
+                # Intentar obtener desde content como último recurso
+                if 'content' in alert:
+                    content = alert.get('content', {})
+                    logger.info(f"Contenido de alerta: {str(content)[:150]}...")
+                    if isinstance(content, dict):
+                        # Si content es un diccionario, intentar extraer la descripción y el título
+                        if description == 'Sin descripción' and content.get('description'):
+                            logger.info(f"Descripción encontrada en content: {content['description']}")
+                            description = content['description']
+                        if title == 'Alerta sin título' and content.get('title'):
+                            logger.info(f"Título encontrado en content: {content['title']}")
+                            title = content['title']
+
+                # Si tenemos un timestamp como 'time', usarlo
+                timestamp = alert.get('timestamp') or alert.get('time')
+                logger.info(f"Timestamp: {timestamp}")
+
+                # Si no hay description, buscar también en message
+                if description == 'Sin descripción' and alert.get('message'):
+                    logger.info(f"Usando message como descripción: {alert['message']}")
+                    description = alert['message']
+
+                # Extraer enlaces si están disponibles
+                links = []
+                if 'links' in alert and isinstance(alert['links'], list):
+                    for link in alert['links']:
+                        logger.info(f"Enlace encontrado: {link}")
+                        links.append(link)
+
+                # Crear objeto de alerta normalizado
+                alert_obj = {
+                    'id': alert.get('id', 'sin-id'),
+                    'title': title,
+                    'description': description,
+                    'severity': severity,
+                    'timestamp': timestamp,  # Usar el timestamp ya procesado
+                    'status': alert.get('status', 'ACTIVE'),
+                    'type': alert.get('type', 'UNDEFINED'),
+                    'links': links
+                }
+
+                logger.info(f"Alerta procesada: {str(alert_obj)[:150]}...")
+                alerts.append(alert_obj)
+            except Exception as err:
+                logger.error(f"Error procesando datos de alerta: {str(err)}")
+    return alerts
+
+
+def measure(func, data, repeat):
+    runs = timeit.repeat(lambda: func(data), number=1, repeat=repeat)
+    return min(runs) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--alerts', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # El log se procesa pero se descarta, como en producción con un handler lento desactivado
+    logging.basicConfig(level=logging.INFO, handlers=[logging.NullHandler()])
+
+    print(f"{'alertas':>8} {'antes (ms)':>12} {'después (ms)':>14} {'mejora':>8}")
+    for count in args.alerts:
+        data = synthetic_alerts(count)
+        assert legacy_normalize_alerts(data) == normalize_alerts(data)
+        before = measure(legacy_normalize_alerts, data, args.repeat)
+        after = measure(normalize_alerts, data, args.repeat)
+        print(f"{count:>8} {before:>12.2f} {after:>14.2f} {before / after:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Capacidad de usuarios concurrentes: modo síncrono (gunicorn main:app) frente
+a modo asíncrono (gunicorn -k uvicorn.workers.UvicornWorker asgi:application).
+
+Arranca la API falsa con una latencia alta, levanta la aplicación en cada modo
+con el mismo número de workers y lanza N usuarios simultáneos contra una ruta
+que consulta la API en cada petición (por defecto /api/machine/<id>/alerts,
+sin caché). Para cada nivel de concurrencia informa de rps, p50/p95 y errores.
+
+    python -m benchmarks.async_capacity --workers 2 --users 8 32 128 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fake_deere_api import add_fleet_arguments, fake_api_from_args
+from benchmarks.load_test import BENCH_TOKEN, configure_environment, percentile
+
+MODES = {
+    'sync': ['gunicorn', '--workers', '{workers}', '--bind', '127.0.0.1:{port}', 'main:app'],
+    'async': ['gunicorn', '--workers', '{workers}', '--worker-class', 'uvicorn.workers.UvicornWorker',
+              '--bind', '127.0.0.1:{port}', 'asgi:application']
+}
+
+SESSION_SECRET = 'benchmark-secret'
+
+
+def session_cookie():
+    """Cookie de una sesión con el token de prueba (compartida con los servidores lanzados)."""
+    from app import app
+    from session_store import create_session_cookie
+    app.secret_key = SESSION_SECRET
+    return f"{app.config['SESSION_COOKIE_NAME']}={create_session_cookie(app, {'oauth_token': BENCH_TOKEN})}"
+
+
+def start_server(mode, workers, port):
+    command = [part.format(workers=workers, port=port) for part in MODES[mode]]
+    env = dict(os.environ, SESSION_SECRET=SESSION_SECRET)
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/metrics", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"El servidor en modo {mode} no arrancó")
+
+
+async def run_users(base_url, paths, users, cookie):
+    """Lanza `users` clientes simultáneos que reparten las peticiones de `paths`."""
+    queue = list(paths)
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+
+    async with httpx.AsyncClient(base_url=base_url, headers={'Cookie': cookie}, limits=limits, timeout=120) as client:
+        async def user():
+            nonlocal errors
+            while queue:
+                path = queue.pop()
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(users)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(latencies, 0.50) * 1000,
+        'p95': percentile(latencies, 0.95) * 1000,
+        'errors': errors
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_fleet_arguments(parser)
+    parser.set_defaults(latency=0.2)
+    parser.add_argument('--workers', type=int, default=2, help="Workers de gunicorn en ambos modos")
+    parser.add_argument('--users', type=int, nargs='+', default=[8, 32, 128], help="Niveles de concurrencia")
+    parser.add_argument('--requests-per-user', type=int, default=4)
+    parser.add_argument('--route', choices=['alerts', 'engine-hours'], default='alerts')
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    parser.add_argument('--port', type=int, default=5077)
+    args = parser.parse_args()
+
+    api = fake_api_from_args(args).start()
+    configure_environment(api.url, tempfile.mkdtemp(prefix='jdeere-bench-'), cold=True)
+    cookie = session_cookie()
+
+    rng = random.Random(5)
+    machine_ids = list(api.fleet.machines)
+    print(f"Latencia de la API {args.latency * 1000:.0f} ms, {args.workers} workers, ruta {args.route}", file=sys.stderr)
+    print(f"{'modo':<6} {'usuarios':>8} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'errores':>8} {'llamadas API':>13}")
+
+    for mode in args.modes:
+        server = start_server(mode, args.workers, args.port)
+        try:
+            for users in args.users:
+                paths = [
+                    f"/api/machine/{rng.choice(machine_ids)}/{args.route}"
+                    for _ in range(users * args.requests_per_user)
+                ]
+                api.reset_counters()
+                stats = asyncio.run(run_users(f"http://127.0.0.1:{args.port}", paths, users, cookie))
+                upstream = sum(api.calls.values())
+                print(
+                    f"{mode:<6} {users:>8} {stats['rps']:>8.1f} {stats['p50']:>9.1f} "
+                    f"{stats['p95']:>9.1f} {stats['errors']:>8} {upstream:>13}"
+                )
+        finally:
+            server.terminate()
+            server.wait()
+
+    api.stop()
+
+
+if __name__ == '__main__':
+    main()
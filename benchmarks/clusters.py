@@ -0,0 +1,81 @@
+"""Benchmark de /api/machines/<org>/clusters frente a enviar un marcador por máquina.
+
+Para flotas sintéticas de distinto tamaño mide la construcción de la jerarquía
+de clusters (primer sync() de ClusterIndex), la actualización con un 1 % de
+máquinas desplazadas y, para una vista de mapa de 1024 x 768 px a varios
+zooms, los marcadores que tendría que dibujar el navegador y el tamaño de la
+respuesta: con clusters frente a /api/machines/<org>/in-bbox. Con clusters
+ambos deben mantenerse casi constantes aunque crezca la flota.
+
+    python -m benchmarks.clusters --machines 1000 10000 50000 100000
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.fleet_snapshot import synthetic_machines
+from benchmarks.spatial_index import moved
+from fleet_snapshot import FleetSnapshot
+from spatial_index import ClusterIndex
+
+ZOOMS = (5, 7, 9, 11)
+VIEW_WIDTH = 1024
+VIEW_HEIGHT = 768
+
+
+def view(zoom, latitude=41.5, longitude=-93.5):
+    """Rectángulo (aprox.) de una vista de VIEW_WIDTH x VIEW_HEIGHT px centrada en el punto."""
+    degrees_per_pixel = 360.0 / (256 * 2 ** zoom)
+    half_width = VIEW_WIDTH / 2 * degrees_per_pixel
+    half_height = VIEW_HEIGHT / 2 * degrees_per_pixel * 0.75  # cos(41.5°)
+    return latitude - half_height, longitude - half_width, latitude + half_height, longitude + half_width
+
+
+def cluster_payload(index, snapshot, zoom, bbox):
+    clusters, singles = index.clusters(zoom, *bbox)
+    positions = sorted(snapshot.position(machine_id) for machine_id in singles)
+    body = json.dumps({'zoom': zoom, 'clusters': clusters, 'machines': [snapshot.machine(i) for i in positions]},
+                      sort_keys=True, separators=(',', ':'))
+    return len(clusters) + len(singles), len(body)
+
+
+def bbox_payload(index, snapshot, bbox):
+    positions = sorted(snapshot.position(machine_id) for machine_id in index.query(*bbox))
+    return len(positions), len(snapshot.to_json(indexes=positions))
+
+
+def elapsed_ms(func):
+    started = time.perf_counter()
+    func()
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--machines', type=int, nargs='+', default=[1000, 10000, 50000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'máquinas':>9} {'construcción ms':>16} {'sync 1 % ms':>12}")
+    results = {}
+    for count in args.machines:
+        snapshot = FleetSnapshot.from_machines(synthetic_machines(count))
+        index = ClusterIndex()
+        build_ms = elapsed_ms(lambda: index.sync(snapshot))
+        shifted = moved(snapshot, random.Random(3), 0.01)
+        update_ms = elapsed_ms(lambda: index.sync(shifted))
+        print(f"{count:>9} {build_ms:>16.0f} {update_ms:>12.1f}")
+        results[count] = [
+            (zoom, cluster_payload(index, shifted, zoom, view(zoom)), bbox_payload(index, shifted, view(zoom)))
+            for zoom in ZOOMS
+        ]
+
+    print()
+    print(f"{'máquinas':>9} {'zoom':>5} {'marcadores':>11} {'KB':>8} {'marcadores bbox':>16} {'KB bbox':>9}")
+    for count, rows in results.items():
+        for zoom, (markers, size), (bbox_markers, bbox_size) in rows:
+            print(f"{count:>9} {zoom:>5} {markers:>11} {size / 1024:>8.1f} {bbox_markers:>16} {bbox_size / 1024:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,350 @@
+"""Servidor local que imita la API de John Deere para pruebas y benchmarks.
+
+Emula los endpoints que usa la aplicación:
+  GET /platform/organizations
+  GET /isg/equipment?organizationIds=...&ids=...
+  GET /platform/machines/<id>/locationHistory[?startDate=...]
+  GET /platform/machines/<id>/location
+  GET /platform/machines/<id>/alerts[?startDate=...&endDate=...]
+  GET /platform/machines/<id>/engineHours
+  GET /platform/alertDefinitions/<id>
+  POST /oauth2/token (grant_type=refresh_token)
+
+La flota (organizaciones, máquinas por organización y puntos de historial) se
+genera de forma determinista. Cada endpoint tiene una latencia y una tasa de
+errores configurables, y el servidor cuenta las llamadas recibidas.
+
+    python -m benchmarks.fake_deere_api --port 8089 --orgs 2 --machines 300
+
+Para apuntar la aplicación a él:
+    JOHN_DEERE_API_BASE_URL=http://127.0.0.1:8089
+    JOHN_DEERE_EQUIPMENT_API_URL=http://127.0.0.1:8089
+    OAUTHLIB_INSECURE_TRANSPORT=1
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ENDPOINTS = ('organizations', 'equipment', 'locationHistory', 'location', 'alerts', 'engineHours', 'alertDefinitions',
+             'token')
+
+SEVERITIES = ('HIGH', 'MEDIUM', 'LOW', 'INFO', 'DTC')
+
+MACHINE_PATH = re.compile(r'^/platform/machines/([^/]+)/(locationHistory|location|alerts|engineHours)$')
+DEFINITION_PATH = re.compile(r'^/platform/alertDefinitions/([^/]+)-(\d+)$')
+
+
+class FakeFleet:
+    """Flota sintética determinista."""
+
+    def __init__(self, orgs=1, machines_per_org=100, history_points=50, alerts_per_machine=5, seed=7):
+        self.history_points = history_points
+        self.alerts_per_machine = alerts_per_machine
+        self.seed = seed
+        self.organizations = [
+            {'id': str(1000 + i), 'name': f"Organización {i + 1}", 'type': 'customer', 'links': []}
+            for i in range(orgs)
+        ]
+        self.machines = {}
+        self.machines_by_org = {}
+        for org_index, org in enumerate(self.organizations):
+            machine_ids = []
+            for i in range(machines_per_org):
+                machine_id = str(500000 + org_index * machines_per_org + i)
+                self.machines[machine_id] = {
+                    'id': machine_id,
+                    'name': f"Máquina {machine_id}",
+                    'model': random.Random(machine_id).choice(['8R 410', 'S780', '310L', '2454D']),
+                    'category': 'machine',
+                    'type': random.Random(machine_id).choice(['Tractor', 'Harvester', 'Backhoes', 'Excavator']),
+                    'serialNumber': f"1RW{machine_id}",
+                    'links': [{'rel': 'self', 'uri': f"/platform/machines/{machine_id}"}]
+                }
+                machine_ids.append(machine_id)
+            self.machines_by_org[org['id']] = machine_ids
+        self.epoch = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        # Las alertas son de las últimas horas para que entren en la ventana por defecto (30 días)
+        self.alerts_epoch = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) - \
+            timedelta(hours=alerts_per_machine)
+
+    def _timestamp(self, offset_seconds):
+        return (self.epoch + timedelta(seconds=offset_seconds)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+    def history(self, machine_id, start_date=None):
+        rng = random.Random(f"{self.seed}:{machine_id}")
+        lat, lon = 41.5 + rng.uniform(-2, 2), -93.5 + rng.uniform(-2, 2)
+        values = []
+        for i in range(self.history_points):
+            lat += rng.uniform(-0.001, 0.001)
+            lon += rng.uniform(-0.001, 0.001)
+            timestamp = self._timestamp(i * 60)
+            if start_date and timestamp <= start_date:
+                continue
+            values.append({
+                'eventTimestamp': timestamp,
+                'gpsFixTimestamp': timestamp,
+                'point': {'lat': round(lat, 6), 'lon': round(lon, 6), 'altitude': 300.0}
+            })
+        rng.shuffle(values)
+        return values
+
+    def alerts(self, machine_id, start_date=None, end_date=None):
+        rng = random.Random(f"alerts:{machine_id}")
+        values = [
+            {
+                'id': f"{machine_id}-{i}",
+                'severity': rng.choice(SEVERITIES),
+                'time': (self.alerts_epoch + timedelta(hours=i)).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                'status': 'ACTIVE',
+                'type': 'DTC',
+                'definition': {
+                    'id': str(rng.randint(100000, 999999)),
+                    'suspectParameterName': rng.randint(1, 5000),
+                    'failureModeIndicator': rng.randint(0, 31),
+                    'threeLetterAcronym': 'ECU',
+                    'description': f"Código de diagnóstico {i} de la máquina {machine_id}"
+                },
+                'links': [{'rel': 'definition', 'uri': f"/platform/alertDefinitions/{machine_id}-{i}"}]
+            }
+            for i in range(self.alerts_per_machine)
+        ]
+        return [
+            alert for alert in values
+            if (not start_date or alert['time'] >= start_date) and (not end_date or alert['time'] <= end_date)
+        ]
+
+    def alert_definition(self, machine_id, index):
+        """Definición enlazada desde la alerta `index` de una máquina, o None."""
+        if machine_id not in self.machines or index >= self.alerts_per_machine:
+            return None
+        alert = self.alerts(machine_id)[index]
+        return dict(alert['definition'], id=f"{machine_id}-{index}")
+
+    def engine_hours(self, machine_id):
+        rng = random.Random(f"hours:{machine_id}")
+        return {
+            'values': [{
+                'reading': {'valueAsDouble': round(rng.uniform(100, 9000), 1), 'unit': 'Hours'},
+                'reportTime': self._timestamp(self.history_points * 60)
+            }]
+        }
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Cola de conexiones amplia: las pruebas abren cientos de conexiones a la vez
+    request_queue_size = 1024
+
+
+class FakeDeereAPI:
+    """Servidor HTTP en un hilo con latencias y errores configurables por endpoint."""
+
+    def __init__(self, fleet=None, host='127.0.0.1', port=0, latency=None, error_rate=0.0, seed=11, max_rps=0.0):
+        self.fleet = fleet or FakeFleet()
+        self.latency = dict.fromkeys(ENDPOINTS, 0.0)
+        self.latency.update(latency or {})
+        self.error_rate = error_rate
+        # Límite de ritmo como el de la API real: por encima de max_rps responde 429
+        self.max_rps = max_rps
+        self._allowance = max_rps
+        self._allowance_at = time.monotonic()
+        self.throttled = 0
+        self.calls = Counter()
+        self.errors = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server = _Server((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='fake-deere-api', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.errors.clear()
+            self.throttled = 0
+
+    def _failure_status(self, endpoint):
+        """Status de error simulado para esta llamada (límite de ritmo o fallo aleatorio) o None."""
+        with self._lock:
+            self.calls[endpoint] += 1
+            if self.max_rps:
+                now = time.monotonic()
+                self._allowance = min(self.max_rps, self._allowance + (now - self._allowance_at) * self.max_rps)
+                self._allowance_at = now
+                if self._allowance < 1:
+                    self.throttled += 1
+                    self.errors[endpoint] += 1
+                    return 429
+                self._allowance -= 1
+            if self._rng.random() < self.error_rate:
+                self.errors[endpoint] += 1
+                return self._rng.choice([429, 500, 503])
+            return None
+
+    def route(self, path, query):
+        """Devuelve (endpoint, status, cuerpo) para una petición GET."""
+        fleet = self.fleet
+        if path == '/platform/organizations':
+            return 'organizations', 200, {'values': fleet.organizations}
+
+        if path == '/isg/equipment':
+            if 'ids' in query:
+                ids = [i for value in query['ids'] for i in value.split(',')]
+            else:
+                ids = [
+                    machine_id
+                    for org_id in query.get('organizationIds', [''])[0].split(',')
+                    for machine_id in fleet.machines_by_org.get(org_id, [])
+                ]
+            return 'equipment', 200, {'values': [fleet.machines[i] for i in ids if i in fleet.machines]}
+
+        match = MACHINE_PATH.match(path)
+        if match:
+            machine_id, endpoint = match.groups()
+            if machine_id not in fleet.machines:
+                return endpoint, 404, {'error': 'Not Found'}
+            if endpoint == 'locationHistory':
+                return endpoint, 200, {'values': fleet.history(machine_id, query.get('startDate', [None])[0])}
+            if endpoint == 'location':
+                newest = max(fleet.history(machine_id), key=lambda value: value['eventTimestamp'], default=None)
+                if newest is None:
+                    return endpoint, 404, {'error': 'Not Found'}
+                return endpoint, 200, {
+                    'geometry': {'type': 'Point', 'coordinates': [newest['point']['lon'], newest['point']['lat']]},
+                    'timestamp': newest['eventTimestamp']
+                }
+            if endpoint == 'alerts':
+                return endpoint, 200, {'values': fleet.alerts(
+                    machine_id, query.get('startDate', [None])[0], query.get('endDate', [None])[0]
+                )}
+            return endpoint, 200, fleet.engine_hours(machine_id)
+
+        match = DEFINITION_PATH.match(path)
+        if match:
+            definition = fleet.alert_definition(match.group(1), int(match.group(2)))
+            if definition is None:
+                return 'alertDefinitions', 404, {'error': 'Not Found'}
+            return 'alertDefinitions', 200, definition
+
+        return None, 404, {'error': 'Not Found'}
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                endpoint, status, body = api.route(parsed.path, parse_qs(parsed.query))
+                if endpoint is not None:
+                    delay = api.latency.get(endpoint, 0.0)
+                    if delay:
+                        time.sleep(delay)
+                    failure = api._failure_status(endpoint)
+                    if failure is not None:
+                        status, body = failure, {'error': 'Fallo simulado'}
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                if status == 429:
+                    self.send_header('Retry-After', '1')
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                form = parse_qs(self.rfile.read(length).decode('utf-8'))
+                status, body = 404, {'error': 'Not Found'}
+                if urlparse(self.path).path == '/oauth2/token':
+                    status, body = 400, {'error': 'invalid_grant'}
+                    if form.get('grant_type') == ['refresh_token'] and form.get('refresh_token'):
+                        status, body = 200, {
+                            'access_token': f"fake-{uuid.uuid4().hex}",
+                            'refresh_token': form['refresh_token'][0],
+                            'token_type': 'Bearer',
+                            'expires_in': 3600
+                        }
+                    delay = api.latency.get('token', 0.0)
+                    if delay:
+                        time.sleep(delay)
+                    with api._lock:
+                        api.calls['token'] += 1
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def add_fleet_arguments(parser):
+    """Argumentos comunes de flota, latencia y errores (también los usa el harness)."""
+    parser.add_argument('--orgs', type=int, default=1, help="Número de organizaciones")
+    parser.add_argument('--machines', type=int, default=100, help="Máquinas por organización")
+    parser.add_argument('--history-points', type=int, default=50, help="Puntos de locationHistory por máquina")
+    parser.add_argument('--alerts', type=int, default=5, help="Alertas por máquina")
+    parser.add_argument('--latency', type=float, default=0.05, help="Latencia por defecto de cada endpoint (s)")
+    parser.add_argument('--endpoint-latency', action='append', default=[], metavar='ENDPOINT=SEGUNDOS',
+                        help=f"Latencia de un endpoint concreto ({', '.join(ENDPOINTS)})")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fracción de respuestas 429/5xx")
+    parser.add_argument('--max-rps', type=float, default=0.0,
+                        help="Peticiones por segundo que admite la API antes de responder 429 (0 = sin límite)")
+
+
+def fake_api_from_args(args, port=0):
+    latency = dict.fromkeys(ENDPOINTS, args.latency)
+    for item in args.endpoint_latency:
+        endpoint, _, seconds = item.partition('=')
+        if endpoint not in ENDPOINTS:
+            raise ValueError(f"Endpoint desconocido: {endpoint}")
+        latency[endpoint] = float(seconds)
+    fleet = FakeFleet(orgs=args.orgs, machines_per_org=args.machines,
+                      history_points=args.history_points, alerts_per_machine=args.alerts)
+    return FakeDeereAPI(fleet=fleet, port=port, latency=latency, error_rate=args.error_rate, max_rps=args.max_rps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8089)
+    add_fleet_arguments(parser)
+    args = parser.parse_args()
+
+    api = fake_api_from_args(args, port=args.port).start()
+    print(f"API falsa de John Deere escuchando en {api.url} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        api.stop()
+
+
+if __name__ == '__main__':
+    main()
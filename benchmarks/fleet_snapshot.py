@@ -0,0 +1,109 @@
+"""Benchmark de memoria y serialización de la flota de /api/machines/<org>.
+
+Compara la lista de dicts por máquina (con los links de la API, como la
+guardaba la caché 'machines') con FleetSnapshot:
+  - memoria retenida por la flota decodificada (tracemalloc),
+  - lectura de la caché: json.loads del valor guardado (+ from_columns),
+  - codificación de la respuesta: json.dumps con las opciones de jsonify
+    frente a FleetSnapshot.to_json().
+Comprueba además que el JSON de la instantánea es idéntico al de jsonify sin
+links y, con ?include=links, al de la lista original.
+
+    python -m benchmarks.fleet_snapshot --machines 1000 10000 50000
+"""
+import argparse
+import json
+import random
+import timeit
+import tracemalloc
+
+from fleet_snapshot import FleetSnapshot
+
+MODELS = ('8R 410', 'S780', '310L', '2454D', '9RX 640', 'X9 1100')
+TYPES = ('Tractor', 'Harvester', 'Backhoes', 'Excavator')
+
+
+def synthetic_machines(count, seed=7):
+    """Flota con el formato de fetch_machines_by_organization; un 5 % sin ubicación."""
+    rng = random.Random(seed)
+    machines = []
+    for i in range(count):
+        machine_id = str(500000 + i)
+        location = None
+        if rng.random() > 0.05:
+            location = {
+                'longitude': round(-93.5 + rng.uniform(-5, 5), 6),
+                'latitude': round(41.5 + rng.uniform(-5, 5), 6),
+                'timestamp': f"2025-01-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:00.000Z"
+            }
+        machines.append({
+            'id': machine_id,
+            'name': f"Máquina {machine_id}",
+            'model': rng.choice(MODELS),
+            'category': 'Machine',
+            'type': rng.choice(TYPES),
+            'location': location,
+            'links': [
+                {'@type': 'Link', 'rel': rel, 'uri': f"https://partnerapi.deere.com/platform/machines/{machine_id}/{rel}"}
+                for rel in ('self', 'locationHistory', 'alerts', 'engineHours', 'hoursOfOperation', 'organization')
+            ]
+        })
+    return machines
+
+
+def jsonify_dumps(value):
+    # Opciones de la codificación de jsonify fuera del modo debug
+    return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+
+def retained_bytes(build):
+    """Memoria que sigue ocupada por el resultado de build()."""
+    tracemalloc.start()
+    value = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del value
+    return size
+
+
+def measure(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--machines', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'máquinas':>9} {'':>12} {'dicts':>10} {'snapshot':>10} {'mejora':>8}")
+    for count in args.machines:
+        machines = synthetic_machines(count)
+        snapshot = FleetSnapshot.from_machines(machines)
+        links = {machine['id']: machine['links'] for machine in machines}
+        without_links = [{key: value for key, value in machine.items() if key != 'links'} for machine in machines]
+        assert snapshot.to_json() == jsonify_dumps(without_links)
+        assert snapshot.to_json(links) == jsonify_dumps(machines)
+        assert snapshot.machines(links) == machines
+
+        cached_dicts = json.dumps(machines)
+        cached_columns = json.dumps(snapshot.to_columns())
+        rows = [
+            ('memoria KB',
+             retained_bytes(lambda: json.loads(cached_dicts)) / 1024,
+             retained_bytes(lambda: FleetSnapshot.from_columns(json.loads(cached_columns))) / 1024),
+            ('caché KB', len(cached_dicts) / 1024, len(cached_columns) / 1024),
+            ('lectura ms',
+             measure(lambda: json.loads(cached_dicts), args.repeat),
+             measure(lambda: FleetSnapshot.from_columns(json.loads(cached_columns)), args.repeat)),
+            ('JSON ms',
+             measure(lambda: jsonify_dumps(machines), args.repeat),
+             measure(snapshot.to_json, args.repeat)),
+            ('respuesta KB', len(jsonify_dumps(machines)) / 1024, len(snapshot.to_json()) / 1024)
+        ]
+        for label, before, after in rows:
+            print(f"{count:>9} {label:>12} {before:>10.1f} {after:>10.1f} {before / after:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Prueba de carga offline de las rutas /api/* contra la API falsa de John Deere.
+
+Arranca benchmarks.fake_deere_api en un puerto local, apunta la aplicación a
+él (con caché y almacén de telemetría en un directorio temporal) y lanza
+peticiones concurrentes contra:
+  /api/machines/<org>
+  /api/location-history/<org>
+  /api/machine/<id>/alerts
+
+Para cada ruta informa de p50/p95/p99, peticiones por segundo, errores y las
+llamadas que llegaron a la API falsa por endpoint. Con --cold se desactivan
+las cachés (TTL 0) para medir el coste completo de cada petición.
+
+    python -m benchmarks.load_test --machines 200 --users 8 --requests 50
+    python -m benchmarks.load_test --cold --endpoint-latency locationHistory=0.2
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_deere_api import ENDPOINTS, add_fleet_arguments, fake_api_from_args
+
+ROUTES = ('machines', 'location-history', 'alerts')
+
+BENCH_TOKEN = {
+    'access_token': 'bench-token',
+    'refresh_token': 'bench-refresh',
+    'token_type': 'Bearer',
+    'expires_at': time.time() + 24 * 3600
+}
+
+
+def configure_environment(api_url, workdir, cold):
+    """Variables de entorno que config.py lee al importarse: hay que fijarlas antes de importar app."""
+    os.environ.update({
+        'JOHN_DEERE_API_BASE_URL': api_url,
+        'JOHN_DEERE_EQUIPMENT_API_URL': api_url,
+        'JOHN_DEERE_TOKEN_URL': f"{api_url}/oauth2/token",
+        'OAUTHLIB_INSECURE_TRANSPORT': '1',
+        'CACHE_PATH': os.path.join(workdir, 'cache.sqlite3'),
+        'TELEMETRY_DB_PATH': os.path.join(workdir, 'telemetry.sqlite3'),
+        'TOKEN_STORE_PATH': os.path.join(workdir, 'tokens.sqlite3'),
+        'SESSION_DB_PATH': os.path.join(workdir, 'sessions.sqlite3'),
+        'FLEET_POLLER_MODE': 'off'
+    })
+    if cold:
+        for resource in ('ORGANIZATIONS', 'EQUIPMENT', 'LOCATION', 'MACHINES'):
+            os.environ[f"CACHE_TTL_{resource}"] = '0'
+        os.environ['LOCATION_HISTORY_SYNC_TTL'] = '0'
+        os.environ['TELEMETRY_MAX_AGE'] = '0'
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class LoadRunner:
+    """Lanza peticiones concurrentes con un cliente de pruebas de Flask por usuario."""
+
+    def __init__(self, app, users):
+        self.app = app
+        self.users = users
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            # Las cookies de sesión son Secure: el cliente tiene que hablar https
+            client = self.app.test_client()
+            with client.session_transaction(base_url='https://localhost') as session:
+                session['oauth_token'] = dict(BENCH_TOKEN)
+            self._local.client = client
+        return client
+
+    def _request(self, path):
+        started = time.perf_counter()
+        response = self._client().get(path, base_url='https://localhost')
+        body = response.get_data()
+        return time.perf_counter() - started, response.status_code, len(body)
+
+    def run(self, paths):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.users, thread_name_prefix='bench-user') as executor:
+            results = list(executor.map(self._request, paths))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(result[0] for result in results)
+        return {
+            'requests': len(results),
+            'errors': sum(1 for result in results if result[1] >= 400),
+            'rps': len(results) / elapsed if elapsed else 0.0,
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+            'bytes': sum(result[2] for result in results) // max(len(results), 1)
+        }
+
+
+def route_paths(route, fleet, count, rng):
+    organization_ids = [org['id'] for org in fleet.organizations]
+    if route == 'machines':
+        return [f"/api/machines/{rng.choice(organization_ids)}" for _ in range(count)]
+    if route == 'location-history':
+        return [f"/api/location-history/{rng.choice(organization_ids)}" for _ in range(count)]
+    machine_ids = list(fleet.machines)
+    return [f"/api/machine/{rng.choice(machine_ids)}/alerts" for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_fleet_arguments(parser)
+    parser.add_argument('--users', type=int, default=8, help="Usuarios concurrentes")
+    parser.add_argument('--requests', type=int, default=40, help="Peticiones por ruta")
+    parser.add_argument('--routes', nargs='+', choices=ROUTES, default=list(ROUTES))
+    parser.add_argument('--cold', action='store_true', help="Desactiva cachés y almacén (TTL 0)")
+    args = parser.parse_args()
+
+    api = fake_api_from_args(args).start()
+    workdir = tempfile.mkdtemp(prefix='jdeere-bench-')
+    configure_environment(api.url, workdir, args.cold)
+
+    from app import app  # después de configurar el entorno
+
+    # La aplicación registra en DEBUG; durante la prueba solo interesan los errores
+    logging.getLogger().setLevel(logging.ERROR)
+    for handler in logging.getLogger().handlers:
+        handler.setLevel(logging.ERROR)
+
+    runner = LoadRunner(app, args.users)
+    rng = random.Random(3)
+    fleet = api.fleet
+    print(
+        f"Flota: {len(fleet.organizations)} organizaciones, {len(fleet.machines)} máquinas, "
+        f"{fleet.history_points} puntos de historial; latencia base {args.latency * 1000:.0f} ms, "
+        f"errores {args.error_rate:.0%}; {args.users} usuarios, {'en frío' if args.cold else 'con caché'}",
+        file=sys.stderr
+    )
+
+    header = f"{'ruta':<18} {'peticiones':>10} {'errores':>8} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  llamadas a la API"
+    print(header)
+    for route in args.routes:
+        api.reset_counters()
+        stats = runner.run(route_paths(route, fleet, args.requests, rng))
+        calls = ', '.join(f"{endpoint}={api.calls[endpoint]}" for endpoint in ENDPOINTS if api.calls[endpoint])
+        print(
+            f"{route:<18} {stats['requests']:>10} {stats['errors']:>8} {stats['rps']:>8.1f} "
+            f"{stats['p50']:>9.1f} {stats['p95']:>9.1f} {stats['p99']:>9.1f}  {calls or '-'}"
+        )
+
+    api.stop()
+
+
+if __name__ == '__main__':
+    main()
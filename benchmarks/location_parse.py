@@ -0,0 +1,80 @@
+"""Micro-benchmark del parseo de respuestas de locationHistory por máquina.
+
+Compara la implementación anterior (formatear el payload completo en el log y
+ordenar todos los puntos) con latest_history_location (una pasada lineal y sin
+registrar el payload).
+
+    python -m benchmarks.location_parse --points 100 1000 10000
+"""
+import argparse
+import logging
+import random
+import timeit
+from datetime import datetime, timedelta
+
+from john_deere_api import latest_history_location
+
+logger = logging.getLogger('benchmarks.location_parse')
+
+
+def synthetic_history(points, seed=42):
+    """Respuesta de locationHistory con `points` puntos en orden aleatorio."""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    values = []
+    for i in range(points):
+        timestamp = start + timedelta(seconds=30 * i)
+        values.append({
+            'eventTimestamp': timestamp.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'gpsFixTimestamp': timestamp.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'point': {'lat': 41.0 + rng.random(), 'lon': -93.0 + rng.random(), 'altitude': 300.0}
+        })
+    rng.shuffle(values)
+    return {'values': values}
+
+
+def legacy_parse(data):
+    """Implementación previa: log del payload completo y ordenación de todos los puntos."""
+    logger.info(f"Received machine location history response: {data}")
+    location_values = data['values']
+    if len(location_values) > 1:
+        location_data = sorted(location_values, key=lambda x: x.get('eventTimestamp', '0'), reverse=True)[0]
+    else:
+        location_data = location_values[0]
+    point = location_data['point']
+    return {
+        'longitude': point['lon'],
+        'latitude': point['lat'],
+        'timestamp': location_data.get('eventTimestamp') or location_data.get('gpsFixTimestamp')
+    }
+
+
+def current_parse(data):
+    return latest_history_location(data['values'])
+
+
+def measure(func, data, repeat):
+    runs = timeit.repeat(lambda: func(data), number=1, repeat=repeat)
+    return min(runs) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    # El log se procesa pero se descarta, como en producción con un handler lento desactivado
+    logging.basicConfig(level=logging.INFO, handlers=[logging.NullHandler()])
+
+    print(f"{'puntos':>8} {'antes (ms)':>12} {'después (ms)':>14} {'mejora':>8}")
+    for points in args.points:
+        data = synthetic_history(points)
+        assert legacy_parse(data) == current_parse(data)
+        before = measure(legacy_parse, data, args.repeat)
+        after = measure(current_parse, data, args.repeat)
+        print(f"{points:>8} {before:>12.3f} {after:>14.3f} {before / after:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Benchmark del resumen de movimiento de /api/location-history/<org>/summary.
+
+Guarda en un almacén de telemetría temporal un mes de locationHistory
+sintético (300 máquinas, un punto cada 2 minutos durante la jornada, con
+paradas y una pausa sin puntos al mediodía) y mide:
+  - summarize_days() sobre todos los puntos en memoria (solo NumPy),
+  - el primer resumen del mes, que calcula y guarda todos los días desde los puntos,
+  - el resumen siguiente, que se responde con los días ya guardados,
+  - el resumen tras guardar los puntos de hoy, que solo recalcula hoy y ayer.
+Comprueba que los resúmenes por días coinciden con el cálculo de una sola
+pasada sobre todos los puntos.
+
+    python -m benchmarks.movement --machines 300 --days 30
+"""
+import argparse
+import math
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from movement_analytics import epoch_seconds, movement_summary, summarize_days
+from telemetry_store import TelemetryStore
+
+
+def synthetic_day(rng, day, interval):
+    """Valores de locationHistory de una jornada: pasadas a ~8 km/h con paradas y pausa al mediodía."""
+    start = datetime(day.year, day.month, day.day, 7, tzinfo=timezone.utc) + timedelta(minutes=int(rng.integers(0, 60)))
+    offsets = np.arange(0, 9 * 3600, interval)
+    # Pausa de 45 minutos sin puntos (máquina apagada)
+    offsets = offsets[(offsets < 4 * 3600) | (offsets >= 4 * 3600 + 45 * 60)]
+    speeds = np.where(rng.random(len(offsets)) < 0.2, 0.0, rng.uniform(6, 10, len(offsets))) / 3.6
+    headings = np.cumsum(rng.normal(0, 0.3, len(offsets)))
+    steps = speeds * interval
+    north = np.cumsum(steps * np.cos(headings)) + rng.normal(0, 2, len(offsets))
+    east = np.cumsum(steps * np.sin(headings)) + rng.normal(0, 2, len(offsets))
+    latitude = 41.5 + rng.uniform(-2, 2)
+    longitude = -93.5 + rng.uniform(-2, 2)
+    return [
+        {
+            'eventTimestamp': (start + timedelta(seconds=int(offset))).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'point': {'lat': latitude + y / 111320, 'lon': longitude + x / (111320 * math.cos(math.radians(latitude)))}
+        }
+        for offset, y, x in zip(offsets.tolist(), north.tolist(), east.tolist())
+    ]
+
+
+def measure(func):
+    started = time.perf_counter()
+    value = func()
+    return value, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--machines', type=int, default=300)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--interval', type=int, default=120, help="Segundos entre puntos")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(3)
+    today = datetime.now(timezone.utc).date()
+    first_day = today - timedelta(days=args.days - 1)
+    machine_ids = [str(700000 + index) for index in range(args.machines)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = TelemetryStore(os.path.join(directory, 'telemetry.sqlite3'))
+        for machine_id in machine_ids:
+            values = []
+            for offset in range(args.days - 1):
+                values.extend(synthetic_day(rng, first_day + timedelta(days=offset), args.interval))
+            store.save_location_points(machine_id, values)
+        points = store.stats()['location_points']
+
+        # Todos los puntos en memoria, ordenados por máquina y tiempo
+        rows = [store.get_point_rows(machine_id, '', '9999') for machine_id in machine_ids]
+        machines = np.repeat(np.arange(len(rows)), [len(machine_rows) for machine_rows in rows])
+        flat = [row for machine_rows in rows for row in machine_rows]
+        seconds = epoch_seconds([row[0] for row in flat])
+        latitudes = [row[1] for row in flat]
+        longitudes = [row[2] for row in flat]
+        one_pass, vectorized_ms = measure(lambda: summarize_days(machines, seconds, latitudes, longitudes))
+
+        summary, cold_ms = measure(lambda: movement_summary(store, machine_ids, first_day, today))
+        warm, warm_ms = measure(lambda: movement_summary(store, machine_ids, first_day, today))
+        assert warm == summary
+
+        # Comprobación: la suma de los días guardados coincide con la pasada única
+        for index in (0, len(machine_ids) - 1):
+            mine = one_pass['machine'] == index
+            assert math.isclose(summary[machine_ids[index]]['distance_km'],
+                                round(one_pass['distance'][mine].sum() / 1000, 3), abs_tol=1e-3)
+            assert summary[machine_ids[index]]['moving_segments'] == one_pass['moving_segments'][mine].sum()
+            assert summary[machine_ids[index]]['points'] == one_pass['points'][mine].sum()
+
+        for machine_id in machine_ids:
+            store.save_location_points(machine_id, synthetic_day(rng, today, args.interval))
+        updated, update_ms = measure(lambda: movement_summary(store, machine_ids, first_day, today))
+        assert all(updated[machine_id]['points'] > summary[machine_id]['points'] for machine_id in machine_ids)
+
+    distance = sum(record['distance_km'] for record in summary.values())
+    print(f"{args.machines} máquinas, {args.days} días, {points} puntos, {distance:.0f} km recorridos")
+    print(f"  summarize_days en memoria  {vectorized_ms:8.1f} ms")
+    print(f"  primer resumen (desde puntos) {cold_ms:8.1f} ms")
+    print(f"  resumen con días guardados {warm_ms:8.1f} ms")
+    print(f"  resumen tras los puntos de hoy {update_ms:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Benchmark del índice espacial de /api/machines/<org>/in-bbox.
+
+Con una flota sintética (50 000 máquinas por defecto) mide:
+  - la construcción del índice (primer sync()),
+  - sync() sin cambios (lo que cuesta en cada petición) y con un 1 % de
+    máquinas desplazadas (actualización incremental),
+  - consultas (IDs dentro del rectángulo) del tamaño de una vista de mapa a
+    distintos zooms, frente a recorrer las columnas de la instantánea,
+  - la respuesta completa: consulta + to_json() de las máquinas de la vista,
+    frente a serializar toda la flota.
+Comprueba que el índice devuelve lo mismo que el recorrido lineal.
+
+    python -m benchmarks.spatial_index --machines 50000
+"""
+import argparse
+import random
+import timeit
+
+from benchmarks.fleet_snapshot import synthetic_machines
+from fleet_snapshot import FleetSnapshot
+from spatial_index import GridIndex
+
+# Ancho en grados de la vista del mapa (aprox. 1000 px de ancho) según el zoom
+VIEWPORT_DEGREES = {6: 22.0, 8: 5.5, 10: 1.4, 12: 0.35}
+
+
+def linear_scan(snapshot, min_lat, min_lon, max_lat, max_lon):
+    latitudes = snapshot.latitudes
+    longitudes = snapshot.longitudes
+    return [
+        index for index in range(len(snapshot))
+        if min_lat <= latitudes[index] <= max_lat and min_lon <= longitudes[index] <= max_lon
+    ]
+
+
+def index_query(index, snapshot, bbox):
+    return sorted(snapshot.position(machine_id) for machine_id in index.query(*bbox))
+
+
+def viewports(rng, width, count):
+    """Rectángulos de width x width/2 grados centrados en puntos de la zona de la flota."""
+    boxes = []
+    for _ in range(count):
+        latitude = 41.5 + rng.uniform(-5, 5)
+        longitude = -93.5 + rng.uniform(-5, 5)
+        boxes.append((max(latitude - width / 4, -90), max(longitude - width / 2, -180),
+                      min(latitude + width / 4, 90), min(longitude + width / 2, 180)))
+    return boxes
+
+
+def moved(snapshot, rng, fraction):
+    """Copia de la instantánea con una fracción de las máquinas desplazadas unos metros."""
+    columns = snapshot.to_columns()
+    for index in rng.sample(range(len(snapshot)), int(len(snapshot) * fraction)):
+        if columns['latitudes'][index] is not None:
+            columns['latitudes'][index] += rng.uniform(-0.01, 0.01)
+            columns['longitudes'][index] += rng.uniform(-0.01, 0.01)
+    return FleetSnapshot.from_columns(columns)
+
+
+def measure(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--machines', type=int, default=50000)
+    parser.add_argument('--cell', type=float, default=0.5, help="Tamaño de celda en grados")
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    snapshot = FleetSnapshot.from_machines(synthetic_machines(args.machines))
+    index = GridIndex(args.cell)
+    build_ms = measure(lambda: GridIndex(args.cell).sync(snapshot), args.repeat)
+    index.sync(snapshot)
+    # sync() compara con las columnas de la última instantánea: una copia igual no cambia nada
+    same = FleetSnapshot.from_columns(snapshot.to_columns())
+    unchanged_ms = measure(lambda: index.sync(same), args.repeat)
+
+    shifted = moved(snapshot, rng, 0.01)
+    incremental = []
+    for _ in range(args.repeat):
+        index.sync(snapshot)
+        incremental.append(measure(lambda: index.sync(shifted), 1))
+    moved_count = sum(1 for a, b in zip(snapshot.latitudes, shifted.latitudes) if a != b and a == a)
+    assert index.sync(snapshot) == moved_count
+
+    print(f"{args.machines} máquinas, {index.stats()['cells']} celdas de {args.cell}°")
+    print(f"  construcción {build_ms:8.1f} ms")
+    print(f"  sync sin cambios {unchanged_ms:8.2f} ms")
+    print(f"  sync 1 % movidas {min(incremental):8.2f} ms")
+    print()
+    print(f"{'zoom':>5} {'en vista':>9} {'lineal ms':>10} {'índice ms':>10} {'mejora':>8} "
+          f"{'JSON flota ms':>14} {'JSON vista ms':>14}")
+    full_json_ms = measure(snapshot.to_json, args.repeat)
+    for zoom, width in VIEWPORT_DEGREES.items():
+        boxes = viewports(rng, width, args.queries)
+        # Incluye un rectángulo que cruza el antimeridiano para la comprobación
+        for bbox in boxes + [(40.0, 170.0, 45.0, -170.0)]:
+            expected = linear_scan(snapshot, *bbox) if bbox[1] <= bbox[3] else sorted(
+                linear_scan(snapshot, bbox[0], bbox[1], bbox[2], 180.0)
+                + linear_scan(snapshot, bbox[0], -180.0, bbox[2], bbox[3])
+            )
+            assert index_query(index, snapshot, bbox) == expected
+        in_view = sum(len(linear_scan(snapshot, *bbox)) for bbox in boxes) / len(boxes)
+        linear_ms = measure(lambda: [linear_scan(snapshot, *bbox) for bbox in boxes], args.repeat) / len(boxes)
+        index_ms = measure(lambda: [index.query(*bbox) for bbox in boxes], args.repeat) / len(boxes)
+        # Respuesta de la ruta: consulta, posiciones en la instantánea y JSON (con pocas vistas:
+        # a zoom bajo cada una lleva decenas de miles de máquinas)
+        sample = boxes[:10]
+        view_json_ms = measure(
+            lambda: [snapshot.to_json(indexes=index_query(index, snapshot, bbox)) for bbox in sample], args.repeat
+        ) / len(sample)
+        print(f"{zoom:>5} {in_view:>9.0f} {linear_ms:>10.2f} {index_ms:>10.2f} {linear_ms / index_ms:>7.1f}x "
+              f"{full_json_ms:>14.1f} {view_json_ms:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark de la simplificación de trayectorias de /api/machine/<id>/trajectory.
+
+Genera el día de una máquina con un punto por segundo (traslado por carretera,
+pasadas de ida y vuelta en un campo con ruido GPS y una parada) y, para cada
+método y tolerancia, mide los puntos y el tamaño del JSON que quedan, el tiempo
+de simplify() y la desviación máxima de los puntos originales respecto a la
+polilínea simplificada (la forma del recorrido).
+
+    python -m benchmarks.trajectory --points 86400
+"""
+import argparse
+import json
+import math
+import time
+
+import numpy as np
+
+from trajectory import project, simplify, tolerance_for_zoom
+
+
+def synthetic_day(count, seed=5):
+    """Puntos {timestamp, latitude, longitude} de un día de trabajo en Iowa."""
+    rng = np.random.default_rng(seed)
+    seconds = np.arange(count)
+    x = np.empty(count)
+    y = np.empty(count)
+    transit = count // 10
+    parked = count // 10
+    field = count - transit - parked
+    # Traslado: 15 m/s por una carretera con curvas suaves
+    x[:transit] = seconds[:transit] * 15.0
+    y[:transit] = 400 * np.sin(seconds[:transit] / 600)
+    # Campo: pasadas de 800 m a 3 m/s separadas 12 m
+    distance = seconds[:field] * 3.0
+    rows = distance // 800
+    along = distance % 800
+    x[transit:transit + field] = x[transit - 1] + np.where(rows % 2 == 0, along, 800 - along)
+    y[transit:transit + field] = y[transit - 1] + rows * 12.0
+    # Parada: la misma posición
+    x[transit + field:] = x[transit + field - 1]
+    y[transit + field:] = y[transit + field - 1]
+    x += rng.normal(0, 0.5, count)
+    y += rng.normal(0, 0.5, count)
+    latitudes = 41.5 + y / 111320
+    longitudes = -93.5 + x / (111320 * math.cos(math.radians(41.5)))
+    return [
+        {'timestamp': f"2025-01-15T{second // 3600 % 24:02d}:{second // 60 % 60:02d}:{second % 60:02d}.000Z",
+         'latitude': round(float(latitude), 7), 'longitude': round(float(longitude), 7)}
+        for second, latitude, longitude in zip(seconds.tolist(), latitudes, longitudes)
+    ]
+
+
+def max_deviation(x, y, kept):
+    """Distancia máxima (m) de los puntos originales al tramo simplificado que los cubre."""
+    segment = np.searchsorted(kept, np.arange(len(x)), side='right') - 1
+    segment = np.clip(segment, 0, len(kept) - 2)
+    first = kept[segment]
+    last = kept[segment + 1]
+    dx = x[last] - x[first]
+    dy = y[last] - y[first]
+    px = x - x[first]
+    py = y - y[first]
+    length = dx * dx + dy * dy
+    t = np.clip(np.divide(px * dx + py * dy, length, out=np.zeros_like(length), where=length > 0), 0, 1)
+    return float(np.max(np.hypot(px - t * dx, py - t * dy)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, default=86400)
+    args = parser.parse_args()
+
+    points = synthetic_day(args.points)
+    positions = {id(point): index for index, point in enumerate(points)}
+    x, y = project(np.array([point['latitude'] for point in points]),
+                   np.array([point['longitude'] for point in points]))
+    original_kb = len(json.dumps(points, separators=(',', ':'))) / 1024
+    print(f"{len(points)} puntos, {original_kb:.0f} KB")
+    print(f"{'método':>6} {'tolerancia':>11} {'puntos':>8} {'KB':>8} {'reducción':>10} {'ms':>7} {'desviación m':>13}")
+    tolerances = [('1 m', 1.0), ('5 m', 5.0), ('zoom 16', tolerance_for_zoom(16, 41.5)),
+                  ('zoom 13', tolerance_for_zoom(13, 41.5)), ('zoom 10', tolerance_for_zoom(10, 41.5))]
+    for method in ('dp', 'vw'):
+        for label, tolerance in tolerances:
+            started = time.perf_counter()
+            simplified = simplify(points, tolerance, method)
+            elapsed = (time.perf_counter() - started) * 1000
+            kept = np.array([positions[id(point)] for point in simplified])
+            size_kb = len(json.dumps(simplified, separators=(',', ':'))) / 1024
+            deviation = max_deviation(x, y, kept)
+            # Douglas-Peucker garantiza que ningún punto queda a más de la tolerancia
+            if method == 'dp':
+                assert deviation <= tolerance + 1e-6
+            print(f"{method:>6} {label:>11} {len(simplified):>8} {size_kb:>8.1f} {original_kb / size_kb:>9.0f}x "
+                  f"{elapsed:>7.0f} {deviation:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
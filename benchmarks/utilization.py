@@ -0,0 +1,111 @@
+"""Benchmark de la utilización de /api/utilization/<org>.
+
+Guarda en un almacén de telemetría temporal las lecturas de horómetro de una
+flota sintética (una lectura por hora, con jornadas de uso y días parados) tal
+como llegan del poller, lectura a lectura, y mide:
+  - el coste de guardar una lectura con sus acumulados (y el de un lote desordenado),
+  - utilization_report() por día, semana y mes sobre todo el rango, leyendo los acumulados,
+  - el mismo cálculo desde las lecturas (leerlas todas y repartir cada tramo).
+Comprueba que ambos dan las mismas horas.
+
+    python -m benchmarks.utilization --machines 300 --days 60
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from engine_hours import PERIODS, usage_by_period, utilization_report
+from telemetry_store import TelemetryStore
+
+
+def synthetic_readings(rng, first_day, days, interval):
+    """Lecturas horarias: de 7 a 17 h el motor funciona con probabilidad variable por máquina."""
+    busy = rng.uniform(0.2, 0.9)
+    hours = round(rng.uniform(100, 9000), 1)
+    start = datetime(first_day.year, first_day.month, first_day.day, tzinfo=timezone.utc)
+    readings = []
+    for step in range(days * 86400 // interval):
+        moment = start + timedelta(seconds=step * interval)
+        if 7 <= moment.hour < 17 and rng.random() < busy:
+            hours = round(hours + interval / 3600, 1)
+        readings.append({
+            'reading': {'valueAsDouble': hours, 'unit': 'Hours'},
+            'reportTime': moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+        })
+    return readings
+
+
+def report_from_readings(store, machine_ids, period, first_start, last_start):
+    """Horas por máquina y periodo recalculadas desde las lecturas guardadas."""
+    conn = store._connect()
+    used = defaultdict(float)
+    for machine_id in machine_ids:
+        rows = conn.execute(
+            'SELECT report_time, hours FROM engine_hour_readings WHERE machine_id = ? ORDER BY report_time',
+            (machine_id,)
+        ).fetchall()
+        for previous, current in zip(rows, rows[1:]):
+            for (usage_period, start), hours in usage_by_period(*previous, *current).items():
+                if usage_period == period and first_start <= start <= last_start:
+                    used[machine_id] += hours
+    return used
+
+
+def measure(func):
+    started = time.perf_counter()
+    value = func()
+    return value, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--machines', type=int, default=300)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--interval', type=int, default=3600, help="Segundos entre lecturas")
+    args = parser.parse_args()
+
+    rng = random.Random(9)
+    today = datetime.now(timezone.utc).date()
+    first_day = today - timedelta(days=args.days)
+    machine_ids = [str(800000 + index) for index in range(args.machines)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = TelemetryStore(os.path.join(directory, 'telemetry.sqlite3'))
+        started = time.perf_counter()
+        count = 0
+        for index, machine_id in enumerate(machine_ids):
+            readings = synthetic_readings(rng, first_day, args.days, args.interval)
+            if index == 0:
+                # Una máquina recibe sus lecturas desordenadas y en lotes
+                shuffled = readings[:]
+                rng.shuffle(shuffled)
+                for offset in range(0, len(shuffled), 50):
+                    store.save_engine_hour_readings(machine_id, {'values': shuffled[offset:offset + 50]})
+            else:
+                for reading in readings:
+                    store.save_engine_hour_readings(machine_id, {'values': [reading]})
+            count += len(readings)
+        ingest_ms = (time.perf_counter() - started) * 1000
+
+        print(f"{args.machines} máquinas, {args.days} días, {count} lecturas")
+        print(f"  guardar una lectura con sus acumulados {ingest_ms * 1000 / count:8.1f} µs")
+        print(f"{'periodo':>8} {'acumulados ms':>14} {'desde lecturas ms':>18} {'mejora':>8}")
+        for period in PERIODS:
+            (machines, _totals), rollup_ms = measure(
+                lambda: utilization_report(store, machine_ids, period, first_day, today)
+            )
+            starts = [entry['start'] for entry in machines[machine_ids[0]]['periods']]
+            recomputed, readings_ms = measure(
+                lambda: report_from_readings(store, machine_ids, period, starts[0], starts[-1])
+            )
+            for machine_id in machine_ids:
+                assert abs(machines[machine_id]['hours'] - recomputed[machine_id]) < 0.05, machine_id
+            print(f"{period:>8} {rollup_ms:>14.1f} {readings_ms:>18.1f} {readings_ms / rollup_ms:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
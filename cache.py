@@ -0,0 +1,708 @@
+"""Caché de servidor para las respuestas de la API de John Deere.
+
+Las funciones fetch_* de john_deere_api se decoran con @cached(recurso, key=...)
+y cada recurso tiene su propio TTL (organizaciones: horas, lista de equipos:
+minutos, ubicaciones: decenas de segundos). Las claves incluyen siempre el
+usuario (un hash del token) y la organización o máquina consultada.
+
+Para respuestas que no deben bloquear al usuario existe además
+get_stale_while_revalidate(): devuelve la última copia conocida al instante y la
+refresca en segundo plano, con un único refresco simultáneo por clave tanto
+dentro del proceso como entre workers (mediante un "lease" en el backend).
+
+Las funciones async de john_deere_async usan la misma caché (mismas claves) con
+@async_cached y get_stale_while_revalidate_async().
+
+Hay dos backends intercambiables:
+  - MemoryCacheBackend: LRU en memoria del proceso, con límite de bytes.
+  - SQLiteCacheBackend: fichero SQLite local compartido por todos los workers
+    de gunicorn, también con desalojo LRU por tamaño total.
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from config import (
+    CACHE_BACKEND,
+    CACHE_LEASE_SECONDS,
+    CACHE_MAX_BYTES,
+    CACHE_PATH,
+    CACHE_REFRESH_WORKERS,
+    CACHE_TTLS
+)
+
+logger = logging.getLogger(__name__)
+
+
+def user_scope(token):
+    """Identificador estable (y no reversible) del usuario dueño de un token."""
+    token = token or {}
+    secret = token.get('refresh_token') or token.get('access_token') or ''
+    return hashlib.sha256(secret.encode('utf-8')).hexdigest()[:16]
+
+
+def make_key(resource, parts):
+    return ':'.join([resource] + [str(part) for part in parts])
+
+
+class CacheEntry:
+    __slots__ = ('value', 'stored_at', 'expires_at')
+
+    def __init__(self, value, stored_at, expires_at):
+        self.value = value
+        self.stored_at = stored_at
+        self.expires_at = expires_at
+
+    @property
+    def age(self):
+        return time.time() - self.stored_at
+
+    @property
+    def is_fresh(self):
+        return time.time() < self.expires_at
+
+
+class MemoryCacheBackend:
+    """LRU en memoria con límite aproximado de bytes (tamaño del JSON)."""
+
+    name = 'memory'
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._leases = {}
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            self._entries.move_to_end(key)
+            entry, _size = item
+            return entry
+
+    def get_many(self, keys):
+        entries = {}
+        for key in keys:
+            entry = self.get(key)
+            if entry is not None:
+                entries[key] = entry
+        return entries
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        size = len(json.dumps(value, default=str))
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[1]
+            self._entries[key] = (CacheEntry(value, now, now + ttl), size)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                _key, (_entry, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self.evictions += 1
+
+    def set_many(self, items, ttl):
+        for key, value in items:
+            self.set(key, value, ttl)
+
+    def delete(self, key):
+        with self._lock:
+            item = self._entries.pop(key, None)
+            if item is not None:
+                self._total_bytes -= item[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def acquire_lease(self, key, owner, seconds):
+        now = time.time()
+        with self._lock:
+            holder = self._leases.get(key)
+            if holder is not None and holder[1] > now and holder[0] != owner:
+                return False
+            self._leases[key] = (owner, now + seconds)
+            return True
+
+    def release_lease(self, key, owner):
+        with self._lock:
+            holder = self._leases.get(key)
+            if holder is not None and holder[0] == owner:
+                del self._leases[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.name,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions
+            }
+
+
+class SQLiteCacheBackend:
+    """Caché en un fichero SQLite compartido entre procesos.
+
+    Cada hilo usa su propia conexión. El orden LRU se mantiene con la columna
+    accessed_at y el desalojo se hace cuando la suma de tamaños supera max_bytes.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self.evictions = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache_entries (accessed_at)')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_leases (
+                    key TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT value, stored_at, expires_at FROM cache_entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute('UPDATE cache_entries SET accessed_at = ? WHERE key = ?', (time.time(), key))
+        return CacheEntry(json.loads(row[0]), row[1], row[2])
+
+    def get_many(self, keys):
+        """Lee varias claves con una consulta por cada 500 (límite de parámetros de SQLite)."""
+        conn = self._connect()
+        entries = {}
+        keys = list(keys)
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for key, value, stored_at, expires_at in conn.execute(
+                f'SELECT key, value, stored_at, expires_at FROM cache_entries WHERE key IN ({placeholders})', chunk
+            ):
+                entries[key] = CacheEntry(json.loads(value), stored_at, expires_at)
+            conn.execute(f'UPDATE cache_entries SET accessed_at = ? WHERE key IN ({placeholders})', [time.time()] + chunk)
+        return entries
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        payload = json.dumps(value, default=str)
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache_entries (key, value, size, stored_at, expires_at, accessed_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (key, payload, len(payload), now, now + ttl, now)
+        )
+        self._evict(conn)
+
+    def set_many(self, items, ttl):
+        """Guarda varias entradas en una sola transacción (un único desalojo al final)."""
+        now = time.time()
+        rows = []
+        for key, value in items:
+            payload = json.dumps(value, default=str)
+            rows.append((key, payload, len(payload), now, now + ttl, now))
+        if not rows:
+            return
+        conn = self._connect()
+        conn.execute('BEGIN')
+        try:
+            conn.executemany(
+                'INSERT OR REPLACE INTO cache_entries (key, value, size, stored_at, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache_entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in conn.execute('SELECT key, size FROM cache_entries ORDER BY accessed_at'):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany('DELETE FROM cache_entries WHERE key = ?', victims)
+        self.evictions += len(victims)
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connect().execute('DELETE FROM cache_entries')
+
+    def acquire_lease(self, key, owner, seconds):
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM cache_leases WHERE key = ? AND expires_at < ?', (key, now))
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO cache_leases (key, owner, expires_at) VALUES (?, ?, ?)',
+                (key, owner, now + seconds)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return cursor.rowcount == 1
+
+    def release_lease(self, key, owner):
+        self._connect().execute('DELETE FROM cache_leases WHERE key = ? AND owner = ?', (key, owner))
+
+    def stats(self):
+        entries, total = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries'
+        ).fetchone()
+        return {
+            'backend': self.name,
+            'path': self.path,
+            'entries': entries,
+            'bytes': total,
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions
+        }
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave en una sola ejecución.
+
+    El primer hilo ejecuta la función; los demás esperan su resultado.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key, func):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+class AsyncSingleFlight:
+    """Equivalente de SingleFlight para corrutinas dentro de un bucle de eventos.
+
+    La primera corrutina crea la tarea; las demás esperan la misma tarea.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+
+    def in_flight(self, key):
+        return key in self._tasks
+
+    async def do(self, key, coro_func):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_func())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _task: self._tasks.pop(key, None))
+        # shield: cancelar a un cliente no cancela la carga que esperan los demás
+        return await asyncio.shield(task)
+
+
+class FetchCache:
+    """Caché por recurso con TTL propio y contadores de aciertos/fallos."""
+
+    def __init__(self, backend, ttls=None):
+        self.backend = backend
+        self.ttls = dict(CACHE_TTLS if ttls is None else ttls)
+        self._lock = threading.Lock()
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self.stale_hits = defaultdict(int)
+        self.refreshes = defaultdict(int)
+        self._flight = SingleFlight()
+        self._async_flight = AsyncSingleFlight()
+        self._background_tasks = set()
+        self._refresher = None
+        self._owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def ttl_for(self, resource):
+        return self.ttls.get(resource, 60)
+
+    def _record(self, resource, hit):
+        with self._lock:
+            if hit:
+                self.hits[resource] += 1
+            else:
+                self.misses[resource] += 1
+
+    def _count(self, counter, resource):
+        with self._lock:
+            counter[resource] += 1
+
+    def get_entry(self, resource, key_parts):
+        """Devuelve la entrada almacenada (aunque esté expirada) o None."""
+        try:
+            return self.backend.get(make_key(resource, key_parts))
+        except Exception as e:
+            logger.warning(f"Error leyendo caché para {resource}: {str(e)}")
+            return None
+
+    def get_many(self, resource, key_parts_list):
+        """Devuelve {key_parts: valor} con las entradas vigentes de varias claves de un recurso."""
+        keys = {make_key(resource, key_parts): key_parts for key_parts in key_parts_list}
+        try:
+            entries = self.backend.get_many(keys)
+        except Exception as e:
+            logger.warning(f"Error leyendo caché para {resource}: {str(e)}")
+            entries = {}
+        values = {keys[key]: entry.value for key, entry in entries.items() if entry.is_fresh}
+        with self._lock:
+            self.hits[resource] += len(values)
+            self.misses[resource] += len(keys) - len(values)
+        return values
+
+    def set(self, resource, key_parts, value, ttl=None):
+        try:
+            self.backend.set(make_key(resource, key_parts), value, ttl or self.ttl_for(resource))
+        except Exception as e:
+            logger.warning(f"Error escribiendo caché para {resource}: {str(e)}")
+
+    def set_many(self, resource, items, ttl=None):
+        """Guarda varias entradas de un recurso: items es una lista de (key_parts, valor)."""
+        ttl = ttl or self.ttl_for(resource)
+        if ttl <= 0:
+            return
+        try:
+            self.backend.set_many([(make_key(resource, key_parts), value) for key_parts, value in items], ttl)
+        except Exception as e:
+            logger.warning(f"Error escribiendo caché para {resource}: {str(e)}")
+
+    def invalidate(self, resource, key_parts):
+        self.backend.delete(make_key(resource, key_parts))
+
+    def get_or_load(self, resource, key_parts, loader, ttl=None):
+        """Devuelve el valor en caché si sigue vigente; si no, llama a loader()."""
+        entry = self.get_entry(resource, key_parts)
+        if entry is not None and entry.is_fresh:
+            self._record(resource, hit=True)
+            return entry.value
+
+        self._record(resource, hit=False)
+        value = loader()
+        self.set(resource, key_parts, value, ttl)
+        return value
+
+    def _refresh(self, resource, key_parts, loader, ttl):
+        """Carga y guarda un valor si este proceso consigue el lease de la clave.
+
+        Devuelve True si se refrescó, False si otro worker ya lo está haciendo.
+        """
+        lease_key = make_key(resource, key_parts)
+        if not self.backend.acquire_lease(lease_key, self._owner, CACHE_LEASE_SECONDS):
+            return False
+        try:
+            self._count(self.refreshes, resource)
+            self.set(resource, key_parts, loader(), ttl)
+            return True
+        finally:
+            self.backend.release_lease(lease_key, self._owner)
+
+    def _refresh_in_background(self, resource, key_parts, loader, ttl):
+        flight_key = make_key(resource, key_parts)
+        if self._flight.in_flight(flight_key):
+            return
+
+        def task():
+            try:
+                self._flight.do(flight_key, lambda: self._refresh(resource, key_parts, loader, ttl))
+            except Exception as e:
+                logger.warning(f"Error refrescando en segundo plano {flight_key}: {str(e)}")
+
+        with self._lock:
+            if self._refresher is None:
+                self._refresher = ThreadPoolExecutor(
+                    max_workers=CACHE_REFRESH_WORKERS, thread_name_prefix='cache-refresh'
+                )
+        self._refresher.submit(task)
+
+    def _load_blocking(self, resource, key_parts, loader, ttl):
+        """Carga un valor ausente con un único refresco por clave.
+
+        Si otro worker tiene el lease, espera a que publique el resultado
+        (como mucho CACHE_LEASE_SECONDS) antes de cargarlo por su cuenta.
+        """
+        flight_key = make_key(resource, key_parts)
+
+        def load():
+            deadline = time.time() + CACHE_LEASE_SECONDS
+            while not self._refresh(resource, key_parts, loader, ttl):
+                entry = self.get_entry(resource, key_parts)
+                if entry is not None:
+                    return entry
+                if time.time() > deadline:
+                    value = loader()
+                    self.set(resource, key_parts, value, ttl)
+                    break
+                time.sleep(0.25)
+            return self.get_entry(resource, key_parts)
+
+        entry = self._flight.do(flight_key, load)
+        if entry is None:
+            # El backend no pudo guardar el valor: se carga directamente
+            return CacheEntry(loader(), time.time(), time.time())
+        return entry
+
+    def get_stale_while_revalidate(self, resource, key_parts, loader, ttl=None):
+        """Devuelve (valor, edad en segundos, estado) sin esperar a refrescos.
+
+        estado es 'fresh' (vigente), 'stale' (expirado; se refresca en segundo
+        plano) o 'miss' (no había copia y se cargó en esta llamada).
+        """
+        entry = self.get_entry(resource, key_parts)
+        if entry is not None and entry.is_fresh:
+            self._record(resource, hit=True)
+            return entry.value, entry.age, 'fresh'
+
+        if entry is not None:
+            self._count(self.stale_hits, resource)
+            self._refresh_in_background(resource, key_parts, loader, ttl)
+            return entry.value, entry.age, 'stale'
+
+        self._record(resource, hit=False)
+        entry = self._load_blocking(resource, key_parts, loader, ttl)
+        return entry.value, entry.age, 'miss'
+
+    async def get_or_load_async(self, resource, key_parts, loader, ttl=None):
+        """Como get_or_load(), pero loader es una función async.
+
+        Las lecturas y escrituras del backend (SQLite) se hacen en un hilo para no bloquear el bucle.
+        """
+        entry = await asyncio.to_thread(self.get_entry, resource, key_parts)
+        if entry is not None and entry.is_fresh:
+            self._record(resource, hit=True)
+            return entry.value
+
+        self._record(resource, hit=False)
+
+        async def load():
+            value = await loader()
+            await asyncio.to_thread(self.set, resource, key_parts, value, ttl)
+            return value
+
+        return await self._async_flight.do(make_key(resource, key_parts), load)
+
+    async def _refresh_async(self, resource, key_parts, loader, ttl):
+        lease_key = make_key(resource, key_parts)
+        if not await asyncio.to_thread(self.backend.acquire_lease, lease_key, self._owner, CACHE_LEASE_SECONDS):
+            return False
+        try:
+            self._count(self.refreshes, resource)
+            value = await loader()
+            await asyncio.to_thread(self.set, resource, key_parts, value, ttl)
+            return True
+        finally:
+            await asyncio.to_thread(self.backend.release_lease, lease_key, self._owner)
+
+    async def _load_blocking_async(self, resource, key_parts, loader, ttl):
+        async def load():
+            deadline = time.time() + CACHE_LEASE_SECONDS
+            while not await self._refresh_async(resource, key_parts, loader, ttl):
+                entry = await asyncio.to_thread(self.get_entry, resource, key_parts)
+                if entry is not None:
+                    return entry
+                if time.time() > deadline:
+                    value = await loader()
+                    await asyncio.to_thread(self.set, resource, key_parts, value, ttl)
+                    break
+                await asyncio.sleep(0.25)
+            return await asyncio.to_thread(self.get_entry, resource, key_parts)
+
+        entry = await self._async_flight.do(make_key(resource, key_parts), load)
+        if entry is None:
+            return CacheEntry(await loader(), time.time(), time.time())
+        return entry
+
+    async def get_stale_while_revalidate_async(self, resource, key_parts, loader, ttl=None):
+        """Como get_stale_while_revalidate(), pero loader es una función async.
+
+        El refresco de una copia expirada se lanza como tarea en el mismo bucle.
+        """
+        entry = await asyncio.to_thread(self.get_entry, resource, key_parts)
+        if entry is not None and entry.is_fresh:
+            self._record(resource, hit=True)
+            return entry.value, entry.age, 'fresh'
+
+        if entry is not None:
+            self._count(self.stale_hits, resource)
+            flight_key = make_key(resource, key_parts)
+            if not self._async_flight.in_flight(flight_key):
+                task = asyncio.ensure_future(
+                    self._async_flight.do(flight_key, lambda: self._refresh_async(resource, key_parts, loader, ttl))
+                )
+                # Referencia fuerte hasta que termine; el error solo se registra
+                self._background_tasks.add(task)
+                task.add_done_callback(self._background_refresh_done)
+            return entry.value, entry.age, 'stale'
+
+        self._record(resource, hit=False)
+        entry = await self._load_blocking_async(resource, key_parts, loader, ttl)
+        return entry.value, entry.age, 'miss'
+
+    def _background_refresh_done(self, task):
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Error refrescando en segundo plano: {str(task.exception())}")
+
+    def stats(self):
+        with self._lock:
+            resources = sorted(set(self.hits) | set(self.misses) | set(self.stale_hits))
+            counters = {
+                resource: {
+                    'hits': self.hits[resource],
+                    'misses': self.misses[resource],
+                    'stale_hits': self.stale_hits[resource],
+                    'refreshes': self.refreshes[resource],
+                    'ttl': self.ttl_for(resource)
+                }
+                for resource in resources
+            }
+        try:
+            backend_stats = self.backend.stats()
+        except Exception as e:
+            backend_stats = {'backend': self.backend.name, 'error': str(e)}
+        return {'resources': counters, 'storage': backend_stats}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def create_backend(kind=CACHE_BACKEND):
+    if kind == 'memory':
+        return MemoryCacheBackend()
+    if kind == 'sqlite':
+        return SQLiteCacheBackend()
+    raise ValueError(f"Backend de caché desconocido: {kind}")
+
+
+def get_cache():
+    """Devuelve la caché del proceso, creándola según CACHE_BACKEND."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = FetchCache(create_backend())
+                except Exception as e:
+                    # Si el fichero SQLite no está disponible seguimos con caché en memoria
+                    logger.error(f"No se pudo crear la caché '{CACHE_BACKEND}': {str(e)}. Usando memoria.")
+                    _cache = FetchCache(MemoryCacheBackend())
+    return _cache
+
+
+def set_cache(cache):
+    """Reemplaza la caché del proceso (p. ej. por otro backend)."""
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+
+def cached(resource, key):
+    """Decorador que pone la caché delante de una función fetch_*.
+
+    `key` recibe los mismos argumentos que la función y devuelve la tupla con
+    las partes de la clave. La función original queda en `.uncached`.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return get_cache().get_or_load(resource, key(*args, **kwargs), lambda: func(*args, **kwargs))
+
+        wrapper.uncached = func
+        wrapper.cache_resource = resource
+        wrapper.cache_key = key
+        return wrapper
+    return decorator
+
+
+def async_cached(resource, key):
+    """Versión de @cached para funciones async (mismas claves y TTL)."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await get_cache().get_or_load_async(
+                resource, key(*args, **kwargs), lambda: func(*args, **kwargs)
+            )
+
+        wrapper.uncached = func
+        wrapper.cache_resource = resource
+        wrapper.cache_key = key
+        return wrapper
+    return decorator
@@ -1,10 +1,13 @@
 import os
+import tempfile
 
 # OAuth2 Configuration
 JOHN_DEERE_CLIENT_ID = os.environ.get('JOHN_DEERE_CLIENT_ID', '0oaaob0zcwLvdRZhw5d7')
 JOHN_DEERE_CLIENT_SECRET = os.environ.get('JOHN_DEERE_CLIENT_SECRET', '')
-JOHN_DEERE_API_BASE_URL = 'https://partnerapi.deere.com'
-JOHN_DEERE_TOKEN_URL = 'https://signin.johndeere.com/oauth2/aus78tnlaysMraFhC1t7/v1/token'
+# Las URLs base se pueden sobreescribir para apuntar a una API local de pruebas
+JOHN_DEERE_API_BASE_URL = os.environ.get('JOHN_DEERE_API_BASE_URL', 'https://partnerapi.deere.com')
+JOHN_DEERE_EQUIPMENT_API_URL = os.environ.get('JOHN_DEERE_EQUIPMENT_API_URL', 'https://equipmentapi.deere.com')
+JOHN_DEERE_TOKEN_URL = os.environ.get('JOHN_DEERE_TOKEN_URL', 'https://signin.johndeere.com/oauth2/aus78tnlaysMraFhC1t7/v1/token')
 JOHN_DEERE_AUTHORIZE_URL = 'https://signin.johndeere.com/oauth2/aus78tnlaysMraFhC1t7/v1/authorize'
 
 # Scopes needed for the application
@@ -15,6 +18,143 @@ JOHN_DEERE_SCOPES = [
     'eq1'
 ]
 
+# Número máximo de consultas de ubicación simultáneas por organización
+LOCATION_FETCH_CONCURRENCY = int(os.environ.get('LOCATION_FETCH_CONCURRENCY', '16'))
+
+# Consultas de alertas simultáneas y máximo de máquinas por petición en /api/alerts/batch
+ALERT_FETCH_CONCURRENCY = int(os.environ.get('ALERT_FETCH_CONCURRENCY', '16'))
+ALERT_BATCH_MAX_MACHINES = int(os.environ.get('ALERT_BATCH_MAX_MACHINES', '500'))
+
+# Equipos por llamada a /isg/equipment?ids= y ventana (segundos) en la que se agrupan
+# las consultas de equipos por ID que llegan a la vez (batch_loader.py)
+EQUIPMENT_BATCH_SIZE = int(os.environ.get('EQUIPMENT_BATCH_SIZE', '100'))
+EQUIPMENT_BATCH_WINDOW = float(os.environ.get('EQUIPMENT_BATCH_WINDOW', '0.01'))
+
+# Pool de conexiones HTTP compartido (por worker de gunicorn)
+HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', '4'))  # hosts distintos
+HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', '32'))  # conexiones por host
+HTTP_SESSION_CACHE_SIZE = int(os.environ.get('HTTP_SESSION_CACHE_SIZE', '256'))  # sesiones OAuth2 por token
+
+# Cliente asíncrono (john_deere_async, modo ASGI): conexiones abiertas por proceso,
+# consultas simultáneas por petición y timeout de cada llamada en segundos
+ASYNC_MAX_CONNECTIONS = int(os.environ.get('ASYNC_MAX_CONNECTIONS', '200'))
+ASYNC_FETCH_CONCURRENCY = int(os.environ.get('ASYNC_FETCH_CONCURRENCY', '64'))
+ASYNC_HTTP_TIMEOUT = float(os.environ.get('ASYNC_HTTP_TIMEOUT', '30'))
+
+# Caché de servidor para las respuestas de la API ('sqlite' se comparte entre workers, 'memory' no)
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'sqlite')
+CACHE_PATH = os.environ.get('CACHE_PATH', os.path.join(tempfile.gettempdir(), 'jdeere_cache.sqlite3'))
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# TTL en segundos por tipo de recurso
+CACHE_TTLS = {
+    'organizations': int(os.environ.get('CACHE_TTL_ORGANIZATIONS', str(6 * 60 * 60))),
+    'equipment': int(os.environ.get('CACHE_TTL_EQUIPMENT', str(5 * 60))),
+    'location': int(os.environ.get('CACHE_TTL_LOCATION', '30')),
+    # Instantánea completa (equipos + ubicaciones) servida con stale-while-revalidate
+    'machines': int(os.environ.get('CACHE_TTL_MACHINES', '60')),
+    # Trayectorias simplificadas: la clave incluye el último punto guardado de la máquina
+    'trajectory': int(os.environ.get('CACHE_TTL_TRAJECTORY', str(24 * 60 * 60)))
+}
+
+# Refrescos en segundo plano: duración máxima del lease entre workers e hilos disponibles
+CACHE_LEASE_SECONDS = int(os.environ.get('CACHE_LEASE_SECONDS', '120'))
+CACHE_REFRESH_WORKERS = int(os.environ.get('CACHE_REFRESH_WORKERS', '4'))
+
+# Almacén local de telemetría que rellena el poller (fleet_poller.py)
+TELEMETRY_DB_PATH = os.environ.get('TELEMETRY_DB_PATH', os.path.join(tempfile.gettempdir(), 'jdeere_telemetry.sqlite3'))
+TELEMETRY_MAX_AGE = int(os.environ.get('TELEMETRY_MAX_AGE', str(15 * 60)))  # segundos
+# Segundos antes de volver a pedir a la API los puntos nuevos de locationHistory de una máquina
+LOCATION_HISTORY_SYNC_TTL = int(os.environ.get('LOCATION_HISTORY_SYNC_TTL', '120'))
+# Alertas: segundos antes de que un usuario vuelva a pedir las alertas nuevas de una máquina,
+# solapamiento (segundos) con la última sincronización y ventana máxima consultable (días)
+ALERT_SYNC_TTL = int(os.environ.get('ALERT_SYNC_TTL', '60'))
+ALERT_SYNC_OVERLAP = int(os.environ.get('ALERT_SYNC_OVERLAP', '300'))
+ALERT_MAX_DAYS = int(os.environ.get('ALERT_MAX_DAYS', '365'))
+
+# Catálogo local de definiciones de DTC (dtc_catalog.py): fichero incluido con la aplicación,
+# segundos antes de volver a pedir a la API una definición que no encontró y máximo de
+# definiciones por petición en /api/alert/definitions
+DTC_CATALOG_PATH = os.environ.get(
+    'DTC_CATALOG_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'dtc_catalog.json')
+)
+DTC_MISS_TTL = int(os.environ.get('DTC_MISS_TTL', str(60 * 60)))
+DTC_LOOKUP_MAX = int(os.environ.get('DTC_LOOKUP_MAX', '500'))
+
+# Índice espacial de ubicaciones (spatial_index.py): tamaño de celda en grados y máximo
+# de máquinas devueltas por /api/machines/<org>/in-bbox
+SPATIAL_INDEX_CELL_DEGREES = float(os.environ.get('SPATIAL_INDEX_CELL_DEGREES', '0.5'))
+BBOX_MAX_MACHINES = int(os.environ.get('BBOX_MAX_MACHINES', '2000'))
+# Clusters de marcadores (/api/machines/<org>/clusters): tamaño de celda en píxeles
+# (potencia de 2) y zoom a partir del cual las máquinas ya no se agrupan
+CLUSTER_CELL_PIXELS = int(os.environ.get('CLUSTER_CELL_PIXELS', '64'))
+CLUSTER_MAX_ZOOM = int(os.environ.get('CLUSTER_MAX_ZOOM', '16'))
+
+# Trayectorias (/api/machine/<id>/trajectory): tolerancia de simplificación por defecto
+# en metros y píxeles de tolerancia cuando se pide por zoom del mapa
+TRAJECTORY_DEFAULT_TOLERANCE = float(os.environ.get('TRAJECTORY_DEFAULT_TOLERANCE', '5'))
+TRAJECTORY_ZOOM_PIXELS = float(os.environ.get('TRAJECTORY_ZOOM_PIXELS', '1'))
+
+# Resumen de movimiento (/api/location-history/<org>/summary): velocidad (km/h) a partir
+# de la cual un tramo cuenta como en movimiento, velocidad máxima creíble (los saltos más
+# rápidos se descartan como errores de GPS), segundos sin puntos que se consideran una
+# interrupción (máquina apagada) y días por defecto y máximos del rango
+MOVEMENT_MOVING_SPEED_KMH = float(os.environ.get('MOVEMENT_MOVING_SPEED_KMH', '1.5'))
+MOVEMENT_MAX_SPEED_KMH = float(os.environ.get('MOVEMENT_MAX_SPEED_KMH', '120'))
+MOVEMENT_MAX_GAP_SECONDS = int(os.environ.get('MOVEMENT_MAX_GAP_SECONDS', str(30 * 60)))
+MOVEMENT_DEFAULT_DAYS = int(os.environ.get('MOVEMENT_DEFAULT_DAYS', '30'))
+MOVEMENT_MAX_DAYS = int(os.environ.get('MOVEMENT_MAX_DAYS', '366'))
+
+# Utilización (/api/utilization/<org>): horas de motor disponibles por día (denominador de
+# la utilización) y días por defecto y máximos del rango
+ENGINE_HOURS_AVAILABLE_PER_DAY = float(os.environ.get('ENGINE_HOURS_AVAILABLE_PER_DAY', '24'))
+UTILIZATION_DEFAULT_DAYS = int(os.environ.get('UTILIZATION_DEFAULT_DAYS', '30'))
+UTILIZATION_MAX_DAYS = int(os.environ.get('UTILIZATION_MAX_DAYS', '731'))
+
+# Poller de flota: 'off', o 'thread' para arrancarlo dentro de un worker de gunicorn
+# (como proceso independiente se ejecuta con: python fleet_poller.py)
+FLEET_POLLER_MODE = os.environ.get('FLEET_POLLER_MODE', 'off')
+FLEET_POLLER_TOKEN_FILE = os.environ.get('FLEET_POLLER_TOKEN_FILE', '')
+FLEET_POLLER_ORGANIZATIONS = [org for org in os.environ.get('FLEET_POLLER_ORGANIZATIONS', '').split(',') if org]
+FLEET_POLLER_INTERVAL = int(os.environ.get('FLEET_POLLER_INTERVAL', '300'))
+FLEET_POLLER_MAX_RPS = float(os.environ.get('FLEET_POLLER_MAX_RPS', '5'))
+FLEET_POLLER_CONCURRENCY = int(os.environ.get('FLEET_POLLER_CONCURRENCY', '4'))
+
+# Registro de respuestas completas de la API (solo para depuración; caro con respuestas grandes)
+LOG_API_PAYLOADS = os.environ.get('LOG_API_PAYLOADS', '').lower() in ('1', 'true', 'yes')
+LOG_PAYLOAD_MAX_CHARS = int(os.environ.get('LOG_PAYLOAD_MAX_CHARS', '500'))
+
+# Tokens OAuth compartidos entre workers: fichero SQLite, segundos de antelación con
+# los que se refrescan antes de expirar y espera máxima al refresco de otro worker
+TOKEN_STORE_PATH = os.environ.get('TOKEN_STORE_PATH', os.path.join(tempfile.gettempdir(), 'jdeere_tokens.sqlite3'))
+TOKEN_REFRESH_MARGIN = int(os.environ.get('TOKEN_REFRESH_MARGIN', '300'))
+TOKEN_REFRESH_WAIT = int(os.environ.get('TOKEN_REFRESH_WAIT', '15'))
+
+# Sesiones: 'sqlite' guarda los datos en el servidor y la cookie solo lleva un ID;
+# 'cookie' es la sesión firmada por defecto de Flask
+SESSION_STORE = os.environ.get('SESSION_STORE', 'sqlite')
+SESSION_DB_PATH = os.environ.get('SESSION_DB_PATH', os.path.join(tempfile.gettempdir(), 'jdeere_sessions.sqlite3'))
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', '1024'))  # sesiones en memoria por worker
+SESSION_CACHE_TTL = int(os.environ.get('SESSION_CACHE_TTL', '5'))  # segundos antes de releer SQLite
+
+# /api/metrics solo responde a usuarios con sesión o, para la monitorización, a peticiones con
+# la cabecera "Authorization: Bearer <METRICS_TOKEN>" (vacío: sin acceso por token)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Planificador de llamadas a la API (upstream.py), límites por proceso:
+# peticiones por segundo y ráfaga por host (partnerapi / equipmentapi)
+UPSTREAM_RPS = float(os.environ.get('UPSTREAM_RPS', '20'))
+UPSTREAM_BURST = int(os.environ.get('UPSTREAM_BURST', '40'))
+# Reintentos ante 429/502/503/504 con backoff exponencial y jitter (segundos);
+# un Retry-After mayor que UPSTREAM_RETRY_AFTER_MAX no se espera y se devuelve el error
+UPSTREAM_MAX_RETRIES = int(os.environ.get('UPSTREAM_MAX_RETRIES', '3'))
+UPSTREAM_BACKOFF_BASE = float(os.environ.get('UPSTREAM_BACKOFF_BASE', '0.5'))
+UPSTREAM_BACKOFF_MAX = float(os.environ.get('UPSTREAM_BACKOFF_MAX', '20'))
+UPSTREAM_RETRY_AFTER_MAX = float(os.environ.get('UPSTREAM_RETRY_AFTER_MAX', '60'))
+# Circuit breaker por endpoint: fallos seguidos para abrirlo y segundos hasta la prueba
+UPSTREAM_BREAKER_FAILURES = int(os.environ.get('UPSTREAM_BREAKER_FAILURES', '5'))
+UPSTREAM_BREAKER_COOLDOWN = float(os.environ.get('UPSTREAM_BREAKER_COOLDOWN', '30'))
+
 # Flask Configuration
 DEBUG = True
 SECRET_KEY = os.environ.get('SESSION_SECRET', 'dev-secret-key')
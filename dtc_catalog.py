@@ -0,0 +1,304 @@
+"""Catálogo local de definiciones de DTC (códigos de diagnóstico de las alertas).
+
+Las definiciones se buscan por ID de definición (el último segmento de la URI
+del enlace 'definition' de una alerta) o por SPN/FMI. Orígenes:
+  - el fichero incluido con la aplicación (DTC_CATALOG_PATH), con los nombres
+    de SPN y FMI de J1939 y, opcionalmente, definiciones completas,
+  - ficheros importados (JSON o CSV) con:  python dtc_catalog.py import fichero
+  - las definiciones que la API devuelve la primera vez que se pide un ID que
+    no está en el catálogo.
+Las importadas y las de la API se guardan en el almacén de telemetría, así que
+las comparten todos los workers y sobreviven a un reinicio.
+
+El índice en memoria se carga la primera vez que se consulta. Cada definición
+es un objeto con __slots__ cuyas listas son tuplas y cuyos textos se internan:
+las causas y soluciones genéricas de cada FMI se repiten en muchas entradas y
+así se guardan una sola vez. Un código sin definición propia se describe
+combinando el nombre del SPN y el del FMI.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from config import DTC_CATALOG_PATH, DTC_MISS_TTL
+from telemetry_store import get_store
+
+logger = logging.getLogger(__name__)
+
+
+def parse_code(value):
+    """SPN o FMI como entero, o None si no es un número."""
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_code_key(value):
+    """'SPN.FMI' (p. ej. '100.1') como (spn, fmi), o None."""
+    spn, separator, fmi = str(value).partition('.')
+    if not separator:
+        return None
+    spn, fmi = parse_code(spn), parse_code(fmi)
+    if spn is None or fmi is None:
+        return None
+    return spn, fmi
+
+
+def _texts(values):
+    if isinstance(values, str):
+        values = [values]
+    if not isinstance(values, (list, tuple)):
+        return ()
+    return tuple(sys.intern(str(value)) for value in values if value)
+
+
+class DTCDefinition:
+    """Definición de un DTC en forma compacta."""
+
+    __slots__ = ('id', 'spn', 'fmi', 'title', 'description', 'causes', 'resolutions', 'source')
+
+    def __init__(self, definition_id, spn=None, fmi=None, title=None, description=None,
+                 causes=(), resolutions=(), source='catalog'):
+        self.id = sys.intern(str(definition_id)) if definition_id is not None else None
+        self.spn = spn
+        self.fmi = fmi
+        self.title = sys.intern(title) if title else None
+        self.description = sys.intern(description) if description else None
+        self.causes = _texts(causes)
+        self.resolutions = _texts(resolutions)
+        self.source = source
+
+    @classmethod
+    def from_dict(cls, data, source):
+        return cls(
+            data.get('id'), parse_code(data.get('spn')), parse_code(data.get('fmi')),
+            data.get('title'), data.get('description'),
+            data.get('causes') or (), data.get('resolutions') or (), source
+        )
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'spn': self.spn,
+            'fmi': self.fmi,
+            'title': self.title,
+            'description': self.description,
+            'causes': list(self.causes),
+            'resolutions': list(self.resolutions)
+        }
+
+
+def load_definitions_file(path):
+    """Lee definiciones de un fichero JSON (lista o {"definitions": [...]}) o CSV.
+
+    El CSV lleva las columnas id, spn, fmi, title, description, causes y
+    resolutions; causas y soluciones separadas por '|'.
+    """
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            return [
+                dict(row, causes=(row.get('causes') or '').split('|'),
+                     resolutions=(row.get('resolutions') or '').split('|'))
+                for row in csv.DictReader(f)
+            ]
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('definitions', [])
+    return [definition for definition in data if isinstance(definition, dict)]
+
+
+class DTCCatalog:
+    """Índice en memoria de definiciones de DTC, cargado bajo demanda."""
+
+    def __init__(self, path=DTC_CATALOG_PATH, store=None, miss_ttl=DTC_MISS_TTL):
+        self.path = path
+        self._store = store
+        self.miss_ttl = miss_ttl
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._by_id = {}
+        self._by_code = {}
+        self._spn_names = {}
+        self._fmi_info = {}
+        self._misses = {}
+        self.hits = 0
+        self.lookups = 0
+
+    @property
+    def store(self):
+        return self._store or get_store()
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            started = time.perf_counter()
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    bundled = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"No se pudo leer el catálogo de DTC {self.path}: {str(e)}")
+                bundled = {}
+            self._spn_names = {
+                int(spn): sys.intern(name) for spn, name in bundled.get('spn', {}).items() if parse_code(spn) is not None
+            }
+            self._fmi_info = {
+                int(fmi): (sys.intern(info['name']), _texts(info.get('causes')), _texts(info.get('resolutions')))
+                for fmi, info in bundled.get('fmi', {}).items() if parse_code(fmi) is not None and info.get('name')
+            }
+            for data in bundled.get('definitions', []):
+                self._index(DTCDefinition.from_dict(data, 'catalog'))
+            try:
+                for data, source in self.store.iter_alert_definitions():
+                    self._index(DTCDefinition.from_dict(data, source))
+            except Exception as e:
+                logger.warning(f"No se pudieron leer las definiciones de DTC guardadas: {str(e)}")
+            self._loaded = True
+            logger.info(
+                f"Catálogo de DTC cargado: {len(self._by_id)} definiciones, {len(self._spn_names)} SPN, "
+                f"{len(self._fmi_info)} FMI en {(time.perf_counter() - started) * 1000:.1f} ms"
+            )
+
+    def _index(self, definition):
+        if definition.id:
+            self._by_id[definition.id] = definition
+        if definition.spn is not None and definition.fmi is not None:
+            self._by_code[(definition.spn, definition.fmi)] = definition
+
+    def get(self, definition_id):
+        """Definición por ID (índice en memoria y, si no está, almacén compartido), o None."""
+        self._ensure_loaded()
+        definition_id = str(definition_id)
+        with self._lock:
+            self.lookups += 1
+            definition = self._by_id.get(definition_id)
+        if definition is None:
+            # Otro worker pudo haberla obtenido de la API después de cargar el índice
+            stored = self.store.get_alert_definition(definition_id)
+            if stored is None:
+                return None
+            definition = DTCDefinition.from_dict(*stored)
+            with self._lock:
+                self._index(definition)
+        with self._lock:
+            self.hits += 1
+        return definition
+
+    def find(self, spn, fmi):
+        """Definición de un código SPN/FMI: la del catálogo o una compuesta con sus nombres."""
+        self._ensure_loaded()
+        with self._lock:
+            self.lookups += 1
+            definition = self._by_code.get((spn, fmi))
+            if definition is not None:
+                self.hits += 1
+                return definition
+        return self.compose(spn, fmi)
+
+    def compose(self, spn, fmi, definition_id=None):
+        """Describe un código con los nombres J1939 de su SPN y FMI (None si no se conoce ninguno)."""
+        self._ensure_loaded()
+        spn_name = self._spn_names.get(spn)
+        fmi_info = self._fmi_info.get(fmi)
+        if spn_name is None and fmi_info is None:
+            return None
+        fmi_name, causes, resolutions = fmi_info or (f"FMI {fmi}", (), ())
+        return DTCDefinition(
+            definition_id or f"{spn}.{fmi}", spn, fmi,
+            f"SPN {spn} FMI {fmi}: {spn_name or f'SPN {spn}'}",
+            f"{spn_name or f'Parámetro SPN {spn}'}: {fmi_name[0].lower()}{fmi_name[1:]}.",
+            causes, resolutions, 'j1939'
+        )
+
+    def complete(self, definition):
+        """Rellena título, descripción, causas y soluciones que falten con los nombres J1939."""
+        if definition.spn is None or definition.fmi is None:
+            return definition
+        composed = self.compose(definition.spn, definition.fmi, definition.id)
+        if composed is None:
+            return definition
+        return DTCDefinition(
+            definition.id, definition.spn, definition.fmi,
+            definition.title or composed.title, definition.description or composed.description,
+            definition.causes or composed.causes, definition.resolutions or composed.resolutions,
+            definition.source
+        )
+
+    def add(self, definitions, source):
+        """Añade definiciones (dicts) al índice y al almacén compartido; devuelve cuántas."""
+        self._ensure_loaded()
+        parsed = [DTCDefinition.from_dict(data, source) for data in definitions if data.get('id')]
+        self.store.save_alert_definitions([definition.as_dict() for definition in parsed], source)
+        with self._lock:
+            for definition in parsed:
+                self._index(definition)
+                self._misses.pop(definition.id, None)
+        return len(parsed)
+
+    def recently_missed(self, definition_id):
+        """True si la API no tenía esta definición hace menos de miss_ttl segundos."""
+        with self._lock:
+            missed_at = self._misses.get(str(definition_id))
+        return missed_at is not None and time.time() - missed_at < self.miss_ttl
+
+    def record_miss(self, definition_id):
+        with self._lock:
+            self._misses[str(definition_id)] = time.time()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': self._loaded,
+                'definitions': len(self._by_id),
+                'spn': len(self._spn_names),
+                'fmi': len(self._fmi_info),
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'recent_misses': len(self._misses)
+            }
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """Devuelve el catálogo de DTC del proceso."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = DTCCatalog()
+    return _catalog
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catálogo local de definiciones de DTC.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help="Importa definiciones desde ficheros JSON o CSV")
+    import_parser.add_argument('files', nargs='+', help="Ficheros a importar")
+    subparsers.add_parser('stats', help="Muestra el tamaño del catálogo")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    catalog = get_catalog()
+    if args.command == 'import':
+        for path in args.files:
+            count = catalog.add(load_definitions_file(path), source=f"import:{os.path.basename(path)}")
+            print(f"{path}: {count} definiciones importadas")
+    else:
+        catalog._ensure_loaded()
+        print(json.dumps(catalog.stats(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
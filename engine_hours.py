@@ -0,0 +1,143 @@
+"""Utilización de la flota a partir de las lecturas de horómetro.
+
+El horómetro es un contador acumulado: las horas de uso entre dos lecturas
+consecutivas de una máquina son su diferencia. El almacén de telemetría guarda
+cada lectura (engine_hour_readings) y, en la misma transacción, suma esas horas
+a los acumulados por día, semana (ISO, desde el lunes) y mes de
+engine_hour_rollups. Una lectura que llega entre dos ya guardadas resta el
+tramo entre ellas y suma los dos nuevos, así que el orden de llegada no cambia
+el resultado. Las horas de un tramo se reparten entre los días que abarca en
+proporción al tiempo (UTC); una diferencia negativa (horómetro sustituido) no
+suma nada.
+
+La utilización de un periodo son sus horas de uso entre las disponibles:
+ENGINE_HOURS_AVAILABLE_PER_DAY por cada día del periodo hasta hoy.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone
+
+from config import ENGINE_HOURS_AVAILABLE_PER_DAY
+
+PERIODS = ('day', 'week', 'month')
+
+
+def parse_time(timestamp):
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+
+
+def period_start(day, period):
+    """Primer día del periodo ('day', 'week' o 'month') que contiene `day`."""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_period_start(start, period):
+    if period == 'week':
+        return start + timedelta(days=7)
+    if period == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def usage_by_period(start_time, start_hours, end_time, end_hours):
+    """Horas de uso entre dos lecturas repartidas en {(periodo, 'YYYY-MM-DD'): horas}."""
+    used = end_hours - start_hours
+    if used <= 0:
+        return {}
+    start = parse_time(start_time)
+    end = parse_time(end_time)
+    elapsed = (end - start).total_seconds()
+    shares = {}
+    if elapsed <= 0:
+        shares[end.date()] = used
+    else:
+        day = start.date()
+        while True:
+            day_start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+            day_end = day_start + timedelta(days=1)
+            overlap = (min(end, day_end) - max(start, day_start)).total_seconds()
+            if overlap > 0:
+                shares[day] = used * overlap / elapsed
+            if day_end >= end:
+                break
+            day += timedelta(days=1)
+
+    usage = defaultdict(float)
+    for day, hours in shares.items():
+        for period in PERIODS:
+            usage[(period, period_start(day, period).isoformat())] += hours
+    return dict(usage)
+
+
+def period_starts(period, first_day, last_day):
+    """Inicios de los periodos que cubren [first_day, last_day]."""
+    starts = []
+    start = period_start(first_day, period)
+    while start <= last_day:
+        starts.append(start)
+        start = next_period_start(start, period)
+    return starts
+
+
+def available_hours(start, period, today):
+    """Horas disponibles del periodo: los días transcurridos hasta hoy (incluido)."""
+    days = (min(next_period_start(start, period), today + timedelta(days=1)) - start).days
+    return max(days, 0) * ENGINE_HOURS_AVAILABLE_PER_DAY
+
+
+def _utilization(hours, available):
+    return round(hours / available, 4) if available else None
+
+
+def utilization_report(store, machine_ids, period, first_day, last_day, today=None):
+    """Utilización de cada máquina y de la flota entre dos días (date), por periodo.
+
+    Se responde con los acumulados guardados y la última lectura de cada
+    máquina, sin llamar a la API. Devuelve (por máquina, totales), donde
+    cada máquina es {machine_id: {'engine_hours', 'last_reading_time', 'hours',
+    'utilization', 'periods': [{'start', 'hours', 'utilization'}]}}.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    machine_ids = [str(machine_id) for machine_id in machine_ids]
+    starts = period_starts(period, first_day, last_day)
+    available = [available_hours(start, period, today) for start in starts]
+    used = defaultdict(dict)
+    for machine_id, start, hours in store.get_engine_hour_rollups(
+        machine_ids, period, starts[0].isoformat(), starts[-1].isoformat()
+    ):
+        used[machine_id][start] = hours
+    latest = store.get_latest_engine_hour_readings(machine_ids)
+
+    machines = {}
+    fleet_hours = [0.0] * len(starts)
+    for machine_id in machine_ids:
+        hours = [used[machine_id].get(start.isoformat(), 0.0) for start in starts]
+        for index, value in enumerate(hours):
+            fleet_hours[index] += value
+        reading_time, engine_hours = latest.get(machine_id, (None, None))
+        machines[machine_id] = {
+            'engine_hours': engine_hours,
+            'last_reading_time': reading_time,
+            'hours': round(sum(hours), 2),
+            'utilization': _utilization(sum(hours), sum(available)),
+            'periods': [
+                {'start': start.isoformat(), 'hours': round(value, 2), 'utilization': _utilization(value, hours_available)}
+                for start, value, hours_available in zip(starts, hours, available)
+            ]
+        }
+
+    count = len(machine_ids)
+    totals = {
+        'machines': count,
+        'machines_with_readings': len(latest),
+        'hours': round(sum(fleet_hours), 2),
+        'utilization': _utilization(sum(fleet_hours), sum(available) * count),
+        'periods': [
+            {'start': start.isoformat(), 'hours': round(value, 2), 'utilization': _utilization(value, hours_available * count)}
+            for start, value, hours_available in zip(starts, fleet_hours, available)
+        ]
+    }
+    return machines, totals
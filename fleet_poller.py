@@ -0,0 +1,226 @@
+"""Poller en segundo plano que mantiene caliente el almacén local de telemetría.
+
+Cada ciclo sincroniza organizaciones, equipos, puntos nuevos de
+locationHistory (y con ellos la última ubicación), horas de motor y alertas de
+las organizaciones configuradas (FLEET_POLLER_ORGANIZATIONS, o todas las del
+token si está vacío) usando las mismas funciones fetch_* de john_deere_api,
+sin pasar por la caché.
+
+Se puede ejecutar:
+  - como proceso independiente junto a gunicorn:  python fleet_poller.py [--once]
+  - como hilo dentro de los workers: FLEET_POLLER_MODE=thread (solo un worker
+    lo arranca gracias a un bloqueo de fichero).
+
+El token se lee de FLEET_POLLER_TOKEN_FILE (JSON con access_token,
+refresh_token y expires_at) y se reescribe cuando se refresca. Para probar
+contra una API local basta con apuntar JOHN_DEERE_API_BASE_URL y
+JOHN_DEERE_EQUIPMENT_API_URL a ella (con OAUTHLIB_INSECURE_TRANSPORT=1 si es http).
+"""
+import argparse
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import (
+    FLEET_POLLER_CONCURRENCY,
+    FLEET_POLLER_INTERVAL,
+    FLEET_POLLER_MAX_RPS,
+    FLEET_POLLER_MODE,
+    FLEET_POLLER_ORGANIZATIONS,
+    FLEET_POLLER_TOKEN_FILE
+)
+from john_deere_api import (
+    fetch_equipment_by_organization,
+    fetch_machine_alerts,
+    fetch_machine_engine_hours,
+    fetch_machine_location,
+    fetch_organizations,
+    refresh_token_if_needed,
+    sync_location_histories
+)
+from telemetry_store import get_store
+
+logger = logging.getLogger(__name__)
+
+class FileTokenProvider:
+    """Lee el token del poller desde un fichero JSON y guarda los refrescos."""
+
+    def __init__(self, path=FLEET_POLLER_TOKEN_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def get_token(self):
+        with self._lock:
+            with open(self.path) as token_file:
+                token = json.load(token_file)
+            refreshed = refresh_token_if_needed(token)
+            if refreshed is not token and refreshed != token:
+                self._write(refreshed)
+            return refreshed
+
+    def _write(self, token):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.token-')
+        with os.fdopen(fd, 'w') as token_file:
+            json.dump(token, token_file)
+        os.replace(tmp_path, self.path)
+
+
+class RateLimiter:
+    """Espacia las llamadas para no superar max_rps (compartido entre hilos)."""
+
+    def __init__(self, max_rps=FLEET_POLLER_MAX_RPS):
+        self.interval = 1.0 / max_rps if max_rps > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class FleetPoller:
+    """Sincroniza periódicamente la flota en el almacén de telemetría."""
+
+    def __init__(self, token_provider, organization_ids=None, store=None, interval=FLEET_POLLER_INTERVAL,
+                 concurrency=FLEET_POLLER_CONCURRENCY, rate_limiter=None):
+        self.token_provider = token_provider
+        self.organization_ids = list(organization_ids or FLEET_POLLER_ORGANIZATIONS)
+        self.store = store or get_store()
+        self.interval = interval
+        self.concurrency = concurrency
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.last_cycle = None
+
+    def _call(self, func, *args, **kwargs):
+        self.rate_limiter.wait()
+        return func(*args, **kwargs)
+
+    def sync_machine(self, token, machine_id):
+        # Solo los puntos de locationHistory posteriores al último guardado; la
+        # última ubicación sale de ellos y, si no hay historial, del endpoint location
+        self._call(sync_location_histories, token, [machine_id], max_age=0, max_workers=1)
+        latest, _with_history = self.store.get_latest_points([machine_id])
+        location = latest.get(str(machine_id))
+        if location is None:
+            location = self._call(fetch_machine_location.uncached, token, machine_id)
+        self.store.save_location(machine_id, location)
+
+        engine_hours = self._call(fetch_machine_engine_hours, token, machine_id)
+        self.store.save_engine_hours(machine_id, engine_hours)
+
+        # Solo las alertas posteriores a la última sincronización; se guardan en el almacén
+        self._call(fetch_machine_alerts, token, machine_id, max_age=0)
+
+    def sync_organization(self, token, organization_id):
+        machines = self._call(fetch_equipment_by_organization.uncached, token, organization_id)
+        self.store.save_machines(organization_id, machines)
+
+        machine_ids = [machine.get('id') for machine in machines if machine.get('id')]
+        with ThreadPoolExecutor(max_workers=max(1, self.concurrency), thread_name_prefix='fleet-poller') as executor:
+            for future in [executor.submit(self.sync_machine, token, machine_id) for machine_id in machine_ids]:
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.warning(f"Error sincronizando máquina en la organización {organization_id}: {str(e)}")
+        return len(machine_ids)
+
+    def run_once(self):
+        """Ejecuta un ciclo completo de sincronización."""
+        started = time.time()
+        token = self.token_provider.get_token()
+
+        organizations = self._call(fetch_organizations.uncached, token)
+        self.store.save_organizations(organizations)
+
+        organization_ids = self.organization_ids or [org.get('id') for org in organizations]
+        total_machines = 0
+        for organization_id in organization_ids:
+            try:
+                total_machines += self.sync_organization(token, organization_id)
+            except Exception as e:
+                logger.error(f"Error sincronizando organización {organization_id}: {str(e)}")
+
+        self.last_cycle = time.time()
+        logger.info(
+            f"Ciclo del poller completado: {len(organization_ids)} organizaciones, "
+            f"{total_machines} máquinas en {self.last_cycle - started:.1f}s"
+        )
+
+    def run_forever(self, stop_event=None):
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Error en el ciclo del poller: {str(e)}")
+            stop_event.wait(self.interval)
+
+
+_poller_thread = None
+_poller_lock_file = None
+
+
+def start_background_poller():
+    """Arranca el poller en un hilo si FLEET_POLLER_MODE=thread.
+
+    Con varios workers de gunicorn solo el que obtiene el bloqueo del fichero
+    lo arranca; los demás leen del almacén compartido.
+    """
+    global _poller_thread, _poller_lock_file
+    if FLEET_POLLER_MODE != 'thread' or _poller_thread is not None:
+        return None
+    if not FLEET_POLLER_TOKEN_FILE:
+        logger.warning("FLEET_POLLER_MODE=thread pero FLEET_POLLER_TOKEN_FILE no está definido")
+        return None
+
+    lock_path = os.path.join(tempfile.gettempdir(), 'jdeere_fleet_poller.lock')
+    lock_file = open(lock_path, 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        logger.info("El poller ya se está ejecutando en otro worker")
+        return None
+
+    _poller_lock_file = lock_file
+    poller = FleetPoller(FileTokenProvider())
+    _poller_thread = threading.Thread(target=poller.run_forever, name='fleet-poller', daemon=True)
+    _poller_thread.start()
+    logger.info(f"Poller de flota iniciado en el proceso {os.getpid()}")
+    return _poller_thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sincroniza la flota de John Deere en el almacén local.")
+    parser.add_argument('--once', action='store_true', help="Ejecuta un solo ciclo y termina")
+    parser.add_argument('--token-file', default=FLEET_POLLER_TOKEN_FILE, help="Fichero JSON con el token OAuth")
+    parser.add_argument('--org', action='append', dest='organizations', help="ID de organización (repetible)")
+    parser.add_argument('--interval', type=int, default=FLEET_POLLER_INTERVAL, help="Segundos entre ciclos")
+    args = parser.parse_args()
+
+    if not args.token_file:
+        parser.error("Se requiere --token-file o FLEET_POLLER_TOKEN_FILE")
+
+    logging.basicConfig(level=logging.INFO)
+    poller = FleetPoller(FileTokenProvider(args.token_file), organization_ids=args.organizations,
+                         interval=args.interval)
+    if args.once:
+        poller.run_once()
+    else:
+        poller.run_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""Instantánea compacta (por columnas) de las máquinas de una organización.
+
+fetch_machines_by_organization y el almacén de telemetría devuelven una lista
+de dicts por máquina, cada uno con su lista de links copiada de la API. Con
+miles de máquinas esos dicts ocupan la mayor parte de la memoria del worker y
+del tiempo de codificación JSON de /api/machines/<org>. FleetSnapshot guarda
+lo mismo por columnas:
+  - IDs y nombres en listas de cadenas internadas,
+  - modelo, categoría y tipo como códigos (array de enteros) sobre la lista de
+    valores distintos, que suelen ser pocos,
+  - coordenadas en arrays de float ('d'); NaN si la máquina no tiene ubicación,
+  - sin links: se añaden al serializar solo si se piden.
+
+to_json() genera directamente el JSON de la lista de máquinas, con el mismo
+formato que jsonify (claves ordenadas, sin espacios). to_columns() y
+from_columns() convierten a un dict apto para JSON, que es lo que se guarda en
+la caché ('machines').
+"""
+import json
+import math
+import sys
+from array import array
+from json.encoder import encode_basestring_ascii
+
+FORMAT_VERSION = 1
+
+
+def _json_value(value):
+    """Codificación JSON de un valor escalar, igual que json.dumps(ensure_ascii=True)."""
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    return json.dumps(value)
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _categorical(values):
+    """Codifica una columna con pocos valores distintos como (valores, códigos)."""
+    labels = []
+    positions = {}
+    codes = array('I')
+    for value in values:
+        code = positions.get(value)
+        if code is None:
+            code = positions[value] = len(labels)
+            labels.append(_intern(value))
+        codes.append(code)
+    return labels, codes
+
+
+class FleetSnapshot:
+    """Máquinas de una organización (sin links) guardadas por columnas."""
+
+    __slots__ = ('ids', 'names', 'model_labels', 'model_codes', 'category_labels', 'category_codes',
+                 'type_labels', 'type_codes', 'latitudes', 'longitudes', 'timestamps', '_positions')
+
+    def __init__(self, ids, names, models, categories, types, latitudes, longitudes, timestamps):
+        self.ids = [_intern(machine_id) for machine_id in ids]
+        self.names = [_intern(name) for name in names]
+        self.model_labels, self.model_codes = _categorical(models)
+        self.category_labels, self.category_codes = _categorical(categories)
+        self.type_labels, self.type_codes = _categorical(types)
+        self.latitudes = array('d', latitudes)
+        self.longitudes = array('d', longitudes)
+        self.timestamps = list(timestamps)
+        self._positions = None
+
+    @classmethod
+    def from_machines(cls, machines):
+        """Crea la instantánea a partir de registros con el formato de fetch_machines_by_organization."""
+        latitudes = []
+        longitudes = []
+        timestamps = []
+        for machine in machines:
+            location = machine.get('location')
+            if location and location.get('latitude') is not None and location.get('longitude') is not None:
+                latitudes.append(location['latitude'])
+                longitudes.append(location['longitude'])
+                timestamps.append(location.get('timestamp'))
+            else:
+                latitudes.append(math.nan)
+                longitudes.append(math.nan)
+                timestamps.append(None)
+        return cls(
+            [machine.get('id') for machine in machines],
+            [machine.get('name') for machine in machines],
+            [machine.get('model') for machine in machines],
+            [machine.get('category') for machine in machines],
+            [machine.get('type') for machine in machines],
+            latitudes, longitudes, timestamps
+        )
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Inverso de to_columns()."""
+        if columns.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Formato de instantánea de flota no soportado: {columns.get('version')}")
+        snapshot = cls.__new__(cls)
+        snapshot.ids = [_intern(machine_id) for machine_id in columns['ids']]
+        snapshot.names = [_intern(name) for name in columns['names']]
+        snapshot.model_labels = [_intern(value) for value in columns['models'][0]]
+        snapshot.model_codes = array('I', columns['models'][1])
+        snapshot.category_labels = [_intern(value) for value in columns['categories'][0]]
+        snapshot.category_codes = array('I', columns['categories'][1])
+        snapshot.type_labels = [_intern(value) for value in columns['types'][0]]
+        snapshot.type_codes = array('I', columns['types'][1])
+        # JSON no tiene NaN: las máquinas sin ubicación se guardan como null
+        snapshot.latitudes = array('d', [math.nan if value is None else value for value in columns['latitudes']])
+        snapshot.longitudes = array('d', [math.nan if value is None else value for value in columns['longitudes']])
+        snapshot.timestamps = columns['timestamps']
+        snapshot._positions = None
+        return snapshot
+
+    def to_columns(self):
+        """Dict apto para JSON con las columnas de la instantánea."""
+        return {
+            'version': FORMAT_VERSION,
+            'ids': self.ids,
+            'names': self.names,
+            'models': [self.model_labels, self.model_codes.tolist()],
+            'categories': [self.category_labels, self.category_codes.tolist()],
+            'types': [self.type_labels, self.type_codes.tolist()],
+            'latitudes': [None if math.isnan(value) else value for value in self.latitudes],
+            'longitudes': [None if math.isnan(value) else value for value in self.longitudes],
+            'timestamps': self.timestamps
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    def position(self, machine_id):
+        """Posición de una máquina en las columnas, o None."""
+        if self._positions is None:
+            self._positions = {str(value): index for index, value in enumerate(self.ids)}
+        return self._positions.get(str(machine_id))
+
+    def location(self, index):
+        """(latitud, longitud) de la máquina en la posición index, o None si no tiene ubicación."""
+        latitude = self.latitudes[index]
+        if math.isnan(latitude):
+            return None
+        return latitude, self.longitudes[index]
+
+    def machine(self, index, links=None):
+        """Registro de la máquina en la posición index con el formato de fetch_machines_by_organization."""
+        location = None
+        if not math.isnan(self.latitudes[index]):
+            location = {
+                'longitude': self.longitudes[index],
+                'latitude': self.latitudes[index],
+                'timestamp': self.timestamps[index]
+            }
+        record = {
+            'id': self.ids[index],
+            'name': self.names[index],
+            'model': self.model_labels[self.model_codes[index]],
+            'category': self.category_labels[self.category_codes[index]],
+            'type': self.type_labels[self.type_codes[index]],
+            'location': location
+        }
+        if links is not None:
+            record['links'] = links.get(str(self.ids[index]), [])
+        return record
+
+    def machines(self, links=None):
+        """Lista de registros; con links ({id: links}) cada máquina lleva también sus links."""
+        return [self.machine(index, links) for index in range(len(self.ids))]
+
+    def to_json(self, links=None, indexes=None):
+        """JSON de machines(links), idéntico al de jsonify (claves ordenadas, sin espacios).
+
+        Con indexes solo se incluyen las máquinas en esas posiciones, en ese orden.
+        """
+        model_labels = [_json_value(value) for value in self.model_labels]
+        category_labels = [_json_value(value) for value in self.category_labels]
+        type_labels = [_json_value(value) for value in self.type_labels]
+
+        parts = []
+        append = parts.append
+        if indexes is None:
+            indexes = range(len(self.ids))
+        for index in indexes:
+            machine_id = self.ids[index]
+            latitude = self.latitudes[index]
+            if math.isnan(latitude):
+                location = 'null'
+            else:
+                location = (f'{{"latitude":{latitude!r},"longitude":{self.longitudes[index]!r},'
+                            f'"timestamp":{_json_value(self.timestamps[index])}}}')
+            links_part = ''
+            if links is not None:
+                links_part = '"links":' + json.dumps(
+                    links.get(str(machine_id), []), sort_keys=True, separators=(',', ':')
+                ) + ','
+            append(
+                f'{{"category":{category_labels[self.category_codes[index]]},"id":{_json_value(machine_id)},'
+                f'{links_part}"location":{location},"model":{model_labels[self.model_codes[index]]},'
+                f'"name":{_json_value(self.names[index])},"type":{type_labels[self.type_codes[index]]}}}'
+            )
+        return '[' + ','.join(parts) + ']'
@@ -0,0 +1,211 @@
+"""Pool de conexiones HTTP compartido para las llamadas a la API de John Deere.
+
+Cada worker de gunicorn mantiene un único HTTPAdapter (y por tanto un único
+pool de conexiones urllib3 con keep-alive) que se monta en todas las sesiones
+OAuth2 que se crean. Así las peticiones a partnerapi.deere.com y
+equipmentapi.deere.com reutilizan conexiones TCP/TLS ya abiertas en lugar de
+hacer un handshake nuevo en cada llamada. El adaptador pasa además cada
+petición por el planificador de upstream.py (rate limit por host, reintentos
+y circuit breaker por endpoint).
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+from requests_oauthlib import OAuth2Session
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from config import (
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+    HTTP_SESSION_CACHE_SIZE,
+    JOHN_DEERE_CLIENT_ID,
+    JOHN_DEERE_SCOPES
+)
+from upstream import get_scheduler
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats:
+    """Contadores de uso del pool de conexiones (seguros entre hilos)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.errors = 0
+
+    def request_started(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def request_finished(self, failed=False):
+        with self._lock:
+            self.in_flight -= 1
+            if failed:
+                self.errors += 1
+
+    def connection_created(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def snapshot(self):
+        with self._lock:
+            reused = max(self.requests - self.new_connections, 0)
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reused_connections': reused,
+                'reuse_ratio': round(reused / self.requests, 3) if self.requests else 0.0,
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'errors': self.errors
+            }
+
+
+def _counting_pool_class(base, stats):
+    """Crea una subclase del pool de urllib3 que cuenta las conexiones nuevas."""
+
+    class CountingConnectionPool(base):
+        def _new_conn(self):
+            stats.connection_created()
+            return super()._new_conn()
+
+    CountingConnectionPool.__name__ = f"Counting{base.__name__}"
+    return CountingConnectionPool
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter que registra peticiones en curso y conexiones creadas.
+
+    Cada envío pasa por el planificador de upstream.py, que puede esperar
+    (rate limit), reintentar o rechazar la petición (circuit breaker abierto).
+    """
+
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool_class(HTTPConnectionPool, self.stats),
+            'https': _counting_pool_class(HTTPSConnectionPool, self.stats)
+        }
+
+    def send(self, request, **kwargs):
+        return get_scheduler().call(
+            request.method,
+            request.url,
+            lambda: self._send_counted(request, **kwargs),
+            connection_errors=(ConnectionError, Timeout)
+        )
+
+    def _send_counted(self, request, **kwargs):
+        self.stats.request_started()
+        failed = True
+        try:
+            response = super().send(request, **kwargs)
+            failed = False
+            return response
+        finally:
+            self.stats.request_finished(failed=failed)
+
+
+class DeereHTTPClient:
+    """Dueño del pool de conexiones y de las sesiones OAuth2 por token.
+
+    Las sesiones se guardan en un LRU indexado por access_token, de modo que
+    todas las llamadas (y todos los hilos) que usan el mismo token comparten
+    la misma sesión, y todas las sesiones comparten el mismo adaptador.
+    """
+
+    def __init__(self, pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 session_cache_size=HTTP_SESSION_CACHE_SIZE):
+        self.stats = PoolStats()
+        self.adapter = PooledHTTPAdapter(
+            self.stats,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize
+        )
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.session_cache_size = session_cache_size
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.session_hits = 0
+        self.session_misses = 0
+
+    def create_session(self, token=None, state=None, redirect_uri=None):
+        """Crea una OAuth2Session nueva montada sobre el pool compartido."""
+        kwargs = {
+            'client_id': JOHN_DEERE_CLIENT_ID,
+            'token': token,
+            'state': state,
+            'scope': JOHN_DEERE_SCOPES
+        }
+        if redirect_uri:
+            kwargs['redirect_uri'] = redirect_uri
+
+        oauth = OAuth2Session(**kwargs)
+        oauth.mount('https://', self.adapter)
+        oauth.mount('http://', self.adapter)
+        return oauth
+
+    def session_for(self, token):
+        """Devuelve la sesión compartida para un token, creándola si no existe."""
+        access_token = (token or {}).get('access_token')
+        if not access_token:
+            return self.create_session(token=token)
+
+        with self._lock:
+            oauth = self._sessions.get(access_token)
+            if oauth is not None:
+                self._sessions.move_to_end(access_token)
+                self.session_hits += 1
+                return oauth
+
+            self.session_misses += 1
+            oauth = self.create_session(token=token)
+            self._sessions[access_token] = oauth
+            # No se llama a close() en las sesiones desalojadas: cerrarían el adaptador compartido
+            while len(self._sessions) > self.session_cache_size:
+                self._sessions.popitem(last=False)
+            return oauth
+
+    def stats_snapshot(self):
+        snapshot = self.stats.snapshot()
+        with self._lock:
+            snapshot.update({
+                'pool_connections': self.pool_connections,
+                'pool_maxsize': self.pool_maxsize,
+                'cached_sessions': len(self._sessions),
+                'session_hits': self.session_hits,
+                'session_misses': self.session_misses
+            })
+        return snapshot
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Devuelve el cliente HTTP del proceso (uno por worker de gunicorn)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = DeereHTTPClient()
+                logger.info(
+                    f"Pool HTTP inicializado (pools={_client.pool_connections}, "
+                    f"maxsize={_client.pool_maxsize})"
+                )
+    return _client
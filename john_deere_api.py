@@ -1,32 +1,49 @@
 import requests
 from requests_oauthlib import OAuth2Session
 import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from urllib.parse import urlparse
 from config import (
     JOHN_DEERE_CLIENT_ID, 
     JOHN_DEERE_CLIENT_SECRET, 
     JOHN_DEERE_API_BASE_URL, 
-    JOHN_DEERE_TOKEN_URL
+    JOHN_DEERE_EQUIPMENT_API_URL,
+    JOHN_DEERE_TOKEN_URL,
+    LOCATION_FETCH_CONCURRENCY,
+    LOCATION_HISTORY_SYNC_TTL,
+    ALERT_FETCH_CONCURRENCY,
+    ALERT_SYNC_OVERLAP,
+    ALERT_SYNC_TTL,
+    EQUIPMENT_BATCH_SIZE,
+    EQUIPMENT_BATCH_WINDOW,
+    LOG_API_PAYLOADS,
+    LOG_PAYLOAD_MAX_CHARS
 )
+from batch_loader import BatchLoader
+from dtc_catalog import get_catalog, parse_code_key
+from fleet_snapshot import FleetSnapshot
+from http_pool import get_http_client
+from cache import SingleFlight, cached, get_cache, user_scope
+from telemetry_store import get_store
+from token_manager import get_token_manager
 
 logger = logging.getLogger(__name__)
 
 def get_oauth_session(token=None, state=None, redirect_uri=None):
-    """Creates an OAuth2Session for John Deere API."""
-    from config import JOHN_DEERE_SCOPES
-    
-    # Creamos argumentos base y solo agregamos redirect_uri si se proporciona
-    kwargs = {
-        'client_id': JOHN_DEERE_CLIENT_ID,
-        'token': token,
-        'state': state,
-        'scope': JOHN_DEERE_SCOPES
-    }
+    """Creates an OAuth2Session for John Deere API.
     
-    # Añadir redirect_uri solo si se proporciona
-    if redirect_uri:
-        kwargs['redirect_uri'] = redirect_uri
-        
-    return OAuth2Session(**kwargs)
+    Sessions that only carry a token are shared per access token and all of
+    them reuse the worker-wide connection pool (see http_pool).
+    """
+    client = get_http_client()
+    
+    if token is not None and state is None and redirect_uri is None:
+        return client.session_for(token)
+    
+    return client.create_session(token=token, state=state, redirect_uri=redirect_uri)
 
 def exchange_code_for_token(code, redirect_uri=None):
     """Exchange authorization code for access token."""
@@ -86,17 +103,15 @@ def exchange_code_for_token(code, redirect_uri=None):
         raise
 
 def refresh_token_if_needed(token):
-    """Refreshes the token if it's expired."""
-    import time
-    if token.get('expires_at') and token['expires_at'] < time.time():
-        oauth = get_oauth_session(token=token)
-        token = oauth.refresh_token(
-            JOHN_DEERE_TOKEN_URL,
-            client_id=JOHN_DEERE_CLIENT_ID,
-            client_secret=JOHN_DEERE_CLIENT_SECRET
-        )
-    return token
+    """Returns a token that is not about to expire.
+    
+    Tokens are refreshed ahead of expiry, once for all threads and workers,
+    and the new token is shared through the token store (see token_manager),
+    so callers holding the old token get the new one without a refresh.
+    """
+    return get_token_manager().ensure_fresh(token)
 
+@cached('organizations', key=lambda token: (user_scope(token),))
 def fetch_organizations(token):
     """Fetches organizations from John Deere API."""
     try:
@@ -127,8 +142,55 @@ def fetch_organizations(token):
         logger.error(f"Error fetching organizations: {str(e)}")
         raise
 
+def _log_payload(message, data):
+    """Logs an API payload only if LOG_API_PAYLOADS is enabled, truncated.
+    
+    Keeps multi-KB responses from being formatted on hot paths.
+    """
+    if LOG_API_PAYLOADS and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"{message}: {str(data)[:LOG_PAYLOAD_MAX_CHARS]}")
+
+def latest_history_location(values):
+    """Returns the location of the newest locationHistory point, or None.
+    
+    Single linear pass over the points (no sort).
+    """
+    if not values:
+        return None
+    
+    location_data = max(values, key=lambda x: x.get('eventTimestamp', '0'))
+    
+    # Extraer coordenadas según el formato de locationHistory (usa point.lat y point.lon)
+    point = location_data.get('point')
+    if point and 'lat' in point and 'lon' in point:
+        return {
+            'longitude': point['lon'],
+            'latitude': point['lat'],
+            'timestamp': location_data.get('eventTimestamp') or location_data.get('gpsFixTimestamp')
+        }
+    return None
+
+def geometry_location(data):
+    """Returns the location of a response in the /location (GeoJSON) format, or None."""
+    geometry = data.get('geometry')
+    if not geometry or 'coordinates' not in geometry:
+        return None
+    
+    # Coordenadas en GeoJSON están en [longitude, latitude]
+    coords = geometry['coordinates']
+    return {
+        'longitude': coords[0],
+        'latitude': coords[1],
+        'timestamp': data.get('timestamp')
+    }
+
+@cached('location', key=lambda token, machine_id: (user_scope(token), machine_id))
 def fetch_machine_location(token, machine_id):
-    """Fetches location information for a specific machine from John Deere API."""
+    """Fetches location information for a specific machine from John Deere API.
+    
+    If points of this machine are already stored locally, only newer points
+    are requested; when there are none, the newest stored point is returned.
+    """
     try:
         token = refresh_token_if_needed(token)
         oauth = get_oauth_session(token=token)
@@ -140,56 +202,42 @@ def fetch_machine_location(token, machine_id):
         headers = {'x-deere-no-paging': 'true'}
         
         try:
-            logger.info(f"Requesting machine location from: {endpoint}")
-            response = oauth.get(endpoint, headers=headers)
+            # Pedir solo los puntos posteriores al último guardado
+            stored_latest = None
+            try:
+                stored_latest = get_store().latest_point_timestamp(machine_id)
+            except Exception as e:
+                logger.warning(f"No se pudo consultar el almacén local para la máquina {machine_id}: {str(e)}")
+            params = {'startDate': stored_latest} if stored_latest else None
+            
+            response = oauth.get(endpoint, params=params, headers=headers)
             response.raise_for_status()
             
             # Procesar la respuesta
             data = response.json()
-            logger.info(f"Received machine location history response: {data}")
+            _log_payload("Received machine location history response", data)
             
             # Si recibimos un array de valores, obtenemos la última ubicación (más reciente)
             if 'values' in data and len(data['values']) > 0:
                 # En locationHistory, los datos vienen en formato diferente, con 'point' en lugar de 'geometry'
                 location_values = data['values']
                 
-                # Ordenar por eventTimestamp en orden descendente (más reciente primero)
-                if len(location_values) > 1:
-                    sorted_locations = sorted(
-                        location_values, 
-                        key=lambda x: x.get('eventTimestamp', '0'), 
-                        reverse=True
-                    )
-                    location_data = sorted_locations[0]
-                else:
-                    location_data = location_values[0]
+                # Conservar todos los puntos en el almacén local, no solo el más reciente
+                _persist_location_points(machine_id, location_values)
                 
-                # Extraer coordenadas según el formato de locationHistory (usa point.lat y point.lon)
-                if 'point' in location_data and 'lat' in location_data['point'] and 'lon' in location_data['point']:
-                    point = location_data['point']
-                    timestamp = location_data.get('eventTimestamp') or location_data.get('gpsFixTimestamp')
-                    
-                    location = {
-                        'longitude': point['lon'],
-                        'latitude': point['lat'],
-                        'timestamp': timestamp
-                    }
-                    logger.info(f"Successfully extracted location from locationHistory: {location}")
+                location = latest_history_location(location_values)
+                if location:
                     return location
                 
             # Si los datos vienen directamente con geometry (formato del endpoint location)
             elif 'geometry' in data and 'coordinates' in data['geometry']:
-                coords = data['geometry']['coordinates']
-                timestamp = data.get('timestamp')
-                
-                # Coordenadas en GeoJSON están en [longitude, latitude]
-                location = {
-                    'longitude': coords[0],
-                    'latitude': coords[1],
-                    'timestamp': timestamp
-                }
-                logger.info(f"Successfully extracted location from direct geometry: {location}")
-                return location
+                return geometry_location(data)
+            
+            # Sin puntos nuevos: el más reciente es el último guardado
+            elif stored_latest:
+                latest, _with_history = get_store().get_latest_points([machine_id])
+                if latest.get(str(machine_id)):
+                    return latest[str(machine_id)]
             
             logger.warning(f"Could not find valid location data in the response for machine {machine_id}")
             
@@ -204,19 +252,11 @@ def fetch_machine_location(token, machine_id):
             response.raise_for_status()
             
             data = response.json()
-            logger.info(f"Received machine location response: {data}")
+            _log_payload("Received machine location response", data)
             
             # Extraer la información de ubicación
-            if 'geometry' in data and 'coordinates' in data['geometry']:
-                coords = data['geometry']['coordinates']
-                timestamp = data.get('timestamp')
-                
-                location = {
-                    'longitude': coords[0],
-                    'latitude': coords[1],
-                    'timestamp': timestamp
-                }
-                logger.info(f"Successfully extracted location from alternative endpoint: {location}")
+            location = geometry_location(data)
+            if location:
                 return location
         except Exception as nested_e:
             logger.warning(f"Error fetching location from alternative endpoint: {str(nested_e)}")
@@ -226,8 +266,165 @@ def fetch_machine_location(token, machine_id):
         logger.error(f"Error in fetch_machine_location for machine {machine_id}: {str(e)}")
         return None
 
-def fetch_machines_by_organization(token, organization_id):
-    """Fetches machines for a specific organization from John Deere API."""
+def _persist_location_points(machine_id, values):
+    """Guarda los puntos de locationHistory en el almacén local (sin propagar errores)."""
+    try:
+        return get_store().save_location_points(machine_id, values)
+    except Exception as e:
+        logger.warning(f"No se pudieron guardar los puntos de ubicación de la máquina {machine_id}: {str(e)}")
+        return 0
+
+def _persist_engine_hour_readings(machine_id, data):
+    """Guarda las lecturas de horómetro en el almacén local (sin propagar errores)."""
+    try:
+        return get_store().save_engine_hour_readings(machine_id, data)
+    except Exception as e:
+        logger.warning(f"No se pudieron guardar las lecturas de horómetro de la máquina {machine_id}: {str(e)}")
+        return 0
+
+def fetch_machine_location_history(token, machine_id, start_date=None):
+    """Fetches the locationHistory point stream of a machine and stores it locally.
+    
+    Args:
+        token: OAuth token
+        machine_id: ID of the machine
+        start_date: Only request points from this ISO timestamp onwards
+            (default: from the newest point already stored)
+    
+    Returns:
+        Number of new points stored
+    """
+    token = refresh_token_if_needed(token)
+    oauth = get_oauth_session(token=token)
+    
+    if start_date is None:
+        start_date = get_store().latest_point_timestamp(machine_id)
+    
+    endpoint = f"{JOHN_DEERE_API_BASE_URL}/platform/machines/{machine_id}/locationHistory"
+    params = {'startDate': start_date} if start_date else None
+    headers = {'x-deere-no-paging': 'true'}
+    
+    response = oauth.get(endpoint, params=params, headers=headers)
+    response.raise_for_status()
+    
+    values = response.json().get('values', [])
+    new_points = _persist_location_points(machine_id, values)
+    logger.info(f"Historial de ubicación de la máquina {machine_id}: {len(values)} puntos recibidos, {new_points} nuevos")
+    return new_points
+
+# Concurrent syncs of the same machine (several users, the poller) share one request
+_history_flight = SingleFlight()
+
+def iter_location_history_syncs(token, machine_ids, max_age=LOCATION_HISTORY_SYNC_TTL, max_workers=None):
+    """Brings the stored location history of several machines up to date,
+    yielding each machine ID as soon as its stored history is current.
+    
+    Only machines not synced in the last max_age seconds are requested, and
+    only for points newer than the ones already stored. Machines that are
+    already current are yielded first. A machine being synced by another
+    request is not requested again: its result is awaited instead.
+    
+    Yields:
+        Tuples (machine_id, requested_upstream)
+    """
+    store = get_store()
+    now = time.time()
+    stale = []
+    for machine_id in dict.fromkeys(machine_ids):
+        if not machine_id:
+            continue
+        if now - (store.get_sync_time(f"history:{machine_id}") or 0) > max_age:
+            stale.append(machine_id)
+        else:
+            yield machine_id, False
+    if not stale:
+        return
+    
+    token = refresh_token_if_needed(token)
+    
+    def fetch(machine_id):
+        key = f"history:{machine_id}"
+        # Otra petición pudo sincronizarla mientras esta esperaba
+        if time.time() - (store.get_sync_time(key) or 0) <= max_age:
+            return False
+        try:
+            fetch_machine_location_history(token, machine_id)
+            store.set_sync_time(key)
+        except Exception as e:
+            logger.warning(f"Error sincronizando historial de ubicación de la máquina {machine_id}: {str(e)}")
+        return True
+    
+    def sync(machine_id):
+        return machine_id, _history_flight.do(f"history:{machine_id}", lambda: fetch(machine_id))
+    
+    workers = max(1, min(max_workers or LOCATION_FETCH_CONCURRENCY, len(stale)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jd-history') as executor:
+        for future in as_completed([executor.submit(sync, machine_id) for machine_id in stale]):
+            yield future.result()
+
+def sync_location_histories(token, machine_ids, max_age=LOCATION_HISTORY_SYNC_TTL, max_workers=None):
+    """Brings the stored location history of several machines up to date.
+    
+    Returns:
+        Number of machines that were requested upstream
+    """
+    return sum(
+        1 for _machine_id, requested in
+        iter_location_history_syncs(token, machine_ids, max_age=max_age, max_workers=max_workers)
+        if requested
+    )
+
+def _fetch_for_machines(fetch, token, machine_ids, max_workers, label):
+    """Runs fetch(token, machine_id) for several machines on a bounded thread pool.
+    
+    Returns a dictionary mapping machine ID to the result of fetch.
+    """
+    machine_ids = list(dict.fromkeys(machine_id for machine_id in machine_ids if machine_id))
+    if not machine_ids:
+        return {}
+    
+    workers = max(1, min(max_workers, len(machine_ids)))
+    logger.info(f"Consultando {label} de {len(machine_ids)} máquinas con {workers} hilos")
+    
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'jd-{label}') as executor:
+        results = executor.map(lambda machine_id: fetch(token, machine_id), machine_ids)
+        return dict(zip(machine_ids, results))
+
+def fetch_machine_locations(token, machine_ids, max_workers=None):
+    """Fetches locations for several machines concurrently.
+    
+    Args:
+        token: OAuth token
+        machine_ids: IDs of the machines (None values are ignored)
+        max_workers: Maximum number of simultaneous lookups
+            (default: LOCATION_FETCH_CONCURRENCY)
+    
+    Returns:
+        Dictionary mapping machine ID to its location (or None)
+    """
+    # fetch_machine_location nunca lanza excepciones (devuelve None en caso de error)
+    return _fetch_for_machines(
+        fetch_machine_location, token, machine_ids,
+        max_workers or LOCATION_FETCH_CONCURRENCY, 'location'
+    )
+
+def equipment_machine(machine):
+    """Builds the machine record of an /isg/equipment item (the location is added later)."""
+    machine_id = machine.get('id')
+    return {
+        'id': machine_id,
+        'name': machine.get('name') or f"Máquina {machine_id}",
+        'model': machine.get('model'),
+        'category': machine.get('category') or 'UNKNOWN',
+        'type': machine.get('type') or machine.get('category') or 'UNKNOWN',
+        'location': None,
+        'links': machine.get('links', [])
+    }
+
+@cached('equipment', key=lambda token, organization_id: (user_scope(token), organization_id))
+def fetch_equipment_by_organization(token, organization_id):
+    """Fetches the equipment list (without locations) for an organization."""
+    scope_token = token
     try:
         token = refresh_token_if_needed(token)
         oauth = get_oauth_session(token=token)
@@ -235,7 +432,7 @@ def fetch_machines_by_organization(token, organization_id):
         logger.info(f"Fetching machines for organization {organization_id}")
         
         # Usando el endpoint específico para equipos con el formato exacto proporcionado
-        endpoint = "https://equipmentapi.deere.com/isg/equipment"
+        endpoint = f"{JOHN_DEERE_EQUIPMENT_API_URL}/isg/equipment"
         
         # Parámetros específicos para el endpoint de equipos
         params = {
@@ -255,175 +452,312 @@ def fetch_machines_by_organization(token, organization_id):
         data = response.json()
         machines = []
         
-        # Log especial para organizaciones grandes
-        total_machines = 0
-        if 'values' in data:
-            total_machines = len(data['values'])
-            logger.info(f"Recibidas {total_machines} máquinas para la organización {organization_id}")
-        
         if 'values' in data:
-            logger.info(f"Procesando {total_machines} máquinas para la organización {organization_id}")
-            
-            # Si hay muchas máquinas (más de 50), limitamos la obtención de ubicaciones
-            # para mejorar el rendimiento y evitar demasiadas peticiones a la API
-            limit_location_fetching = total_machines > 50
+            logger.info(f"Recibidas {len(data['values'])} máquinas para la organización {organization_id}")
             
-            # Para organizaciones con muchísimas máquinas, ajustamos el número de máquinas 
-            # para las que buscamos ubicación
-            location_fetch_limit = 15
-            if total_machines > 200:
-                location_fetch_limit = 10
-            
-            for machine in data['values']:
-                machine_id = machine.get('id')
-                logger.info(f"Processing machine: {machine_id} - {machine.get('name')}")
-                
-                # Inicializar location como None
-                location = None
-                
-                # Para organizaciones con muchas máquinas, buscamos ubicación para
-                # una cantidad razonable para un mejor balance entre
-                # rendimiento y experiencia de usuario
-                if machine_id and (not limit_location_fetching or len(machines) < location_fetch_limit):
-                    location = fetch_machine_location(token, machine_id)
-                    
-                    # Si encontramos una ubicación, registrar el éxito
-                    if location:
-                        logger.info(f"Machine location found for {machine_id}: {location}")
-                elif limit_location_fetching:
-                    logger.info(f"Omitiendo búsqueda de ubicación para máquina {machine_id} para mejorar rendimiento")
-                
-                # Crear el objeto de máquina
-                machine_obj = {
-                    'id': machine_id,
-                    'name': machine.get('name') or f"Máquina {machine_id}",
-                    'model': machine.get('model'),
-                    'category': machine.get('category') or 'UNKNOWN',
-                    'type': machine.get('type') or machine.get('category') or 'UNKNOWN',
-                    'location': location,
-                    'links': machine.get('links', [])
-                }
-                
-                machines.append(machine_obj)
+            machines = [equipment_machine(machine) for machine in data['values']]
+            # Los detalles de cada máquina salen de estos mismos datos sin volver a pedirlos
+            remember_equipment_items(scope_token, data['values'])
         
-        logger.info(f"Retrieved {len(machines)} machines for organization {organization_id}")
         return machines
     except Exception as e:
         logger.error(f"Error fetching machines for organization {organization_id}: {str(e)}")
         raise
 
+def fetch_machines_by_organization(token, organization_id):
+    """Fetches machines for a specific organization from John Deere API."""
+    equipment = fetch_equipment_by_organization(token, organization_id)
+    
+    # Consultar las ubicaciones en paralelo con un número acotado de hilos,
+    # así todas las máquinas obtienen ubicación sin multiplicar la latencia.
+    # El listado de equipos y las ubicaciones se cachean con TTL distintos.
+    locations = fetch_machine_locations(token, [machine.get('id') for machine in equipment])
+    
+    machines = [dict(machine, location=locations.get(machine.get('id'))) for machine in equipment]
+    
+    logger.info(f"Retrieved {len(machines)} machines for organization {organization_id}")
+    return machines
+
+def fetch_fleet_columns(token, organization_id):
+    """Fetches the machines of an organization as FleetSnapshot columns (the value cached as 'machines')."""
+    return FleetSnapshot.from_machines(fetch_machines_by_organization(token, organization_id)).to_columns()
+
+def machine_details_record(machine_data, machine_id, location):
+    """Builds the machine details returned by /api/machine/<id> from an /isg/equipment item."""
+    return {
+        'id': machine_data.get('id'),
+        'name': machine_data.get('name', f"Máquina {machine_id}"),
+        'serialNumber': machine_data.get('serialNumber', f"SN-{machine_id}"),
+        'model': machine_data.get('model', 'Desconocido'),
+        'type': machine_data.get('type') or machine_data.get('category', 'UNKNOWN'),
+        'category': machine_data.get('category', 'UNKNOWN'),
+        'status': machine_data.get('status', 'ACTIVE'),
+        'location': location,
+        'hoursOfOperation': machine_data.get('hoursOfOperation', 0),
+        'fuelLevel': machine_data.get('fuelLevel', 0),
+        'lastUpdated': machine_data.get('lastUpdated') or machine_data.get('timestamp')
+    }
+
+def equipment_item_key(token, machine_id):
+    """Cache key of the /isg/equipment item of one machine."""
+    return (user_scope(token), 'machine', str(machine_id))
+
+def remember_equipment_items(token, items):
+    """Caches each /isg/equipment item under its machine ID (see fetch_equipment_item)."""
+    get_cache().set_many('equipment', [
+        (equipment_item_key(token, item.get('id')), item) for item in items if item.get('id') is not None
+    ])
+
+def missing_equipment_error(machine_id):
+    return ValueError(f"No se encontraron detalles para la máquina con ID: {machine_id}")
+
+def _fetch_equipment_chunk(token, machine_ids):
+    """Fetches the /isg/equipment items of up to EQUIPMENT_BATCH_SIZE machines in one call."""
+    oauth = get_oauth_session(token=token)
+    
+    # Usando el endpoint específico para equipos, con varios IDs separados por comas
+    endpoint = f"{JOHN_DEERE_EQUIPMENT_API_URL}/isg/equipment"
+    params = {"ids": ",".join(machine_ids)}
+    
+    # Agregar encabezado para desactivar paginación
+    headers = {'x-deere-no-paging': 'true'}
+    
+    logger.info(f"Requesting equipment for {len(machine_ids)} machines from: {endpoint}")
+    response = oauth.get(endpoint, params=params, headers=headers)
+    response.raise_for_status()
+    
+    data = response.json()
+    _log_payload("Received equipment response", data)
+    return data.get('values', [])
+
+def fetch_equipment_items(token, machine_ids, max_workers=None):
+    """Fetches the /isg/equipment items of several machines.
+    
+    Items already cached (for instance by fetch_equipment_by_organization) are
+    not requested again; the rest are fetched with multi-ID calls of
+    EQUIPMENT_BATCH_SIZE machines, in parallel.
+    
+    Returns:
+        Dictionary mapping machine ID (as string) to its item; unknown machines are left out
+    """
+    machine_ids = list(dict.fromkeys(str(machine_id) for machine_id in machine_ids if machine_id))
+    cached_items = get_cache().get_many('equipment', [equipment_item_key(token, m) for m in machine_ids])
+    items = {key_parts[2]: item for key_parts, item in cached_items.items()}
+    
+    missing = [machine_id for machine_id in machine_ids if machine_id not in items]
+    if not missing:
+        return items
+    
+    scope_token = token
+    token = refresh_token_if_needed(token)
+    chunks = [missing[i:i + EQUIPMENT_BATCH_SIZE] for i in range(0, len(missing), EQUIPMENT_BATCH_SIZE)]
+    logger.info(f"Consultando equipos de {len(missing)} máquinas en {len(chunks)} llamadas")
+    
+    if len(chunks) == 1:
+        results = [_fetch_equipment_chunk(token, chunks[0])]
+    else:
+        workers = max(1, min(max_workers or LOCATION_FETCH_CONCURRENCY, len(chunks)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jd-equipment') as executor:
+            results = list(executor.map(lambda chunk: _fetch_equipment_chunk(token, chunk), chunks))
+    
+    for values in results:
+        remember_equipment_items(scope_token, values)
+        items.update({str(item.get('id')): item for item in values if item.get('id') is not None})
+    return items
+
+# Agrupa las consultas de un solo equipo que llegan a la vez (detalle, resumen, mapa)
+_equipment_loader = BatchLoader(
+    fetch_equipment_items, EQUIPMENT_BATCH_WINDOW, EQUIPMENT_BATCH_SIZE, missing_error=missing_equipment_error
+)
+
+def fetch_equipment_item(token, machine_id):
+    """Fetches the /isg/equipment item of one machine.
+    
+    Cached items are returned at once; otherwise the request joins the
+    lookups of other machines made at the same time (see batch_loader).
+    """
+    entry = get_cache().get_entry('equipment', equipment_item_key(token, machine_id))
+    if entry is not None and entry.is_fresh:
+        return entry.value
+    return _equipment_loader.load(token, str(machine_id))
+
 def fetch_machine_details(token, machine_id):
     """Fetches detailed information for a specific machine."""
     try:
         token = refresh_token_if_needed(token)
-        oauth = get_oauth_session(token=token)
         
         logger.info(f"Fetching details for machine {machine_id}")
         
-        # Usando el endpoint específico para equipos
-        endpoint = "https://equipmentapi.deere.com/isg/equipment"
-        
-        # Parámetro para obtener un equipo específico por ID
-        params = {"ids": machine_id}
-        
-        # Agregar encabezado para desactivar paginación
-        headers = {'x-deere-no-paging': 'true'}
-        
-        logger.info(f"Requesting machine details from: {endpoint} with params: {params}")
-        response = oauth.get(endpoint, params=params, headers=headers)
-        response.raise_for_status()
-        
-        # Obtener los datos de la respuesta
-        data = response.json()
-        logger.info(f"Received machine details response: {data}")
-        
-        # La respuesta contiene un array de valores, tenemos que obtener la primera máquina
-        machine_data = None
-        if 'values' in data and len(data['values']) > 0:
-            machine_data = data['values'][0]
-        else:
-            logger.error(f"No machine data found for ID: {machine_id}")
-            raise ValueError(f"No se encontraron detalles para la máquina con ID: {machine_id}")
-        
-        # Obtener información de ubicación desde el endpoint específico
-        location = fetch_machine_location(token, machine_id)
-        
-        # Extraer detalles adicionales si están disponibles
-        machine_details = {
-            'id': machine_data.get('id'),
-            'name': machine_data.get('name', f"Máquina {machine_id}"),
-            'serialNumber': machine_data.get('serialNumber', f"SN-{machine_id}"),
-            'model': machine_data.get('model', 'Desconocido'),
-            'type': machine_data.get('type') or machine_data.get('category', 'UNKNOWN'),
-            'category': machine_data.get('category', 'UNKNOWN'),
-            'status': machine_data.get('status', 'ACTIVE'),
-            'location': location,
-            'hoursOfOperation': machine_data.get('hoursOfOperation', 0),
-            'fuelLevel': machine_data.get('fuelLevel', 0),
-            'lastUpdated': machine_data.get('lastUpdated') or machine_data.get('timestamp')
-        }
-        
-        return machine_details
+        # Equipo y ubicación en paralelo
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix='jd-details') as executor:
+            machine_data = executor.submit(fetch_equipment_item, token, machine_id)
+            location = executor.submit(fetch_machine_location, token, machine_id)
+            return machine_details_record(machine_data.result(), machine_id, location.result())
     except Exception as e:
         logger.error(f"Error fetching details for machine {machine_id}: {str(e)}")
         raise
 
-# Esta función ha sido reemplazada por una implementación más completa abajo
+def fetch_machine_overview(token, machine_id, include_alerts=True, include_engine_hours=True, days_back=30):
+    """Fetches details, location, engine hours and alerts of a machine concurrently.
+    
+    Args:
+        token: OAuth token
+        machine_id: ID of the machine
+        include_alerts: Whether to fetch the alerts (False if the caller already has them)
+        include_engine_hours: Whether to fetch the engine hours
+        days_back: Number of days back to fetch alerts (default: 30)
+    
+    Returns:
+        Dictionary with 'machine' (as fetch_machine_details), 'engineHours' and 'alerts'
+        (None when not requested). Raises if the equipment can't be fetched.
+    """
+    token = refresh_token_if_needed(token)
+    
+    with ThreadPoolExecutor(max_workers=4, thread_name_prefix='jd-overview') as executor:
+        machine_data = executor.submit(fetch_equipment_item, token, machine_id)
+        location = executor.submit(fetch_machine_location, token, machine_id)
+        engine_hours = executor.submit(fetch_machine_engine_hours, token, machine_id) if include_engine_hours else None
+        alerts = executor.submit(fetch_machine_alerts, token, machine_id, days_back) if include_alerts else None
+        
+        try:
+            machine = machine_details_record(machine_data.result(), machine_id, location.result())
+        except Exception as e:
+            logger.error(f"Error fetching details for machine {machine_id}: {str(e)}")
+            raise
+        
+        return {
+            'machine': machine,
+            'engineHours': engine_hours.result() if engine_hours else None,
+            'alerts': alerts.result() if alerts else None
+        }
+
+
+# Path of an alert definition: the ID is the catalog key and the request path is built from it
+ALERT_DEFINITION_PATH = re.compile(r'^/?platform/alertDefinitions/([A-Za-z0-9][A-Za-z0-9._-]*)/?$')
+
+def alert_definition_id(definition_uri):
+    """Returns the definition ID of an alert definition URI.
+    
+    Only URIs (full URLs or paths) of the form /platform/alertDefinitions/<id>
+    are accepted; anything else raises ValueError, so a client can't store the
+    response of another endpoint in the shared catalog under an ID.
+    """
+    match = ALERT_DEFINITION_PATH.match(urlparse(str(definition_uri)).path)
+    if not match:
+        raise ValueError(f"URI de definición de alerta no válida: {definition_uri}")
+    return match.group(1)
+
+def placeholder_alert_definition(definition_id):
+    """Generic definition for an ID that is neither in the catalog nor available from the API."""
+    return {
+        'id': definition_id,
+        'title': f"Alerta DTC {definition_id}",
+        'description': f"Esta es una alerta de código de diagnóstico (DTC) con ID {definition_id}. Para más información, consulte la documentación técnica de John Deere o contacte con su concesionario.",
+        'causes': [
+            "Esta información no está disponible a través de la API actual.",
+            "Es posible que se necesiten permisos adicionales para acceder a esta información."
+        ],
+        'resolutions': [
+            "Para resolver este problema, consulte con un técnico autorizado de John Deere.",
+            "Puede encontrar más información en el manual técnico del equipo."
+        ],
+        'additionalInfo': "La información detallada para este código no está disponible actualmente a través de la API.",
+        'success': True,
+        'source': 'placeholder',
+        'note': "Información generada a partir del ID de la alerta. No representa datos completos de la API de John Deere."
+    }
+
+def alert_definition_response(definition):
+    """Formats a DTC catalog definition as returned by /api/alert/definition."""
+    code = ' / '.join(
+        f"{label} {value}" for label, value in (('SPN', definition.spn), ('FMI', definition.fmi)) if value is not None
+    )
+    return {
+        'id': definition.id,
+        'title': definition.title or f"Alerta DTC {definition.id}",
+        'description': definition.description or f"Alerta de código de diagnóstico (DTC) con ID {definition.id}.",
+        'causes': list(definition.causes),
+        'resolutions': list(definition.resolutions),
+        'additionalInfo': code or None,
+        'spn': definition.spn,
+        'fmi': definition.fmi,
+        'source': definition.source,
+        'success': True
+    }
+
+def parse_alert_definition(data, definition_id):
+    """Extracts a DTC catalog entry from an alert definition API response."""
+    spn = data.get('suspectParameterName', data.get('spn'))
+    fmi = data.get('failureModeIndicator', data.get('fmi'))
+    title = data.get('title') or data.get('name')
+    if not title and spn is not None and fmi is not None:
+        title = f"Alerta {data.get('threeLetterAcronym', 'DTC')} {spn}.{fmi}"
+    return {
+        'id': definition_id,
+        'spn': spn,
+        'fmi': fmi,
+        'title': title,
+        'description': data.get('description'),
+        'causes': data.get('causes') or [],
+        'resolutions': data.get('resolutions') or []
+    }
+
+def _request_alert_definition(oauth, definition_id):
+    """Requests an alert definition from the API.
+    
+    The path is built from the ID: the request always goes to
+    JOHN_DEERE_API_BASE_URL, so the user's token is never sent elsewhere.
+    """
+    endpoint = f"{JOHN_DEERE_API_BASE_URL}/platform/alertDefinitions/{definition_id}"
+    logger.info(f"Requesting alert definition from: {endpoint}")
+    response = oauth.get(endpoint)
+    response.raise_for_status()
+    return response.json()
 
 def fetch_alert_definition(token, definition_uri):
     """
     Fetches detailed definition for a specific alert.
     
-    Since the alert definition endpoints appear to be unavailable or require different permissions,
-    this function now tries to extract relevant information from the alert ID, using information
-    from the DTC code patterns.
+    The definition is looked up in the local DTC catalog (see dtc_catalog). An
+    ID missing from the catalog is requested once from the API and added to it;
+    if the API doesn't have it either, the request isn't repeated for
+    DTC_MISS_TTL seconds. IDs of the form 'SPN.FMI' are described with the
+    J1939 names of the code, and anything else gets a generic definition.
     
     Args:
         token: OAuth token
         definition_uri: URI for the alert definition, either a full URL or just the path
+            (/platform/alertDefinitions/<id>, see alert_definition_id)
     
     Returns:
         Dictionary with alert definition details or error information
     """
     try:
-        logger.info(f"Processing alert definition information from: {definition_uri}")
-        
-        # Extract alert definition ID from the URI
-        definition_id = definition_uri.split('/')[-1]
-        
-        # Extract the DTC code from the ID if possible
-        dtc_code = None
-        if definition_id.isdigit():
-            # This is just a hint of a possible DTC code structure based on the ID
-            # In a real implementation, we would need to know the actual mapping
-            dtc_code = f"DTC Code: {definition_id}"
-        
-        # Get more detailed information based on the ID
-        # Here we would ideally have a mapping of known DTC codes to their descriptions
-        # and resolution steps, but since we don't, we'll provide basic information
-        
-        # Create a default response with available information
-        definition_data = {
-            'id': definition_id,
-            'title': f"Alerta DTC {definition_id}",
-            'description': f"Esta es una alerta de código de diagnóstico (DTC) con ID {definition_id}. Para más información, consulte la documentación técnica de John Deere o contacte con su concesionario.",
-            'causes': [
-                "Esta información no está disponible a través de la API actual.",
-                "Es posible que se necesiten permisos adicionales para acceder a esta información."
-            ],
-            'resolutions': [
-                "Para resolver este problema, consulte con un técnico autorizado de John Deere.",
-                "Puede encontrar más información en el manual técnico del equipo."
-            ],
-            'additionalInfo': "La información detallada para este código no está disponible actualmente a través de la API.",
-            'success': True,
-            'note': "Información generada a partir del ID de la alerta. No representa datos completos de la API de John Deere."
-        }
+        catalog = get_catalog()
+        definition_id = alert_definition_id(definition_uri)
+        definition = catalog.get(definition_id)
+        
+        if definition is None and not catalog.recently_missed(definition_id):
+            try:
+                token = refresh_token_if_needed(token)
+                if not token:
+                    raise Exception("Token no válido o expirado y no se pudo refrescar")
+                data = _request_alert_definition(get_oauth_session(token=token), definition_id)
+                catalog.add([parse_alert_definition(data, definition_id)], source='api')
+                definition = catalog.get(definition_id)
+                logger.info(f"Definición de alerta {definition_id} obtenida de la API y añadida al catálogo")
+            except Exception as e:
+                logger.warning(f"No se pudo obtener la definición de alerta {definition_id} de la API: {str(e)}")
+                catalog.record_miss(definition_id)
         
-        # Log the response
-        logger.info(f"Created alert definition information based on ID: {definition_id}")
+        if definition is None:
+            code = parse_code_key(definition_id)
+            definition = catalog.find(*code) if code else None
+        if definition is None:
+            logger.info(f"Definición de alerta {definition_id} no disponible; se devuelve información genérica")
+            return placeholder_alert_definition(definition_id)
         
-        return definition_data
+        return alert_definition_response(catalog.complete(definition))
         
     except Exception as e:
         logger.error(f"Error general en fetch_alert_definition: {str(e)}")
@@ -433,175 +767,292 @@ def fetch_alert_definition(token, definition_uri):
             'message': "Error interno al procesar la solicitud de definición de alerta."
         }
 
-def fetch_machine_alerts(token, machine_id, days_back=30):
+def fetch_alert_definitions(token, definition_uris=(), codes=(), max_workers=None):
+    """Resolves many alert definitions at once.
+    
+    Definitions already in the catalog are answered from memory; the rest are
+    requested from the API concurrently (see fetch_alert_definition).
+    
+    Args:
+        token: OAuth token
+        definition_uris: Alert definition URIs
+        codes: DTC codes as 'SPN.FMI' strings
+        max_workers: Maximum number of simultaneous API requests
+            (default: ALERT_FETCH_CONCURRENCY)
+    
+    Returns:
+        Dictionary mapping each URI or code to its definition (None for codes
+        that aren't known)
+    """
+    catalog = get_catalog()
+    results = {}
+    pending = []
+    for definition_uri in dict.fromkeys(uri for uri in definition_uris if uri):
+        definition = catalog.get(alert_definition_id(definition_uri))
+        if definition is not None:
+            results[definition_uri] = alert_definition_response(catalog.complete(definition))
+        else:
+            pending.append(definition_uri)
+    
+    if pending:
+        # Refrescar una sola vez para no repetirlo en cada hilo
+        token = refresh_token_if_needed(token)
+        workers = max(1, min(max_workers or ALERT_FETCH_CONCURRENCY, len(pending)))
+        logger.info(f"Consultando {len(pending)} definiciones de alerta con {workers} hilos")
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jd-alert-definitions') as executor:
+            results.update(zip(pending, executor.map(lambda uri: fetch_alert_definition(token, uri), pending)))
+    
+    for code in dict.fromkeys(str(code) for code in codes):
+        key = parse_code_key(code)
+        definition = catalog.find(*key) if key else None
+        results[code] = alert_definition_response(definition) if definition else None
+    
+    return results
+
+def api_timestamp(epoch):
+    """Formats a Unix time as the UTC timestamp format expected by the API."""
+    return datetime.utcfromtimestamp(epoch).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+def plan_alert_sync(store, scope, machine_id, days_back, max_age, now):
+    """Decides which date ranges of alerts still have to be requested for a machine.
+    
+    The store keeps, per machine, the start of the window already downloaded
+    (alerts_from) and the high-water mark of the last download (alerts_until).
+    Only the alerts after the high-water mark (with ALERT_SYNC_OVERLAP seconds
+    of overlap) and, for longer windows, the missing older range are requested.
+    A user that synced the machine less than max_age seconds ago gets the
+    stored alerts without any request.
+    
+    Returns:
+        (ranges, reset): list of (start, end) Unix times to request, and whether
+        the stored window starts over (nothing stored or too old to extend)
+    """
+    window_start = now - days_back * 86400
+    covered_from = store.get_sync_time(f"alerts_from:{machine_id}")
+    synced_until = store.get_sync_time(f"alerts_until:{machine_id}")
+    if covered_from is None or synced_until is None or synced_until < window_start:
+        return [(window_start, now)], True
+    
+    ranges = []
+    if window_start < covered_from:
+        ranges.append((window_start, covered_from))
+    checked = store.get_sync_time(f"alerts_checked:{scope}:{machine_id}")
+    if ranges or checked is None or now - checked > max_age:
+        ranges.append((synced_until - ALERT_SYNC_OVERLAP, now))
+    return ranges, False
+
+def stored_alerts(store, machine_id, days_back=30):
+    """Alerts of the last days_back days from the store, or None if the stored
+    copy is not recent (TELEMETRY_MAX_AGE) or does not cover the whole window."""
+    window_start = time.time() - days_back * 86400
+    covered_from = store.get_sync_time(f"alerts_from:{machine_id}")
+    if covered_from is None or covered_from > window_start:
+        return None
+    return store.get_alerts(machine_id, since=api_timestamp(window_start))
+
+def record_alert_sync(store, scope, machine_id, alerts, ranges, reset, now):
+    """Merges downloaded alerts by ID and moves the machine's sync marks forward."""
+    store.save_alerts(machine_id, alerts)
+    covered_from = None if reset else store.get_sync_time(f"alerts_from:{machine_id}")
+    start = min(range_start for range_start, _end in ranges)
+    store.set_sync_time(f"alerts_from:{machine_id}", start if covered_from is None else min(covered_from, start))
+    store.set_sync_time(f"alerts_until:{machine_id}", now)
+    store.set_sync_time(f"alerts_checked:{scope}:{machine_id}", now)
+
+# Severidad normalizada según la tabla proporcionada
+# HIGH: rojo, MEDIUM: amarillo, LOW: gris, INFO: azul, DTC/UNKNOWN: gris
+# Se aplica la primera regla con algún texto contenido en la severidad original (en mayúsculas)
+SEVERITY_RULES = (
+    ('high', ('HIGH', 'CRITICAL', 'ERROR')),
+    ('medium', ('MEDIUM', 'WARNING', 'WARN')),
+    ('low', ('LOW',)),
+    ('info', ('INFO',)),
+    ('dtc', ('DTC',))
+)
+SEVERITY_CACHE_SIZE = 1024
+
+DEFAULT_ALERT_DESCRIPTION = 'Sin descripción'
+DEFAULT_ALERT_TITLE = 'Alerta sin título'
+
+def _match_severity(value):
+    upper = value.upper()
+    for severity, words in SEVERITY_RULES:
+        for word in words:
+            if word in upper:
+                return severity
+    return 'unknown'
+
+# Severidad original -> normalizada; las variantes habituales ya calculadas de antemano
+_severity_lookup = {
+    variant: _match_severity(variant)
+    for _severity, words in SEVERITY_RULES
+    for word in words
+    for variant in (word, word.lower(), word.capitalize())
+}
+
+def normalize_severity(value):
+    """Normalizes an alert severity with the SEVERITY_RULES table (memoized)."""
+    if not value:
+        return 'unknown'
+    key = value if isinstance(value, str) else str(value)
+    severity = _severity_lookup.get(key)
+    if severity is None:
+        severity = _match_severity(key)
+        if len(_severity_lookup) < SEVERITY_CACHE_SIZE:
+            _severity_lookup[key] = severity
+    return severity
+
+def normalize_alert(alert):
+    """Normalizes one alert of a /platform/machines/<id>/alerts response.
+    
+    Description and title are taken, in order of preference, from the alert
+    definition, the alert itself, its content and (description only) its message.
+    """
+    description = DEFAULT_ALERT_DESCRIPTION
+    title = DEFAULT_ALERT_TITLE
+    
+    definition = alert.get('definition')
+    if isinstance(definition, dict):
+        if definition.get('description'):
+            description = definition['description']
+        if definition.get('id'):
+            title = f"Alerta DTC {definition['id']}"
+        elif definition.get('suspectParameterName') and definition.get('failureModeIndicator'):
+            title = (f"Alerta {definition.get('threeLetterAcronym', 'DTC')} "
+                     f"{definition['suspectParameterName']}.{definition['failureModeIndicator']}")
+    
+    if description == DEFAULT_ALERT_DESCRIPTION and 'description' in alert:
+        description = alert['description']
+    if title == DEFAULT_ALERT_TITLE and 'title' in alert:
+        title = alert['title']
+    
+    content = alert.get('content')
+    if isinstance(content, dict):
+        if description == DEFAULT_ALERT_DESCRIPTION and content.get('description'):
+            description = content['description']
+        if title == DEFAULT_ALERT_TITLE and content.get('title'):
+            title = content['title']
+    
+    if description == DEFAULT_ALERT_DESCRIPTION and alert.get('message'):
+        description = alert['message']
+    
+    links = alert.get('links')
+    
+    return {
+        'id': alert.get('id', 'sin-id'),
+        'title': title,
+        'description': description,
+        'severity': normalize_severity(alert.get('severity')),
+        'timestamp': alert.get('timestamp') or alert.get('time'),
+        'status': alert.get('status', 'ACTIVE'),
+        'type': alert.get('type', 'UNDEFINED'),
+        'links': list(links) if isinstance(links, list) else []
+    }
+
+def normalize_alerts(data):
+    """Normalizes the alerts of a /platform/machines/<id>/alerts response.
+    
+    Alerts that aren't objects are skipped. Each normalized alert is only
+    logged when LOG_API_PAYLOADS is enabled.
+    """
+    if 'values' not in data:
+        return []
+    
+    alerts = []
+    skipped = 0
+    log_each = LOG_API_PAYLOADS and logger.isEnabledFor(logging.DEBUG)
+    for alert in data['values']:
+        if not isinstance(alert, dict):
+            skipped += 1
+            continue
+        alert_obj = normalize_alert(alert)
+        if log_each:
+            _log_payload("Alerta procesada", alert_obj)
+        alerts.append(alert_obj)
+    
+    if skipped:
+        logger.error(f"Se omitieron {skipped} alertas con formato no válido")
+    logger.info(f"Normalizadas {len(alerts)} alertas de la respuesta")
+    return alerts
+
+def _request_alerts(oauth, machine_id, start, end):
+    """Requests the alerts of a machine between two Unix times and normalizes them."""
+    # Usando el endpoint específico para alertas de máquinas con parámetros de fecha
+    endpoint = f"{JOHN_DEERE_API_BASE_URL}/platform/machines/{machine_id}/alerts"
+    params = {'startDate': api_timestamp(start), 'endDate': api_timestamp(end)}
+    
+    # Agregar encabezado para desactivar paginación
+    headers = {'x-deere-no-paging': 'true'}
+    
+    logger.info(f"Requesting machine alerts from: {endpoint} with date range: {params['startDate']} to {params['endDate']}")
+    response = oauth.get(endpoint, params=params, headers=headers)
+    response.raise_for_status()
+    
+    # Process the response to extract alert data
+    data = response.json()
+    _log_payload(f"Received machine alerts response for {machine_id}", data)
+    return normalize_alerts(data)
+
+def fetch_machine_alerts(token, machine_id, days_back=30, max_age=ALERT_SYNC_TTL):
     """Fetches alerts for a specific machine within a date range.
     
+    Alerts are kept in the local store and merged by ID; only the alerts newer
+    than the last download (and, for longer windows, the missing older range)
+    are requested from the API. See plan_alert_sync.
+    
     Args:
         token: OAuth token
         machine_id: ID of the machine
         days_back: Number of days back to fetch alerts (default: 30)
+        max_age: Seconds during which the same user gets the stored alerts
+            without asking the API for new ones (default: ALERT_SYNC_TTL)
     """
     try:
-        logger.info(f"INICIO fetch_machine_alerts para máquina {machine_id}")
+        store = get_store()
+        now = time.time()
+        scope = user_scope(token)
+        ranges, reset = plan_alert_sync(store, scope, machine_id, days_back, max_age, now)
         
-        token = refresh_token_if_needed(token)
-        if not token:
-            logger.error("Token no válido o expirado y no se pudo refrescar")
-            return []
+        if ranges:
+            token = refresh_token_if_needed(token)
+            if not token:
+                logger.error("Token no válido o expirado y no se pudo refrescar")
+                return []
             
-        oauth = get_oauth_session(token=token)
-        if not oauth:
-            logger.error("No se pudo crear la sesión OAuth")
-            return []
-        
-        logger.info(f"Fetching alerts for machine {machine_id} for the last {days_back} days")
-        
-        # Calcular fechas para el rango de tiempo
-        from datetime import datetime, timedelta
-        
-        # Fecha actual
-        end_date = datetime.utcnow()
-        # Fecha de inicio (hace N días)
-        start_date = end_date - timedelta(days=days_back)
-        
-        # Formatear fechas en el formato requerido por la API
-        start_date_str = start_date.strftime('%Y-%m-%dT%H:%M:%S.000Z')
-        end_date_str = end_date.strftime('%Y-%m-%dT%H:%M:%S.000Z')
-        
-        # Usando el endpoint específico para alertas de máquinas con parámetros de fecha
-        endpoint = f"{JOHN_DEERE_API_BASE_URL}/platform/machines/{machine_id}/alerts"
-        
-        # Parámetros para el rango de fechas
-        params = {
-            'startDate': start_date_str,
-            'endDate': end_date_str
-        }
-        
-        # Agregar encabezado para desactivar paginación
-        headers = {'x-deere-no-paging': 'true'}
-        
-        logger.info(f"Requesting machine alerts from: {endpoint} with date range: {start_date_str} to {end_date_str}")
-        response = oauth.get(endpoint, params=params, headers=headers)
-        response.raise_for_status()
+            oauth = get_oauth_session(token=token)
+            fetched = []
+            for start, end in ranges:
+                fetched.extend(_request_alerts(oauth, machine_id, start, end))
+            record_alert_sync(store, scope, machine_id, fetched, ranges, reset, now)
+            logger.info(f"Retrieved {len(fetched)} new or updated alerts for machine {machine_id}")
         
-        # Process the response to extract alert data
-        data = response.json()
-        logger.info(f"Received machine alerts response for {machine_id}: {str(data)[:300]}...")
-        
-        alerts = []
-        
-        if 'values' in data:
-            logger.info(f"Encontradas {len(data['values'])} alertas en la respuesta")
-            for alert in data['values']:
-                try:
-                    logger.info(f"Procesando alerta: {str(alert)[:200]}...")
-                    # Normalizar el tipo de severidad según la tabla proporcionada
-                    # HIGH: rojo, MEDIUM: amarillo, LOW: gris, INFO: azul, DTC/UNKNOWN: gris
-                    severity = 'unknown'  # valor por defecto
-                    if alert.get('severity'):
-                        sev_upper = str(alert.get('severity')).upper()
-                        logger.info(f"Severidad original: {sev_upper}")
-                        if 'HIGH' in sev_upper or 'CRITICAL' in sev_upper or 'ERROR' in sev_upper:
-                            severity = 'high'
-                        elif 'MEDIUM' in sev_upper or 'WARNING' in sev_upper or 'WARN' in sev_upper:
-                            severity = 'medium'
-                        elif 'LOW' in sev_upper:
-                            severity = 'low'
-                        elif 'INFO' in sev_upper:
-                            severity = 'info'
-                        elif 'DTC' in sev_upper:
-                            severity = 'dtc'
-                        logger.info(f"Severidad normalizada: {severity}")
-                except Exception as err:
-                    logger.error(f"Error procesando severidad de alerta: {str(err)}")
-                    severity = 'unknown'
-                
-                try:
-                    # Extraer datos del contenido si disponibles
-                    description = 'Sin descripción'
-                    title = 'Alerta sin título'
-                    
-                    logger.info(f"Procesando alerta con datos: {str(alert)[:300]}...")
-                    
-                    # Intentar obtener descripción y título desde la definición
-                    if 'definition' in alert and isinstance(alert['definition'], dict):
-                        definition = alert['definition']
-                        
-                        # Obtener descripción de la definición
-                        if definition.get('description'):
-                            logger.info(f"Descripción encontrada en definición: {definition['description']}")
-                            description = definition['description']
-                        
-                        # Si hay un ID o suspectParameterName, usarlo para el título
-                        if definition.get('id'):
-                            logger.info(f"ID encontrado en definición: {definition['id']}")
-                            title = f"Alerta DTC {definition['id']}"
-                        elif definition.get('suspectParameterName') and definition.get('failureModeIndicator'):
-                            spn = definition.get('suspectParameterName')
-                            fmi = definition.get('failureModeIndicator')
-                            title = f"Alerta {definition.get('threeLetterAcronym', 'DTC')} {spn}.{fmi}"
-                    
-                    # Si no se encontró en la definición, intentar obtener directamente
-                    if description == 'Sin descripción' and 'description' in alert:
-                        logger.info(f"Descripción encontrada directamente: {alert['description']}")
-                        description = alert['description']
-                    
-                    if title == 'Alerta sin título' and 'title' in alert:
-                        logger.info(f"Título encontrado directamente: {alert['title']}")
-                        title = alert['title']
-                    
-                    # Intentar obtener desde content como último recurso
-                    if 'content' in alert:
-                        content = alert.get('content', {})
-                        logger.info(f"Contenido de alerta: {str(content)[:150]}...")
-                        if isinstance(content, dict):
-                            # Si content es un diccionario, intentar extraer la descripción y el título
-                            if description == 'Sin descripción' and content.get('description'):
-                                logger.info(f"Descripción encontrada en content: {content['description']}")
-                                description = content['description']
-                            if title == 'Alerta sin título' and content.get('title'):
-                                logger.info(f"Título encontrado en content: {content['title']}")
-                                title = content['title']
-                    
-                    # Si tenemos un timestamp como 'time', usarlo
-                    timestamp = alert.get('timestamp') or alert.get('time')
-                    logger.info(f"Timestamp: {timestamp}")
-                    
-                    # Si no hay description, buscar también en message
-                    if description == 'Sin descripción' and alert.get('message'):
-                        logger.info(f"Usando message como descripción: {alert['message']}")
-                        description = alert['message']
-                    
-                    # Extraer enlaces si están disponibles
-                    links = []
-                    if 'links' in alert and isinstance(alert['links'], list):
-                        for link in alert['links']:
-                            logger.info(f"Enlace encontrado: {link}")
-                            links.append(link)
-                    
-                    # Crear objeto de alerta normalizado
-                    alert_obj = {
-                        'id': alert.get('id', 'sin-id'),
-                        'title': title,
-                        'description': description,
-                        'severity': severity,
-                        'timestamp': timestamp,  # Usar el timestamp ya procesado
-                        'status': alert.get('status', 'ACTIVE'),
-                        'type': alert.get('type', 'UNDEFINED'),
-                        'links': links
-                    }
-                    
-                    logger.info(f"Alerta procesada: {str(alert_obj)[:150]}...")
-                    alerts.append(alert_obj)
-                except Exception as err:
-                    logger.error(f"Error procesando datos de alerta: {str(err)}")
-        
-        logger.info(f"Retrieved {len(alerts)} alerts for machine {machine_id}")
-        return alerts
+        return store.get_alerts(machine_id, since=api_timestamp(now - days_back * 86400), max_age=None)
     except Exception as e:
         logger.error(f"Error fetching alerts for machine {machine_id}: {str(e)}")
         return []  # Devolver lista vacía en caso de error en lugar de propagar la excepción
         
+def fetch_machine_alerts_batch(token, machine_ids, days_back=30, max_workers=None):
+    """Fetches alerts for several machines concurrently.
+    
+    Args:
+        token: OAuth token
+        machine_ids: IDs of the machines
+        days_back: Number of days back to fetch alerts (default: 30)
+        max_workers: Maximum number of simultaneous lookups
+            (default: ALERT_FETCH_CONCURRENCY)
+    
+    Returns:
+        Dictionary mapping machine ID to its list of alerts
+    """
+    # Refrescar una sola vez para no repetirlo en cada hilo
+    token = refresh_token_if_needed(token)
+    
+    # fetch_machine_alerts nunca lanza excepciones (devuelve [] en caso de error)
+    return _fetch_for_machines(
+        lambda token, machine_id: fetch_machine_alerts(token, machine_id, days_back=days_back),
+        token, machine_ids, max_workers or ALERT_FETCH_CONCURRENCY, 'alerts'
+    )
+
 def fetch_machine_engine_hours(token, machine_id):
     """Fetches engine hours data for a specific machine.
     
@@ -609,6 +1060,9 @@ def fetch_machine_engine_hours(token, machine_id):
         token: OAuth token
         machine_id: ID of the machine
     
+    The readings are also stored locally, where they feed the utilization
+    rollups (see engine_hours.py).
+    
     Returns:
         Dictionary with engine hours data or None if error
     """
@@ -620,7 +1074,7 @@ def fetch_machine_engine_hours(token, machine_id):
         oauth = get_oauth_session(token=token)
         
         # URL del endpoint de horas de motor
-        engine_hours_url = f"https://partnerapi.deere.com/platform/machines/{machine_id}/engineHours"
+        engine_hours_url = f"{JOHN_DEERE_API_BASE_URL}/platform/machines/{machine_id}/engineHours"
         logger.info(f"Consultando horas de motor para la máquina {machine_id}")
         
         # Realizar solicitud
@@ -630,6 +1084,7 @@ def fetch_machine_engine_hours(token, machine_id):
         
         # Procesar respuesta
         engine_hours_data = response.json()
+        _persist_engine_hour_readings(machine_id, engine_hours_data)
         
         logger.info(f"Datos de horómetro obtenidos para la máquina {machine_id}")
         return engine_hours_data
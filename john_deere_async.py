@@ -0,0 +1,377 @@
+"""Variante asíncrona (httpx) de las funciones fetch_* de john_deere_api.
+
+Pensada para el modo de servicio ASGI (asgi.py): mientras una petición espera
+a la API de John Deere el bucle de eventos atiende otras, de modo que un solo
+proceso puede mantener cientos de llamadas en curso. Las funciones síncronas de
+john_deere_api siguen disponibles; ambas variantes comparten los parsers, la
+caché (mismas claves y TTL) y el almacén local de telemetría, y devuelven los
+mismos datos.
+
+Las operaciones de SQLite que escriben (puntos de locationHistory, alertas, lecturas
+de horómetro) se ejecutan en un hilo con asyncio.to_thread para no bloquear el bucle.
+"""
+import asyncio
+import logging
+import time
+import weakref
+
+import httpx
+
+from batch_loader import AsyncBatchLoader
+from cache import async_cached, get_cache, user_scope
+from config import (
+    ALERT_FETCH_CONCURRENCY,
+    ALERT_SYNC_TTL,
+    ASYNC_FETCH_CONCURRENCY,
+    ASYNC_HTTP_TIMEOUT,
+    ASYNC_MAX_CONNECTIONS,
+    EQUIPMENT_BATCH_SIZE,
+    EQUIPMENT_BATCH_WINDOW,
+    JOHN_DEERE_API_BASE_URL,
+    JOHN_DEERE_EQUIPMENT_API_URL
+)
+from fleet_snapshot import FleetSnapshot
+from http_pool import PoolStats
+from john_deere_api import (
+    _log_payload,
+    _persist_engine_hour_readings,
+    _persist_location_points,
+    api_timestamp,
+    equipment_item_key,
+    equipment_machine,
+    geometry_location,
+    latest_history_location,
+    machine_details_record,
+    missing_equipment_error,
+    normalize_alerts,
+    plan_alert_sync,
+    record_alert_sync,
+    refresh_token_if_needed,
+    remember_equipment_items
+)
+from telemetry_store import get_store
+from token_manager import get_token_manager
+from upstream import get_scheduler
+
+logger = logging.getLogger(__name__)
+
+NO_PAGING_HEADERS = {'x-deere-no-paging': 'true'}
+
+
+class AsyncDeereClient:
+    """Un httpx.AsyncClient por bucle de eventos con conexiones keep-alive compartidas."""
+
+    def __init__(self, max_connections=ASYNC_MAX_CONNECTIONS, timeout=ASYNC_HTTP_TIMEOUT):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.stats = PoolStats()
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                timeout=self.timeout
+            )
+            self._clients[loop] = client
+        return client
+
+    async def get_json(self, token, url, params=None):
+        """GET autenticado con el token; lanza httpx.HTTPStatusError si falla."""
+        token = await valid_token(token)
+        headers = dict(NO_PAGING_HEADERS, Authorization=f"Bearer {token.get('access_token')}")
+        self.stats.request_started()
+        failed = True
+        try:
+            response = await get_scheduler().call_async(
+                'GET',
+                url,
+                lambda: self._client().get(url, params=params, headers=headers),
+                connection_errors=(httpx.TransportError,)
+            )
+            failed = False
+        finally:
+            self.stats.request_finished(failed=failed)
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+    def stats_snapshot(self):
+        snapshot = self.stats.snapshot()
+        return {
+            'requests': snapshot['requests'],
+            'in_flight': snapshot['in_flight'],
+            'max_in_flight': snapshot['max_in_flight'],
+            'errors': snapshot['errors'],
+            'max_connections': self.max_connections
+        }
+
+
+_client = AsyncDeereClient()
+
+
+def get_async_client():
+    """Devuelve el cliente asíncrono del proceso."""
+    return _client
+
+
+async def valid_token(token):
+    """Devuelve el token vigente; solo sale del bucle (a un hilo) si hay que
+    consultar el almacén compartido o refrescarlo."""
+    fresh = get_token_manager().peek(token)
+    if fresh is not None:
+        return fresh
+    return await asyncio.to_thread(refresh_token_if_needed, token)
+
+
+async def _gather_for_machines(fetch, token, machine_ids, max_concurrency, label):
+    """Ejecuta fetch(token, machine_id) para varias máquinas con concurrencia acotada.
+
+    Devuelve un diccionario {machine_id: resultado}.
+    """
+    machine_ids = list(dict.fromkeys(machine_id for machine_id in machine_ids if machine_id))
+    if not machine_ids:
+        return {}
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    logger.info(f"Consultando {label} de {len(machine_ids)} máquinas (async, concurrencia {max_concurrency})")
+
+    async def run(machine_id):
+        async with semaphore:
+            return await fetch(token, machine_id)
+
+    results = await asyncio.gather(*(run(machine_id) for machine_id in machine_ids))
+    return dict(zip(machine_ids, results))
+
+
+@async_cached('organizations', key=lambda token: (user_scope(token),))
+async def fetch_organizations(token):
+    """Async version of john_deere_api.fetch_organizations."""
+    try:
+        data = await _client.get_json(token, f"{JOHN_DEERE_API_BASE_URL}/platform/organizations")
+        return [
+            {
+                'id': org.get('id'),
+                'name': org.get('name'),
+                'type': org.get('type'),
+                'links': org.get('links', [])
+            }
+            for org in data.get('values', [])
+        ]
+    except Exception as e:
+        logger.error(f"Error fetching organizations: {str(e)}")
+        raise
+
+
+@async_cached('equipment', key=lambda token, organization_id: (user_scope(token), organization_id))
+async def fetch_equipment_by_organization(token, organization_id):
+    """Async version of john_deere_api.fetch_equipment_by_organization."""
+    try:
+        data = await _client.get_json(
+            token,
+            f"{JOHN_DEERE_EQUIPMENT_API_URL}/isg/equipment",
+            params={"organizationIds": organization_id, "categories": "machine"}
+        )
+        machines = [equipment_machine(machine) for machine in data.get('values', [])]
+        logger.info(f"Recibidas {len(machines)} máquinas para la organización {organization_id}")
+        await asyncio.to_thread(remember_equipment_items, token, data.get('values', []))
+        return machines
+    except Exception as e:
+        logger.error(f"Error fetching machines for organization {organization_id}: {str(e)}")
+        raise
+
+
+@async_cached('location', key=lambda token, machine_id: (user_scope(token), machine_id))
+async def fetch_machine_location(token, machine_id):
+    """Async version of john_deere_api.fetch_machine_location (None on error)."""
+    try:
+        stored_latest = await asyncio.to_thread(get_store().latest_point_timestamp, machine_id)
+    except Exception as e:
+        logger.warning(f"No se pudo consultar el almacén local para la máquina {machine_id}: {str(e)}")
+        stored_latest = None
+
+    try:
+        data = await _client.get_json(
+            token,
+            f"{JOHN_DEERE_API_BASE_URL}/platform/machines/{machine_id}/locationHistory",
+            params={'startDate': stored_latest} if stored_latest else None
+        )
+        _log_payload("Received machine location history response", data)
+
+        if data.get('values'):
+            await asyncio.to_thread(_persist_location_points, machine_id, data['values'])
+            location = latest_history_location(data['values'])
+            if location:
+                return location
+        elif 'geometry' in data and 'coordinates' in data['geometry']:
+            return geometry_location(data)
+        elif stored_latest:
+            latest, _with_history = await asyncio.to_thread(get_store().get_latest_points, [machine_id])
+            if latest.get(str(machine_id)):
+                return latest[str(machine_id)]
+
+        logger.warning(f"Could not find valid location data in the response for machine {machine_id}")
+    except Exception as e:
+        logger.warning(f"Error fetching location for machine {machine_id} from locationHistory endpoint: {str(e)}")
+
+    # Endpoint alternativo si el primero falla o no tiene datos válidos
+    try:
+        data = await _client.get_json(token, f"{JOHN_DEERE_API_BASE_URL}/platform/machines/{machine_id}/location")
+        _log_payload("Received machine location response", data)
+        return geometry_location(data)
+    except Exception as e:
+        logger.warning(f"Error fetching location from alternative endpoint: {str(e)}")
+        return None
+
+
+async def fetch_machine_locations(token, machine_ids, max_concurrency=None):
+    """Async version of john_deere_api.fetch_machine_locations."""
+    token = await valid_token(token)
+    return await _gather_for_machines(
+        fetch_machine_location, token, machine_ids,
+        max_concurrency or ASYNC_FETCH_CONCURRENCY, 'location'
+    )
+
+
+async def fetch_machines_by_organization(token, organization_id):
+    """Async version of john_deere_api.fetch_machines_by_organization."""
+    equipment = await fetch_equipment_by_organization(token, organization_id)
+    locations = await fetch_machine_locations(token, [machine.get('id') for machine in equipment])
+    machines = [dict(machine, location=locations.get(machine.get('id'))) for machine in equipment]
+    logger.info(f"Retrieved {len(machines)} machines for organization {organization_id}")
+    return machines
+
+
+async def fetch_fleet_columns(token, organization_id):
+    """Async version of john_deere_api.fetch_fleet_columns."""
+    return FleetSnapshot.from_machines(await fetch_machines_by_organization(token, organization_id)).to_columns()
+
+
+async def fetch_equipment_items(token, machine_ids, max_concurrency=None):
+    """Async version of john_deere_api.fetch_equipment_items."""
+    machine_ids = list(dict.fromkeys(str(machine_id) for machine_id in machine_ids if machine_id))
+    cached_items = await asyncio.to_thread(
+        get_cache().get_many, 'equipment', [equipment_item_key(token, m) for m in machine_ids]
+    )
+    items = {key_parts[2]: item for key_parts, item in cached_items.items()}
+
+    missing = [machine_id for machine_id in machine_ids if machine_id not in items]
+    if not missing:
+        return items
+
+    chunks = [missing[i:i + EQUIPMENT_BATCH_SIZE] for i in range(0, len(missing), EQUIPMENT_BATCH_SIZE)]
+    logger.info(f"Consultando equipos de {len(missing)} máquinas en {len(chunks)} llamadas (async)")
+    semaphore = asyncio.Semaphore(max_concurrency or ASYNC_FETCH_CONCURRENCY)
+
+    async def fetch_chunk(chunk):
+        async with semaphore:
+            data = await _client.get_json(
+                token, f"{JOHN_DEERE_EQUIPMENT_API_URL}/isg/equipment", params={"ids": ",".join(chunk)}
+            )
+        return data.get('values', [])
+
+    for values in await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks)):
+        await asyncio.to_thread(remember_equipment_items, token, values)
+        items.update({str(item.get('id')): item for item in values if item.get('id') is not None})
+    return items
+
+
+_equipment_loader = AsyncBatchLoader(
+    fetch_equipment_items, EQUIPMENT_BATCH_WINDOW, EQUIPMENT_BATCH_SIZE, missing_error=missing_equipment_error
+)
+
+
+async def fetch_equipment_item(token, machine_id):
+    """Async version of john_deere_api.fetch_equipment_item."""
+    entry = await asyncio.to_thread(get_cache().get_entry, 'equipment', equipment_item_key(token, machine_id))
+    if entry is not None and entry.is_fresh:
+        return entry.value
+    return await _equipment_loader.load(token, str(machine_id))
+
+
+async def fetch_machine_details(token, machine_id):
+    """Async version of john_deere_api.fetch_machine_details."""
+    try:
+        machine_data, location = await asyncio.gather(
+            fetch_equipment_item(token, machine_id),
+            fetch_machine_location(token, machine_id)
+        )
+        return machine_details_record(machine_data, machine_id, location)
+    except Exception as e:
+        logger.error(f"Error fetching details for machine {machine_id}: {str(e)}")
+        raise
+
+
+async def fetch_machine_overview(token, machine_id, include_alerts=True, include_engine_hours=True, days_back=30):
+    """Async version of john_deere_api.fetch_machine_overview."""
+    token = await valid_token(token)
+
+    async def nothing():
+        return None
+
+    machine, engine_hours, alerts = await asyncio.gather(
+        fetch_machine_details(token, machine_id),
+        fetch_machine_engine_hours(token, machine_id) if include_engine_hours else nothing(),
+        fetch_machine_alerts(token, machine_id, days_back) if include_alerts else nothing()
+    )
+    return {'machine': machine, 'engineHours': engine_hours, 'alerts': alerts}
+
+
+async def fetch_machine_alerts(token, machine_id, days_back=30, max_age=ALERT_SYNC_TTL):
+    """Async version of john_deere_api.fetch_machine_alerts ([] on error)."""
+    try:
+        store = get_store()
+        now = time.time()
+        scope = user_scope(token)
+        ranges, reset = await asyncio.to_thread(plan_alert_sync, store, scope, machine_id, days_back, max_age, now)
+        
+        if ranges:
+            fetched = []
+            for start, end in ranges:
+                data = await _client.get_json(
+                    token,
+                    f"{JOHN_DEERE_API_BASE_URL}/platform/machines/{machine_id}/alerts",
+                    params={'startDate': api_timestamp(start), 'endDate': api_timestamp(end)}
+                )
+                _log_payload(f"Received machine alerts response for {machine_id}", data)
+                fetched.extend(normalize_alerts(data))
+            await asyncio.to_thread(record_alert_sync, store, scope, machine_id, fetched, ranges, reset, now)
+            logger.info(f"Retrieved {len(fetched)} new or updated alerts for machine {machine_id}")
+        
+        return await asyncio.to_thread(
+            store.get_alerts, machine_id, since=api_timestamp(now - days_back * 86400), max_age=None
+        )
+    except Exception as e:
+        logger.error(f"Error fetching alerts for machine {machine_id}: {str(e)}")
+        return []
+
+
+async def fetch_machine_alerts_batch(token, machine_ids, days_back=30, max_concurrency=None):
+    """Async version of john_deere_api.fetch_machine_alerts_batch."""
+    token = await valid_token(token)
+    return await _gather_for_machines(
+        lambda token, machine_id: fetch_machine_alerts(token, machine_id, days_back=days_back),
+        token, machine_ids, max_concurrency or max(ALERT_FETCH_CONCURRENCY, ASYNC_FETCH_CONCURRENCY), 'alerts'
+    )
+
+
+async def fetch_machine_engine_hours(token, machine_id):
+    """Async version of john_deere_api.fetch_machine_engine_hours (None on error)."""
+    try:
+        data = await _client.get_json(token, f"{JOHN_DEERE_API_BASE_URL}/platform/machines/{machine_id}/engineHours")
+        await asyncio.to_thread(_persist_engine_hour_readings, machine_id, data)
+        logger.info(f"Datos de horómetro obtenidos para la máquina {machine_id}")
+        return data
+    except Exception as e:
+        logger.error(f"Error obteniendo horas de motor para la máquina {machine_id}: {str(e)}")
+        return None
@@ -0,0 +1,230 @@
+"""Analítica de movimiento de la flota sobre los puntos de locationHistory guardados.
+
+Cada par de puntos consecutivos de una máquina es un tramo con su distancia
+(haversine) y su velocidad media. Un tramo es:
+  - una interrupción si entre los puntos pasan más de MOVEMENT_MAX_GAP_SECONDS
+    (máquina apagada o sin cobertura) o si su velocidad supera
+    MOVEMENT_MAX_SPEED_KMH (salto del GPS); no cuenta para nada,
+  - en movimiento si su velocidad llega a MOVEMENT_MOVING_SPEED_KMH,
+  - parado (la máquina reporta pero no se desplaza) en otro caso.
+La distancia recorrida es la de los tramos en movimiento (la de los parados es
+ruido del GPS), la velocidad media es esa distancia entre el tiempo en
+movimiento y el tiempo en campo es la suma del tiempo en movimiento y parado.
+
+Los tramos de toda la flota se calculan de una vez con NumPy y se agrupan por
+máquina y día (UTC); un tramo cuenta en el día de su primer punto. Cada día se
+guarda en movement_days del almacén de telemetría, que lo borra cuando llegan
+puntos nuevos de ese día: el resumen de un mes solo recalcula los días que han
+cambiado y suma los demás. Las rachas de movimiento o parada que cruzan la
+medianoche cuentan en los dos días.
+"""
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+
+from config import MOVEMENT_MAX_GAP_SECONDS, MOVEMENT_MAX_SPEED_KMH, MOVEMENT_MOVING_SPEED_KMH
+from trajectory import EARTH_RADIUS_METERS
+
+SECONDS_PER_DAY = 86400
+EPOCH = date(1970, 1, 1)
+IDLE = 1
+MOVING = 2
+
+
+def haversine(latitudes1, longitudes1, latitudes2, longitudes2):
+    """Distancia en metros entre pares de puntos (arrays en grados)."""
+    latitudes1 = np.radians(latitudes1)
+    latitudes2 = np.radians(latitudes2)
+    half_dlat = (latitudes2 - latitudes1) / 2
+    half_dlon = np.radians(np.asarray(longitudes2) - np.asarray(longitudes1)) / 2
+    a = np.sin(half_dlat) ** 2 + np.cos(latitudes1) * np.cos(latitudes2) * np.sin(half_dlon) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def epoch_seconds(timestamps):
+    """Segundos desde 1970 de timestamps normalizados ('2025-01-15T10:00:00.000Z')."""
+    # datetime64 no admite la 'Z': los timestamps guardados ya están en UTC
+    return np.array([timestamp[:23] for timestamp in timestamps], dtype='datetime64[ms]').astype(np.int64) / 1000.0
+
+
+def summarize_days(machines, seconds, latitudes, longitudes, moving_speed_kmh=MOVEMENT_MOVING_SPEED_KMH,
+                   max_speed_kmh=MOVEMENT_MAX_SPEED_KMH, max_gap_seconds=MOVEMENT_MAX_GAP_SECONDS):
+    """Resumen por máquina y día de puntos ordenados por máquina y tiempo.
+
+    `machines` es el índice de máquina de cada punto. Devuelve un dict de
+    arrays con una posición por grupo (máquina, día con puntos): 'machine',
+    'day' (días desde 1970), 'points', 'distance' (m), 'moving_seconds',
+    'idle_seconds', 'moving_segments', 'idle_segments', 'max_speed' (km/h, 0
+    sin movimiento) y 'first'/'last' (posición del primer y último punto).
+    """
+    machines = np.asarray(machines, dtype=np.int64)
+    seconds = np.asarray(seconds, dtype=float)
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    days = np.floor_divide(seconds, SECONDS_PER_DAY).astype(np.int64)
+
+    # Grupos consecutivos: cambia la máquina o el día
+    boundaries = np.flatnonzero((machines[1:] != machines[:-1]) | (days[1:] != days[:-1])) + 1
+    first = np.concatenate(([0], boundaries))
+    last = np.concatenate((boundaries - 1, [len(seconds) - 1]))
+    groups = len(first)
+    group_of_point = np.zeros(len(seconds), dtype=np.int64)
+    group_of_point[boundaries] = 1
+    np.cumsum(group_of_point, out=group_of_point)
+
+    # Tramos entre puntos consecutivos de la misma máquina, en el grupo de su primer punto
+    elapsed = np.diff(seconds)
+    distances = haversine(latitudes[:-1], longitudes[:-1], latitudes[1:], longitudes[1:])
+    speeds = np.full(len(elapsed), np.inf)
+    np.divide(distances * 3.6, elapsed, out=speeds, where=elapsed > 0)
+    active = (machines[1:] == machines[:-1]) & (elapsed <= max_gap_seconds) & (speeds <= max_speed_kmh)
+    moving = active & (speeds >= moving_speed_kmh)
+    idle = active & ~moving
+    segment_group = group_of_point[:-1]
+
+    # Rachas: un tramo activo empieza una si el anterior tenía otro estado o era de otro grupo
+    states = np.where(moving, MOVING, np.where(idle, IDLE, 0))
+    starts = states.astype(bool)
+    starts[1:] &= (states[1:] != states[:-1]) | (segment_group[1:] != segment_group[:-1])
+
+    max_speed = np.zeros(groups)
+    np.maximum.at(max_speed, segment_group[moving], speeds[moving])
+    return {
+        'machine': machines[first],
+        'day': days[first],
+        'points': last - first + 1,
+        'distance': np.bincount(segment_group, weights=np.where(moving, distances, 0.0), minlength=groups),
+        'moving_seconds': np.bincount(segment_group, weights=np.where(moving, elapsed, 0.0), minlength=groups),
+        'idle_seconds': np.bincount(segment_group, weights=np.where(idle, elapsed, 0.0), minlength=groups),
+        'moving_segments': np.bincount(segment_group[starts & moving], minlength=groups),
+        'idle_segments': np.bincount(segment_group[starts & idle], minlength=groups),
+        'max_speed': max_speed,
+        'first': first,
+        'last': last
+    }
+
+
+def day_number(day):
+    return (day - EPOCH).days
+
+
+def compute_movement_days(store, missing):
+    """Calcula y guarda los días pedidos: {machine_id: conjunto de días (date)}.
+
+    Devuelve las filas guardadas; los días sin puntos se guardan a cero para
+    no volver a buscarlos.
+    """
+    machine_ids = [machine_id for machine_id, days in missing.items() if days]
+    timestamps = []
+    latitudes = []
+    longitudes = []
+    counts = []
+    for machine_id in machine_ids:
+        # Un rango por máquina, hasta el primer punto del día siguiente al último pedido
+        start = min(missing[machine_id])
+        end = max(missing[machine_id]) + timedelta(days=1)
+        rows = store.get_point_rows(machine_id, f"{start.isoformat()}T00:00:00.000Z", f"{end.isoformat()}T00:00:00.000Z")
+        timestamps.extend(row[0] for row in rows)
+        latitudes.extend(row[1] for row in rows)
+        longitudes.extend(row[2] for row in rows)
+        counts.append(len(rows))
+
+    computed = {}
+    if timestamps:
+        summary = summarize_days(np.repeat(np.arange(len(machine_ids)), counts), epoch_seconds(timestamps),
+                                 latitudes, longitudes)
+        columns = [summary[name].tolist() for name in (
+            'machine', 'day', 'points', 'distance', 'moving_seconds', 'idle_seconds', 'moving_segments',
+            'idle_segments', 'max_speed', 'first', 'last'
+        )]
+        for machine, day, points, distance, moving_seconds, idle_seconds, moving_segments, idle_segments, \
+                max_speed, first, last in zip(*columns):
+            computed[(machine_ids[machine], day)] = (
+                points, distance, moving_seconds, idle_seconds, moving_segments, idle_segments,
+                max_speed if moving_segments else None, timestamps[first], timestamps[last]
+            )
+
+    rows = []
+    for machine_id in machine_ids:
+        for day in missing[machine_id]:
+            values = computed.get((machine_id, day_number(day)), (0, 0.0, 0.0, 0.0, 0, 0, None, None, None))
+            rows.append((machine_id, day.isoformat()) + values)
+    store.save_movement_days(rows)
+    return rows
+
+
+def movement_summary(store, machine_ids, first_day, last_day):
+    """Resumen de movimiento de cada máquina entre dos días (date), inclusive.
+
+    Devuelve {machine_id: resumen}. Los días sin resumen guardado se calculan
+    (salvo los posteriores a hoy, que aún no tienen puntos).
+    """
+    machine_ids = [str(machine_id) for machine_id in machine_ids]
+    rows = store.get_movement_days(machine_ids, first_day.isoformat(), last_day.isoformat())
+    stored = {(row[0], row[1]) for row in rows}
+    today = datetime.now(timezone.utc).date()
+    days = [first_day + timedelta(days=offset) for offset in range((min(last_day, today) - first_day).days + 1)]
+    missing = {
+        machine_id: {day for day in days if (machine_id, day.isoformat()) not in stored}
+        for machine_id in machine_ids
+    }
+    if any(missing.values()):
+        rows.extend(compute_movement_days(store, missing))
+
+    totals = {machine_id: {
+        'points': 0, 'distance': 0.0, 'moving_seconds': 0.0, 'idle_seconds': 0.0, 'moving_segments': 0,
+        'idle_segments': 0, 'max_speed': 0.0, 'days_active': 0, 'first_timestamp': None, 'last_timestamp': None
+    } for machine_id in machine_ids}
+    for machine_id, _day, points, distance, moving_seconds, idle_seconds, moving_segments, idle_segments, \
+            max_speed, first_timestamp, last_timestamp in rows:
+        total = totals[machine_id]
+        total['points'] += points
+        total['distance'] += distance
+        total['moving_seconds'] += moving_seconds
+        total['idle_seconds'] += idle_seconds
+        total['moving_segments'] += moving_segments
+        total['idle_segments'] += idle_segments
+        total['max_speed'] = max(total['max_speed'], max_speed or 0.0)
+        if moving_seconds or idle_seconds:
+            total['days_active'] += 1
+        if first_timestamp and (total['first_timestamp'] is None or first_timestamp < total['first_timestamp']):
+            total['first_timestamp'] = first_timestamp
+        if last_timestamp and (total['last_timestamp'] is None or last_timestamp > total['last_timestamp']):
+            total['last_timestamp'] = last_timestamp
+    return {machine_id: summary_record(total) for machine_id, total in totals.items()}
+
+
+def summary_record(total):
+    """Resumen de una máquina con las unidades de la respuesta (km, km/h, segundos)."""
+    moving_seconds = total['moving_seconds']
+    return {
+        'points': total['points'],
+        'distance_km': round(total['distance'] / 1000, 3),
+        'moving_seconds': round(moving_seconds),
+        'idle_seconds': round(total['idle_seconds']),
+        'time_in_field_seconds': round(moving_seconds + total['idle_seconds']),
+        'moving_segments': total['moving_segments'],
+        'idle_segments': total['idle_segments'],
+        'max_speed_kmh': round(total['max_speed'], 1),
+        'avg_speed_kmh': round(total['distance'] * 3.6 / moving_seconds, 1) if moving_seconds else 0.0,
+        'days_active': total['days_active'],
+        'first_timestamp': total['first_timestamp'],
+        'last_timestamp': total['last_timestamp']
+    }
+
+
+def fleet_totals(summaries):
+    """Totales de la flota a partir de los resúmenes por máquina."""
+    summaries = list(summaries)
+    moving_seconds = sum(summary['moving_seconds'] for summary in summaries)
+    distance_km = sum(summary['distance_km'] for summary in summaries)
+    return {
+        'machines': len(summaries),
+        'machines_active': sum(1 for summary in summaries if summary['time_in_field_seconds']),
+        'distance_km': round(distance_km, 3),
+        'moving_seconds': moving_seconds,
+        'idle_seconds': sum(summary['idle_seconds'] for summary in summaries),
+        'time_in_field_seconds': sum(summary['time_in_field_seconds'] for summary in summaries),
+        'max_speed_kmh': max((summary['max_speed_kmh'] for summary in summaries), default=0.0),
+        'avg_speed_kmh': round(distance_km * 3600 / moving_seconds, 1) if moving_seconds else 0.0
+    }
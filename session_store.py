@@ -0,0 +1,274 @@
+"""Sesiones de Flask guardadas en el servidor.
+
+Con la sesión por defecto de Flask todo el diccionario (incluido el token
+OAuth) viaja en una cookie firmada que se decodifica y verifica (HMAC) en cada
+petición, también en cada una de las consultas paralelas del dashboard. Con
+SESSION_STORE='sqlite' la cookie solo lleva un identificador aleatorio y los
+datos se guardan en un fichero SQLite compartido por todos los workers, con un
+LRU en memoria delante (SESSION_CACHE_SIZE entradas, válidas durante
+SESSION_CACHE_TTL segundos antes de volver a leer SQLite).
+
+Los datos se serializan con el mismo TaggedJSONSerializer que usa Flask, así
+que los mensajes flash, tuplas, fechas, etc. se conservan igual que antes.
+SESSION_STORE='cookie' mantiene la sesión por cookie de Flask.
+"""
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SecureCookieSession, SessionInterface, session_json_serializer
+
+from config import SESSION_CACHE_SIZE, SESSION_CACHE_TTL, SESSION_DB_PATH, SESSION_STORE
+
+logger = logging.getLogger(__name__)
+
+# Cada cuántas escrituras se borran las sesiones expiradas
+PURGE_EVERY_WRITES = 500
+
+
+class SessionStore:
+    """Sesiones en SQLite (compartidas entre workers) con un LRU en memoria delante."""
+
+    def __init__(self, path=SESSION_DB_PATH, cache_size=SESSION_CACHE_SIZE, cache_ttl=SESSION_CACHE_TTL):
+        self.path = path
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._writes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    sid TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)')
+        # Las sesiones contienen tokens OAuth: solo legible por el usuario del proceso
+        try:
+            os.chmod(path, 0o600)
+        except OSError:
+            pass
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def new_sid():
+        return secrets.token_urlsafe(24)
+
+    def _remember(self, sid, payload, expires_at):
+        with self._lock:
+            self._cache[sid] = (payload, expires_at, time.monotonic())
+            self._cache.move_to_end(sid)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def load(self, sid):
+        """Devuelve los datos de la sesión o None si no existe o ha expirado."""
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(sid)
+            if cached is not None and time.monotonic() - cached[2] < self.cache_ttl:
+                self._cache.move_to_end(sid)
+                self.cache_hits += 1
+                payload, expires_at = cached[0], cached[1]
+            else:
+                self.cache_misses += 1
+                payload = None
+
+        if payload is None:
+            row = self._connect().execute(
+                'SELECT data, expires_at FROM sessions WHERE sid = ?', (sid,)
+            ).fetchone()
+            if row is None:
+                return None
+            payload, expires_at = row
+            self._remember(sid, payload, expires_at)
+
+        if expires_at < now:
+            self.delete(sid)
+            return None
+        return session_json_serializer.loads(payload)
+
+    def save(self, sid, data, lifetime):
+        payload = session_json_serializer.dumps(dict(data))
+        expires_at = time.time() + lifetime
+        self._connect().execute(
+            'INSERT OR REPLACE INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)',
+            (sid, payload, expires_at)
+        )
+        self._remember(sid, payload, expires_at)
+        self._writes += 1
+        if self._writes % PURGE_EVERY_WRITES == 0:
+            self.purge_expired()
+
+    def delete(self, sid):
+        with self._lock:
+            self._cache.pop(sid, None)
+        self._connect().execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def purge_expired(self):
+        self._connect().execute('DELETE FROM sessions WHERE expires_at < ?', (time.time(),))
+
+    def stats(self):
+        stored = self._connect().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+        with self._lock:
+            return {
+                'backend': 'sqlite',
+                'path': self.path,
+                'sessions': stored,
+                'cached': len(self._cache),
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses
+            }
+
+
+class ServerSideSession(SecureCookieSession):
+    """Sesión de Flask identificada por un sid; los datos viven en el servidor."""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        super().__init__(initial)
+        self.sid = sid
+        self.new = new
+        self.regenerated = False
+
+    def regenerate(self):
+        """Pide un sid nuevo al guardar (y borrar el anterior): evita la fijación de sesión."""
+        self.regenerated = True
+        self.modified = True
+
+    def clear(self):
+        super().clear()
+        self.regenerate()
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """SessionInterface que guarda las sesiones en un SessionStore."""
+
+    session_class = ServerSideSession
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.load(sid)
+            if data is not None:
+                return self.session_class(data, sid=sid)
+        # Un sid desconocido nunca se reutiliza: siempre se genera uno nuevo
+        return self.session_class(sid=self.store.new_sid(), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(
+                    name, domain=domain, path=path, secure=secure, samesite=samesite, httponly=httponly
+                )
+                response.vary.add('Cookie')
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        if session.regenerated and not session.new:
+            self.store.delete(session.sid)
+            session.sid = self.store.new_sid()
+
+        lifetime = int(app.permanent_session_lifetime.total_seconds())
+        self.store.save(session.sid, session, lifetime)
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly,
+            domain=domain,
+            path=path,
+            secure=secure,
+            samesite=samesite
+        )
+        response.vary.add('Cookie')
+
+    def read_cookie(self, value):
+        """Datos de la sesión a partir del valor de la cookie (para el modo ASGI)."""
+        return self.store.load(value) if value else None
+
+    def create(self, app, data):
+        """Crea una sesión con `data` y devuelve el valor de su cookie."""
+        sid = self.store.new_sid()
+        self.store.save(sid, data, int(app.permanent_session_lifetime.total_seconds()))
+        return sid
+
+
+def init_session_store(app):
+    """Activa las sesiones en servidor si SESSION_STORE='sqlite'."""
+    if SESSION_STORE == 'sqlite':
+        app.session_interface = ServerSideSessionInterface(SessionStore())
+        logger.info(f"Sesiones guardadas en el servidor ({SESSION_DB_PATH})")
+    elif SESSION_STORE != 'cookie':
+        raise ValueError(f"SESSION_STORE desconocido: {SESSION_STORE}")
+
+
+def read_session_cookie(app, value):
+    """Decodifica el valor de la cookie de sesión con el backend activo (o {} si no es válida)."""
+    interface = app.session_interface
+    if isinstance(interface, ServerSideSessionInterface):
+        return interface.read_cookie(value) or {}
+    if not value:
+        return {}
+    serializer = interface.get_signing_serializer(app)
+    try:
+        return serializer.loads(value, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except Exception:
+        return {}
+
+
+def regenerate_session(session):
+    """Cambia el sid de la sesión al cambiar la autenticación (sin efecto con sesiones por cookie)."""
+    regenerate = getattr(session, 'regenerate', None)
+    if regenerate is not None:
+        regenerate()
+
+
+def create_session_cookie(app, data):
+    """Guarda una sesión con `data` y devuelve el valor de la cookie (scripts y benchmarks)."""
+    interface = app.session_interface
+    if isinstance(interface, ServerSideSessionInterface):
+        return interface.create(app, data)
+    return interface.get_signing_serializer(app).dumps(dict(data))
+
+
+def session_stats(app):
+    interface = app.session_interface
+    if isinstance(interface, ServerSideSessionInterface):
+        return interface.store.stats()
+    return {'backend': 'cookie'}
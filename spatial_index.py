@@ -0,0 +1,436 @@
+"""Índice espacial en memoria de la última ubicación conocida de las máquinas.
+
+Responde a "qué máquinas hay en este rectángulo" (/api/machines/<org>/in-bbox)
+sin recorrer toda la flota. Es una rejilla de celdas de cell_size grados: cada
+celda guarda los IDs de las máquinas que caen en ella, así que una consulta
+solo mira las celdas que toca el rectángulo y comprueba coordenadas únicamente
+en las celdas del borde.
+
+ClusterIndex añade la agrupación de marcadores por zoom de
+/api/machines/<org>/clusters: una jerarquía de celdas de píxeles por nivel,
+precalculada y mantenida con los mismos cambios que la rejilla.
+
+Hay un índice por organización en el proceso (get_spatial_index). sync() lo
+pone al día con una FleetSnapshot: si las columnas de IDs y coordenadas no han
+cambiado no hace nada, y si han cambiado solo mueve de celda las máquinas que
+se han desplazado y quita o añade las que faltan o sobran.
+"""
+import math
+import threading
+from array import array
+
+from config import CLUSTER_CELL_PIXELS, CLUSTER_MAX_ZOOM, SPATIAL_INDEX_CELL_DEGREES
+
+# Latitud máxima de la proyección Web Mercator que usa Google Maps y su zoom máximo
+MAX_MERCATOR_LATITUDE = 85.05112878
+MAX_MAP_ZOOM = 22
+
+
+def parse_bbox(min_lat, min_lon, max_lat, max_lon):
+    """Valida un rectángulo en grados; lanza ValueError si no es válido.
+
+    Si min_lon > max_lon el rectángulo cruza el antimeridiano.
+    """
+    try:
+        bbox = tuple(float(value) for value in (min_lat, min_lon, max_lat, max_lon))
+    except (TypeError, ValueError):
+        raise ValueError("minLat, minLon, maxLat y maxLon deben ser números")
+    min_lat, min_lon, max_lat, max_lon = bbox
+    if not all(math.isfinite(value) for value in bbox):
+        raise ValueError("minLat, minLon, maxLat y maxLon deben ser números")
+    if not (-90 <= min_lat <= max_lat <= 90):
+        raise ValueError("Se requiere -90 <= minLat <= maxLat <= 90")
+    if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+        raise ValueError("minLon y maxLon deben estar entre -180 y 180")
+    return bbox
+
+
+class GridIndex:
+    """Rejilla de celdas de cell_size grados con las posiciones de las máquinas."""
+
+    def __init__(self, cell_size=SPATIAL_INDEX_CELL_DEGREES):
+        self.cell_size = cell_size
+        self._lock = threading.Lock()
+        self._cells = {}  # (fila, columna) -> {id: (lat, lon)}
+        self._points = {}  # id -> celda
+        # Columnas de la última instantánea sincronizada
+        self._synced_ids = None
+        self._synced_latitudes = None
+        self._synced_longitudes = None
+        self._synced_coordinates = None
+        self.moves = 0
+
+    def _cell(self, latitude, longitude):
+        return math.floor(latitude / self.cell_size), math.floor(longitude / self.cell_size)
+
+    def __len__(self):
+        return len(self._points)
+
+    def _update(self, machine_id, latitude, longitude):
+        old_cell = self._points.get(machine_id)
+        if old_cell is not None:
+            self._remove(machine_id, old_cell)
+        if latitude is None or longitude is None or math.isnan(latitude) or math.isnan(longitude):
+            return
+        cell = self._cell(latitude, longitude)
+        self._cells.setdefault(cell, {})[machine_id] = (latitude, longitude)
+        self._points[machine_id] = cell
+        self._added(machine_id, latitude, longitude)
+
+    def _remove(self, machine_id, cell):
+        del self._points[machine_id]
+        members = self._cells[cell]
+        latitude, longitude = members.pop(machine_id)
+        if not members:
+            del self._cells[cell]
+        self._removed(machine_id, latitude, longitude)
+
+    def _added(self, machine_id, latitude, longitude):
+        """Se llama al añadir una máquina al índice (con el lock tomado)."""
+
+    def _removed(self, machine_id, latitude, longitude):
+        """Se llama al quitar una máquina del índice (con el lock tomado)."""
+
+    def update(self, machine_id, latitude, longitude):
+        """Añade o mueve una máquina; con coordenadas None o NaN la quita del índice."""
+        with self._lock:
+            self._update(str(machine_id), latitude, longitude)
+            self._synced_ids = None
+
+    def remove(self, machine_id):
+        with self._lock:
+            cell = self._points.get(str(machine_id))
+            if cell is not None:
+                self._remove(str(machine_id), cell)
+            self._synced_ids = None
+
+    def sync(self, snapshot):
+        """Pone el índice al día con una FleetSnapshot; devuelve cuántas máquinas cambiaron."""
+        coordinates = snapshot.latitudes.tobytes() + snapshot.longitudes.tobytes()
+        with self._lock:
+            if self._synced_ids == snapshot.ids:
+                if self._synced_coordinates == coordinates:
+                    return 0
+                # Mismas máquinas en el mismo orden: mover solo las que cambiaron de coordenadas
+                changed = self._sync_moved(snapshot)
+            else:
+                changed = self._sync_all(snapshot)
+            self._synced_ids = list(snapshot.ids)
+            self._synced_latitudes = array('d', snapshot.latitudes)
+            self._synced_longitudes = array('d', snapshot.longitudes)
+            self._synced_coordinates = coordinates
+            self.moves += changed
+            return changed
+
+    def _sync_moved(self, snapshot):
+        changed = 0
+        latitudes = snapshot.latitudes
+        longitudes = snapshot.longitudes
+        candidates = {
+            index for index, (old, new) in enumerate(zip(self._synced_latitudes, latitudes)) if old != new
+        }
+        candidates.update(
+            index for index, (old, new) in enumerate(zip(self._synced_longitudes, longitudes)) if old != new
+        )
+        for index in candidates:
+            latitude = latitudes[index]
+            # NaN != NaN: una máquina que sigue sin ubicación no ha cambiado
+            if math.isnan(latitude) and math.isnan(self._synced_latitudes[index]):
+                continue
+            self._update(str(snapshot.ids[index]), latitude, longitudes[index])
+            changed += 1
+        return changed
+
+    def _sync_all(self, snapshot):
+        changed = 0
+        current = set()
+        for index, machine_id in enumerate(snapshot.ids):
+            machine_id = str(machine_id)
+            current.add(machine_id)
+            latitude = snapshot.latitudes[index]
+            longitude = snapshot.longitudes[index]
+            cell = self._points.get(machine_id)
+            if cell is not None and self._cells[cell][machine_id] == (latitude, longitude):
+                continue
+            if cell is None and math.isnan(latitude):
+                continue
+            self._update(machine_id, latitude, longitude)
+            changed += 1
+        for machine_id in [machine_id for machine_id in self._points if machine_id not in current]:
+            self._remove(machine_id, self._points[machine_id])
+            changed += 1
+        return changed
+
+    def _query_range(self, min_lat, min_lon, max_lat, max_lon, result):
+        first_row, first_column = self._cell(min_lat, min_lon)
+        last_row, last_column = self._cell(max_lat, max_lon)
+        cell_count = (last_row - first_row + 1) * (last_column - first_column + 1)
+        if cell_count <= len(self._cells):
+            cells = (
+                (cell, self._cells.get(cell))
+                for cell in ((row, column)
+                             for row in range(first_row, last_row + 1)
+                             for column in range(first_column, last_column + 1))
+            )
+        else:
+            # Rectángulo grande y flota dispersa: recorrer solo las celdas ocupadas
+            cells = (
+                (cell, members) for cell, members in self._cells.items()
+                if first_row <= cell[0] <= last_row and first_column <= cell[1] <= last_column
+            )
+        for (row, column), members in cells:
+            if not members:
+                continue
+            if first_row < row < last_row and first_column < column < last_column:
+                # Celda interior: todas sus máquinas están dentro
+                result.extend(members)
+                continue
+            for machine_id, (latitude, longitude) in members.items():
+                if min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon:
+                    result.append(machine_id)
+
+    def query(self, min_lat, min_lon, max_lat, max_lon):
+        """IDs de las máquinas dentro del rectángulo (bordes incluidos)."""
+        result = []
+        with self._lock:
+            if min_lon > max_lon:
+                self._query_range(min_lat, min_lon, max_lat, 180.0, result)
+                self._query_range(min_lat, -180.0, max_lat, max_lon, result)
+            else:
+                self._query_range(min_lat, min_lon, max_lat, max_lon, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {'machines': len(self._points), 'cells': len(self._cells), 'moves': self.moves}
+
+
+def _project(latitude, longitude, size):
+    """Celda (x, y) de Web Mercator, como las teselas de Google Maps, en una rejilla de size x size."""
+    latitude = min(max(latitude, -MAX_MERCATOR_LATITUDE), MAX_MERCATOR_LATITUDE)
+    sin_latitude = math.sin(math.radians(latitude))
+    x = (longitude + 180.0) / 360.0
+    y = 0.5 - math.log((1 + sin_latitude) / (1 - sin_latitude)) / (4 * math.pi)
+    return min(max(int(x * size), 0), size - 1), min(max(int(y * size), 0), size - 1)
+
+
+def _parent(key):
+    """Clave (x << 32 | y) de la celda del nivel anterior que contiene a key."""
+    return (key >> 33) << 32 | (key & 0xFFFFFFFF) >> 1
+
+
+class ClusterIndex(GridIndex):
+    """GridIndex que además agrupa las máquinas en clusters por nivel de zoom.
+
+    A zoom z el mundo mide 256·2^z píxeles y se divide en celdas de
+    cell_pixels; las máquinas de una celda forman un cluster. Una celda es la
+    unión de sus cuatro hijas del nivel z+1, así que la jerarquía se mantiene
+    con la misma actualización incremental que la rejilla: añadir o quitar una
+    máquina toca una celda por nivel. Por encima de max_zoom no se agrupa.
+
+    Cada nivel es un dict {x << 32 | y: valor}; el valor es el ID de la máquina
+    si la celda tiene una sola (en los niveles de más zoom son casi todas) o
+    (máquinas, suma de latitudes, suma de longitudes) si tiene varias.
+    """
+
+    def __init__(self, cell_size=SPATIAL_INDEX_CELL_DEGREES, max_zoom=CLUSTER_MAX_ZOOM,
+                 cell_pixels=CLUSTER_CELL_PIXELS):
+        super().__init__(cell_size)
+        self.max_zoom = max_zoom
+        # Celdas por lado en el nivel max_zoom (cell_pixels debe ser potencia de 2)
+        self._leaf_size = max(1, (256 << max_zoom) // cell_pixels)
+        self._levels = [{} for _ in range(max_zoom + 1)]
+        self._leaf_members = {}  # celda del nivel max_zoom con varias máquinas -> {ids}
+        self._rebuilding = False
+
+    def _as_cluster(self, value):
+        """(máquinas, suma lat, suma lon) del valor de una celda."""
+        if isinstance(value, str):
+            latitude, longitude = self._cells[self._points[value]][value]
+            return 1, latitude, longitude
+        return value
+
+    def _leaf_key(self, latitude, longitude):
+        x, y = _project(latitude, longitude, self._leaf_size)
+        return x << 32 | y
+
+    def _added(self, machine_id, latitude, longitude):
+        if self._rebuilding:
+            return
+        key = self._leaf_key(latitude, longitude)
+        for level in reversed(self._levels):
+            value = level.get(key)
+            if value is None:
+                level[key] = machine_id
+            else:
+                if level is self._levels[-1]:
+                    self._leaf_members.setdefault(key, {value} if isinstance(value, str) else set()).add(machine_id)
+                count, latitude_sum, longitude_sum = self._as_cluster(value)
+                level[key] = (count + 1, latitude_sum + latitude, longitude_sum + longitude)
+            key = _parent(key)
+
+    def _removed(self, machine_id, latitude, longitude):
+        if self._rebuilding:
+            return
+        key = self._leaf_key(latitude, longitude)
+        for zoom in range(self.max_zoom, -1, -1):
+            level = self._levels[zoom]
+            value = level[key]
+            if isinstance(value, str):
+                del level[key]
+            elif value[0] > 2:
+                level[key] = (value[0] - 1, value[1] - latitude, value[2] - longitude)
+                if zoom == self.max_zoom:
+                    self._leaf_members[key].discard(machine_id)
+            elif zoom == self.max_zoom:
+                members = self._leaf_members.pop(key)
+                members.discard(machine_id)
+                level[key] = members.pop()
+            else:
+                # Queda una sola máquina: la de la única celda hija ocupada, ya actualizada
+                level[key] = self._children(zoom, key)[0][1]
+            key = _parent(key)
+
+    def _children(self, zoom, key):
+        """[(clave, valor)] de las celdas ocupadas del nivel zoom + 1 dentro de la celda key."""
+        x, y = key >> 32, key & 0xFFFFFFFF
+        level = self._levels[zoom + 1]
+        children = []
+        for child_x in (2 * x, 2 * x + 1):
+            for child_y in (2 * y, 2 * y + 1):
+                child = child_x << 32 | child_y
+                value = level.get(child)
+                if value is not None:
+                    children.append((child, value))
+        return children
+
+    def _expansion_zoom(self, zoom, key):
+        """Primer zoom en el que el cluster se divide (max_zoom + 1 si solo se separa sin agrupar)."""
+        for level_zoom in range(zoom, self.max_zoom):
+            children = self._children(level_zoom, key)
+            if len(children) > 1:
+                return level_zoom + 1
+            key = children[0][0]
+        return self.max_zoom + 1
+
+    def _sync_all(self, snapshot):
+        # Con muchos cambios a la vez es más rápido recalcular la jerarquía entera
+        self._rebuilding = True
+        try:
+            changed = super()._sync_all(snapshot)
+        finally:
+            self._rebuilding = False
+        self._rebuild_levels()
+        return changed
+
+    def _rebuild_levels(self):
+        leaf = {}
+        leaf_members = {}
+        for members in self._cells.values():
+            for machine_id, (latitude, longitude) in members.items():
+                key = self._leaf_key(latitude, longitude)
+                value = leaf.get(key)
+                if value is None:
+                    leaf[key] = machine_id
+                    continue
+                leaf_members.setdefault(key, {value} if isinstance(value, str) else set()).add(machine_id)
+                count, latitude_sum, longitude_sum = self._as_cluster(value)
+                leaf[key] = (count + 1, latitude_sum + latitude, longitude_sum + longitude)
+        levels = [leaf]
+        for _ in range(self.max_zoom):
+            parent = {}
+            for key, value in levels[-1].items():
+                key = (key >> 33) << 32 | (key & 0xFFFFFFFF) >> 1  # _parent(key)
+                current = parent.get(key)
+                if current is None:
+                    parent[key] = value
+                    continue
+                current = self._as_cluster(current)
+                value = self._as_cluster(value)
+                parent[key] = (current[0] + value[0], current[1] + value[1], current[2] + value[2])
+            levels.append(parent)
+        levels.reverse()
+        self._levels = levels
+        self._leaf_members = leaf_members
+
+    def clusters(self, zoom, min_lat, min_lon, max_lat, max_lon):
+        """(clusters, IDs sueltos) de las celdas que toca el rectángulo a ese zoom.
+
+        Cada cluster es un dict con id ('z/x/y'), count, latitude y longitude (el
+        centro de sus máquinas) y expansionZoom. Por encima de max_zoom todas las
+        máquinas del rectángulo van sueltas.
+        """
+        if zoom > self.max_zoom:
+            return [], self.query(min_lat, min_lon, max_lat, max_lon)
+        size = self._leaf_size >> (self.max_zoom - zoom)
+        first_x, last_y = _project(min_lat, min_lon, size)
+        last_x, first_y = _project(max_lat, max_lon, size)
+        if min_lon > max_lon:
+            ranges = [(first_x, size - 1), (0, last_x)]
+        else:
+            ranges = [(first_x, last_x)]
+        clusters = []
+        singles = []
+        with self._lock:
+            level = self._levels[zoom]
+            for range_first_x, range_last_x in ranges:
+                cell_count = (range_last_x - range_first_x + 1) * (last_y - first_y + 1)
+                if cell_count <= len(level):
+                    cells = (
+                        (key, level.get(key))
+                        for key in (x << 32 | y for x in range(range_first_x, range_last_x + 1)
+                                    for y in range(first_y, last_y + 1))
+                    )
+                else:
+                    cells = (
+                        (key, value) for key, value in level.items()
+                        if range_first_x <= key >> 32 <= range_last_x and first_y <= key & 0xFFFFFFFF <= last_y
+                    )
+                for key, value in cells:
+                    if value is None:
+                        continue
+                    if isinstance(value, str):
+                        singles.append(value)
+                        continue
+                    count, latitude_sum, longitude_sum = value
+                    clusters.append({
+                        'id': f"{zoom}/{key >> 32}/{key & 0xFFFFFFFF}",
+                        'count': count,
+                        'latitude': round(latitude_sum / count, 6),
+                        'longitude': round(longitude_sum / count, 6),
+                        'expansionZoom': self._expansion_zoom(zoom, key)
+                    })
+        return clusters, singles
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats['cluster_cells'] = sum(len(level) for level in self._levels)
+        return stats
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_spatial_index(organization_id):
+    """Devuelve el índice espacial del proceso para una organización."""
+    organization_id = str(organization_id)
+    index = _indexes.get(organization_id)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.setdefault(organization_id, ClusterIndex())
+    return index
+
+
+def spatial_index_stats():
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    stats = [index.stats() for index in indexes]
+    return {
+        'organizations': len(stats),
+        'machines': sum(item['machines'] for item in stats),
+        'cells': sum(item['cells'] for item in stats),
+        'cluster_cells': sum(item.get('cluster_cells', 0) for item in stats),
+        'moves': sum(item['moves'] for item in stats)
+    }
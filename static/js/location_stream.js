@@ -0,0 +1,60 @@
+// Historial de ubicación en streaming: compartido por el dashboard (main.js) y location_history.html
+
+// Lee una respuesta NDJSON y llama a onRecord por cada línea en cuanto llega
+function streamNdjson(url, onRecord) {
+    return fetch(url, {
+        credentials: 'same-origin',
+        headers: { 'Accept': 'application/x-ndjson' }
+    }).then(response => {
+        if (!response.ok) {
+            throw new Error('Error en la respuesta del servidor');
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        function read() {
+            return reader.read().then(({ done, value }) => {
+                buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+                const lines = buffer.split('\n');
+                buffer = done ? '' : lines.pop();
+                lines.filter(line => line.trim()).forEach(line => onRecord(JSON.parse(line)));
+                return done ? undefined : read();
+            });
+        }
+        return read();
+    });
+}
+
+// Añade a la tabla del historial la fila de un registro de ubicación
+function appendLocationRow(tbody, location) {
+    const row = document.createElement('tr');
+
+    // Formatear la fecha o mostrar mensaje de 'No disponible'
+    let formattedDate = 'No disponible';
+    if (location.timestamp) {
+        try {
+            formattedDate = new Date(location.timestamp).toLocaleString();
+        } catch (e) {
+            console.error("Error al formatear fecha:", e);
+        }
+    }
+
+    // Formatear coordenadas o mostrar mensaje de 'No disponible'
+    const latitude = location.latitude !== null ? location.latitude : 'No disponible';
+    const longitude = location.longitude !== null ? location.longitude : 'No disponible';
+
+    // Si no hay coordenadas, aplicar estilo visual diferente
+    const hasLocation = location.latitude !== null && location.longitude !== null;
+    const rowClass = hasLocation ? '' : 'table-secondary';
+
+    row.className = rowClass;
+    row.innerHTML = `
+        <td>${location.vin || 'No disponible'}</td>
+        <td>${location.name || 'Sin nombre'}</td>
+        <td>${formattedDate}</td>
+        <td>${latitude}</td>
+        <td>${longitude}</td>
+    `;
+    tbody.appendChild(row);
+}
@@ -497,18 +497,38 @@ function selectMachine(machineId) {
             }
         }
 
+        // Detalles, horómetro y alertas llegan en una sola petición
+        const overview = fetchMachineOverview(machineId);
+
         // Load machine details
-        loadMachineDetails(machineId);
+        loadMachineDetails(machineId, overview);
 
         // Load machine alerts
-        loadMachineAlerts(machineId);
+        loadMachineAlerts(machineId, overview);
     } catch (error) {
         console.error(`Error al seleccionar máquina ${machineId}:`, error);
     }
 }
 
+// Detalles, ubicación, horómetro y alertas de una máquina (/api/machine/<id>/overview)
+function fetchMachineOverview(machineId) {
+    return fetch(`/api/machine/${machineId}/overview`, {
+        credentials: 'same-origin',
+        headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        }
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error('Error al cargar detalles de la máquina');
+        }
+        return response.json();
+    });
+}
+
 // Load details for the selected machine
-function loadMachineDetails(machineId) {
+function loadMachineDetails(machineId, overview) {
     console.log(`Cargando detalles para máquina: ${machineId}`);
 
     const machineDetailEmpty = document.getElementById('machineDetailEmpty');
@@ -525,46 +545,11 @@ function loadMachineDetails(machineId) {
     machineDetailContent.classList.add('d-none');
 
     // Variables para almacenar datos
-    let machineData = null;
     let engineHoursData = null;
 
-    // Cargar datos de la máquina y del horómetro en paralelo
-    const machineDetailsPromise = fetch(`/api/machine/${machineId}`, {
-        credentials: 'same-origin',
-        headers: {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
-    })
-    .then(response => {
-        if (!response.ok) {
-            throw new Error('Error al cargar detalles de la máquina');
-        }
-        return response.json();
-    });
-
-    const engineHoursPromise = fetch(`/api/machine/${machineId}/engine-hours`, {
-        credentials: 'same-origin',
-        headers: {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
-    })
-    .then(response => {
-        if (!response.ok) {
-            console.warn('No se pudieron cargar datos del horómetro:', response.status);
-            return null;
-        }
-        return response.json();
-    })
-    .catch(error => {
-        console.warn('Error al cargar datos del horómetro:', error);
-        return null;
-    });
-
-    // Esperar a que ambas promesas se resuelvan
-    Promise.all([machineDetailsPromise, engineHoursPromise])
-        .then(([machine, hoursData]) => {
+    // Los datos de la máquina y del horómetro llegan en la misma respuesta
+    (overview || fetchMachineOverview(machineId))
+        .then(({ machine, engineHours: hoursData }) => {
             console.log("Detalles de máquina recibidos:", machine);
 
             if (hoursData) {
@@ -627,6 +612,9 @@ function loadMachineDetails(machineId) {
         });
 }
 
+// Número máximo de máquinas por petición a /api/alerts/batch
+const ALERT_BATCH_SIZE = 200;
+
 // Función para cargar las alertas de todas las máquinas de una organización
 function loadAllMachineAlerts(machines) {
     console.log(`Cargando alertas para ${machines.length} máquinas...`);
@@ -634,37 +622,44 @@ function loadAllMachineAlerts(machines) {
     // Inicializar el objeto de alertas
     window.machineAlerts = {};
 
-    // Crear un arreglo de promesas, una por cada máquina
-    const promises = machines.map(machine => {
-        if (!machine.id) return Promise.resolve(); // Omitir máquinas sin ID
+    const machineIds = machines.map(machine => machine.id).filter(id => id); // Omitir máquinas sin ID
+
+    // Una petición por lote en lugar de una por máquina; el servidor consulta en paralelo
+    const batches = [];
+    for (let i = 0; i < machineIds.length; i += ALERT_BATCH_SIZE) {
+        batches.push(machineIds.slice(i, i + ALERT_BATCH_SIZE));
+    }
 
-        return fetch(`/api/machine/${machine.id}/alerts`, {
+    const promises = batches.map(batch => {
+        return fetch('/api/alerts/batch', {
+            method: 'POST',
             credentials: 'same-origin',
             headers: {
                 'Content-Type': 'application/json',
                 'Accept': 'application/json'
-            }
+            },
+            body: JSON.stringify({ machine_ids: batch })
         })
         .then(response => {
             if (!response.ok) {
-                console.warn(`Error al cargar alertas para máquina ${machine.id}`);
-                return []; // Devolver arreglo vacío en caso de error
+                console.warn(`Error al cargar alertas para un lote de ${batch.length} máquinas`);
+                return {}; // Devolver objeto vacío en caso de error
             }
             return response.json();
         })
-        .then(alerts => {
-            // Guardar las alertas en el objeto global
-            window.machineAlerts[machine.id] = alerts;
-            return alerts;
-        })
         .catch(error => {
-            console.warn(`Error al procesar alertas para máquina ${machine.id}:`, error);
-            window.machineAlerts[machine.id] = []; // Inicializar como arreglo vacío en caso de error
-            return []; // Continuar con el proceso
+            console.warn(`Error al procesar alertas para un lote de ${batch.length} máquinas:`, error);
+            return {}; // Continuar con el proceso
+        })
+        .then(alertsByMachine => {
+            // Guardar las alertas en el objeto global (arreglo vacío si faltan)
+            batch.forEach(machineId => {
+                window.machineAlerts[machineId] = alertsByMachine[machineId] || [];
+            });
         });
     });
 
-    // Esperar a que todas las promesas se resuelvan
+    // Esperar a que todos los lotes se resuelvan
     return Promise.all(promises)
         .then(() => {
             console.log(`Alertas cargadas para ${Object.keys(window.machineAlerts).length} máquinas`);
@@ -673,7 +668,7 @@ function loadAllMachineAlerts(machines) {
 }
 
 // Load alerts for the selected machine
-function loadMachineAlerts(machineId) {
+function loadMachineAlerts(machineId, overview) {
     console.log(`Cargando alertas para máquina: ${machineId}`);
 
     const alertListContainer = document.getElementById('alertListContainer');
@@ -697,21 +692,9 @@ function loadMachineAlerts(machineId) {
     emptyAlertContainer.classList.remove('d-none');
     alertListContainer.classList.add('d-none');
 
-    // Fetch machine alerts from API
-    // Usamos alertas reales en vez de simuladas
-    fetch(`/api/machine/${machineId}/alerts`, {
-        credentials: 'same-origin', // Incluir cookies en la petición
-        headers: {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
-    })
-        .then(response => {
-            if (!response.ok) {
-                throw new Error('Error al cargar alertas');
-            }
-            return response.json();
-        })
+    // Las alertas llegan con los detalles en /api/machine/<id>/overview
+    (overview || fetchMachineOverview(machineId))
+        .then(data => data.alerts || [])
         .then(alerts => {
             // Actualizar el gráfico con las alertas
             updateAlertsSummaryChart(alerts);
@@ -752,6 +735,67 @@ function loadMachineAlerts(machineId) {
         });
 }
 
+// Definiciones de alertas ya pedidas (URI -> promesa), compartidas por la lista y los detalles
+const alertDefinitionCache = new Map();
+
+// URI del enlace de definición de una alerta, o null
+function alertDefinitionUri(alert) {
+    if (!alert || !Array.isArray(alert.links)) {
+        return null;
+    }
+    const link = alert.links.find(link => (link.rel === 'definition' || link.rel === 'alertDefinition') && link.uri);
+    return link ? link.uri : null;
+}
+
+// Pide en una sola llamada las definiciones de todas las alertas de la lista
+function prefetchAlertDefinitions(alerts) {
+    const uris = [...new Set(alerts.map(alertDefinitionUri))]
+        .filter(uri => uri && !alertDefinitionCache.has(uri));
+    if (uris.length === 0) {
+        return;
+    }
+
+    const request = fetch('/api/alert/definitions', {
+        credentials: 'same-origin',
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ uris })
+    })
+    .then(response => response.ok ? response.json() : {})
+    .catch(error => {
+        console.error("Error al obtener definiciones de alertas en lote:", error);
+        return {};
+    });
+
+    uris.forEach(uri => {
+        alertDefinitionCache.set(uri, request.then(definitions => {
+            if (definitions[uri]) {
+                return definitions[uri];
+            }
+            // Sin respuesta en el lote: se volverá a pedir individualmente
+            alertDefinitionCache.delete(uri);
+            return getAlertDefinition(uri);
+        }));
+    });
+}
+
+// Definición de una alerta (de la caché del lote o de /api/alert/definition)
+function getAlertDefinition(definitionUri) {
+    if (!alertDefinitionCache.has(definitionUri)) {
+        const request = fetch(`/api/alert/definition?uri=${encodeURIComponent(definitionUri)}`, {
+            credentials: 'same-origin',
+            method: 'GET'
+        })
+        .then(response => response.json())
+        .catch(error => {
+            alertDefinitionCache.delete(definitionUri);
+            throw error;
+        });
+        alertDefinitionCache.set(definitionUri, request);
+    }
+    return alertDefinitionCache.get(definitionUri);
+}
+
 /* 
  * Nueva implementación directa para mostrar detalles de alertas
  * Esta función se llama directamente desde el HTML y no depende de eventos dinámicos
@@ -838,13 +882,9 @@ function toggleAlertDetails(button, definitionUri) {
     detailsContainer.innerHTML = detailsHtml;
 
     // Intentar obtener la información real de la API (para registro)
-    console.log(`Enviando solicitud a API: /api/alert/definition?uri=${encodeURIComponent(definitionUri)}`);
+    console.log(`Obteniendo definición de alerta: ${definitionUri}`);
 
-    fetch(`/api/alert/definition?uri=${encodeURIComponent(definitionUri)}`, {
-        credentials: 'same-origin',
-        method: 'GET'
-    })
-    .then(response => response.json())
+    getAlertDefinition(definitionUri)
     .then(data => {
         console.log("Respuesta de la API recibida:", data);
         // No hacemos nada con la respuesta ya que ya mostramos contenido al usuario
@@ -900,12 +940,8 @@ function showAlertDetailsInline(button, definitionUri, alertId) {
         </div>
     `;
 
-    // Intentar obtener datos reales de la API
-    fetch(`/api/alert/definition?uri=${encodeURIComponent(definitionUri)}`, {
-        credentials: 'same-origin',
-        method: 'GET'
-    })
-    .then(response => response.json())
+    // Definición del catálogo local (normalmente ya resuelta en el lote de la lista)
+    getAlertDefinition(definitionUri)
     .then(data => {
         console.log("Respuesta de la API recibida:", data);
 
@@ -1027,6 +1063,9 @@ function renderAlertList(alerts) {
 
     alertListContainer.innerHTML = '';
 
+    // Resolver todas las definiciones de la lista en una sola petición
+    prefetchAlertDefinitions(alerts);
+
     alerts.forEach(alert => {
         try {
             const alertItem = document.createElement('div');
@@ -1087,17 +1126,7 @@ function renderAlertList(alerts) {
 
             // Create the HTML content for the alert
             // Verificar si tiene links y extraer una posible definición
-            let definitionLink = null;
-            if (alert.links && Array.isArray(alert.links)) {
-                console.log("Procesando enlaces para alerta:", alert.id, alert.links);
-                for (const link of alert.links) {
-                    if ((link.rel === 'definition' || link.rel === 'alertDefinition') && link.uri) {
-                        console.log("Encontrado enlace de definición:", link.uri);
-                        definitionLink = link.uri;
-                        break;
-                    }
-                }
-            }
+            const definitionLink = alertDefinitionUri(alert);
 
             // Añadir más detalles de depuración para el usuario
             console.log("Contenido completo de la alerta:", alert);
@@ -1175,6 +1204,9 @@ function renderAlertList(alerts) {
                 <!-- Información técnica adicional, si está disponible -->
                 ${additionalDetailsHtml}
 
+                <!-- Definición del código (catálogo de DTC), se rellena al resolverse -->
+                <div class="alert-definition small text-info d-none"></div>
+
                 <div class="d-flex justify-content-between align-items-center mt-2">
                     <small class="text-muted">${timestamp}</small>
                     <small class="text-muted">Tipo: ${alert.type || 'Desconocido'}</small>
@@ -1189,6 +1221,20 @@ function renderAlertList(alerts) {
                 `;
 
             alertListContainer.appendChild(alertItem);
+
+            if (definitionLink) {
+                getAlertDefinition(definitionLink)
+                    .then(definition => {
+                        const definitionElement = alertItem.querySelector('.alert-definition');
+                        if (!definition || !definition.success || definition.source === 'placeholder' || !definitionElement) {
+                            return;
+                        }
+                        const code = definition.additionalInfo ? `${definition.additionalInfo}: ` : '';
+                        definitionElement.textContent = `${code}${definition.title}`;
+                        definitionElement.classList.remove('d-none');
+                    })
+                    .catch(error => console.warn("No se pudo obtener la definición de la alerta:", error));
+            }
         } catch (error) {
             console.error("Error al renderizar alerta:", error);
         }
@@ -1775,6 +1821,29 @@ function exportToExcel() {
     document.body.removeChild(link);
 }
 
+// Carga el historial en streaming (streamNdjson y appendLocationRow: location_stream.js):
+// cada registro se añade a la tabla y al mapa al llegar
+function streamLocationHistory(url) {
+    const tbody = document.getElementById('locationHistoryTableBody');
+    allLocationData = [];
+    if (tbody) {
+        tbody.innerHTML = '';
+    }
+    if (window.startProgressiveMarkers) {
+        window.startProgressiveMarkers();
+    }
+
+    return streamNdjson(url, location => {
+        allLocationData.push(location);
+        if (tbody) {
+            appendLocationRow(tbody, location);
+        }
+        if (window.addLocationRecordToMap) {
+            window.addLocationRecordToMap(location);
+        }
+    }).then(() => allLocationData);
+}
+
 function filterLocationsByDate() {
     if (!selectedOrganizationId) {
         console.log('No hay organización seleccionada');
@@ -1784,19 +1853,8 @@ function filterLocationsByDate() {
     const startDate = document.getElementById('startDate').value;
     const endDate = document.getElementById('endDate').value;
 
-    fetch(`/api/location-history/${selectedOrganizationId}?start_date=${startDate}&end_date=${endDate}`, {
-        credentials: 'same-origin',
-        headers: {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
-    })
-    .then(response => response.json())
-    .then(data => {
-        allLocationData = data;
-        renderLocationData(data);
-    })
-    .catch(error => console.error('Error:', error));
+    streamLocationHistory(`/api/location-history/${selectedOrganizationId}?stream=1&start_date=${startDate}&end_date=${endDate}`)
+        .catch(error => console.error('Error:', error));
 }
 
 // Estos son links a las implementaciones reales en map.js
@@ -1809,30 +1867,25 @@ const MAX_RESULTS = 100;
 function loadLocationHistory(organizationId) {
     selectedOrganizationId = organizationId; // Guardar el ID de la organización seleccionada
     const tbody = document.getElementById('locationHistoryTableBody');
-    tbody.innerHTML = '<tr><td colspan="5" class="text-center"><div class="spinner-border" role="status"><span class="visually-hidden">Cargando...</span></div></td></tr>';
+    if (tbody) {
+        tbody.innerHTML = '<tr><td colspan="5" class="text-center"><div class="spinner-border" role="status"><span class="visually-hidden">Cargando...</span></div></td></tr>';
+    }
 
-    fetch(`/api/location-history/${organizationId}`)
-        .then(response => {
-            if (!response.ok) {
-                throw new Error('Error en la respuesta del servidor');
-            }
-            return response.json();
-        })
-        .then(data => {
-            allLocationData = data; // Guardar datos completos
-            renderLocationData(data); // Renderizar datos iniciales
+    // Actualizar el título del dropdown con la organización seleccionada
+    const dropdownButton = document.getElementById('organizationDropdown');
+    if (dropdownButton) {
+        const selectedOrg = document.querySelector(`.organization-item[data-org-id="${organizationId}"]`);
+        if (selectedOrg) {
+            dropdownButton.innerHTML = `<i class="fas fa-building me-2"></i> ${selectedOrg.textContent}`;
+        }
+    }
 
-            // Actualizar el título del dropdown con la organización seleccionada
-            const dropdownButton = document.getElementById('organizationDropdown');
-            if (dropdownButton) {
-                const selectedOrg = document.querySelector(`.organization-item[data-org-id="${organizationId}"]`);
-                if (selectedOrg) {
-                    dropdownButton.innerHTML = `<i class="fas fa-building me-2"></i> ${selectedOrg.textContent}`;
-                }
-            }
-        })
+    streamLocationHistory(`/api/location-history/${organizationId}?stream=1`)
+        .then(data => console.log(`Recibidos ${data.length} registros de ubicación`))
         .catch(error => {
             console.error('Error:', error);
-            tbody.innerHTML = `<tr><td colspan="5" class="text-center text-danger">Error al cargar datos: ${error.message}</td></tr>`;
+            if (tbody) {
+                tbody.innerHTML = `<tr><td colspan="5" class="text-center text-danger">Error al cargar datos: ${error.message}</td></tr>`;
+            }
         });
-}
\ No newline at end of file
+}
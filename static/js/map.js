@@ -272,6 +272,9 @@ function initMapImpl() {
         // Actualizar la referencia global al mapa
         window.map = map;
         
+        // Pedir las máquinas visibles cada vez que el mapa deja de moverse
+        map.addListener('idle', scheduleViewportLoad);
+        
         console.log("Mapa de Google Maps inicializado correctamente");
         
         // Disparar un evento personalizado para notificar que el mapa está listo
@@ -301,47 +304,22 @@ function addMachinesToMap(machines) {
         // Clear existing markers
         clearMapMarkers();
         
-        // Bounds to fit all markers
+        // Ajustar la vista a todas las máquinas con ubicación; los marcadores los
+        // pide después loadMachinesInView, solo para el rectángulo visible
         const bounds = new google.maps.LatLngBounds();
         let validLocations = 0;
-        
-        // Para grandes cantidades de máquinas, mostrar solo las primeras 50 con localización
-        // para evitar sobrecargar el mapa y mejorar rendimiento
-        const MAX_MARKERS = 50;
-        let markersAdded = 0;
-        let hasLimitedMarkers = false;
-        
-        // Primero, añadir máquina seleccionada si existe
-        if (selectedMachineId) {
-            const selectedMachine = machines.find(m => m.id === selectedMachineId);
-            if (selectedMachine && selectedMachine.location && 
-                selectedMachine.location.latitude && selectedMachine.location.longitude) {
-                addSingleMachineToMap(selectedMachine, bounds);
-                validLocations++;
-                markersAdded++;
-            }
-        }
-        
-        // Luego añadir el resto hasta el límite
         for (const machine of machines) {
-            // Si ya tenemos la máquina seleccionada, saltarla
-            if (selectedMachineId && machine.id === selectedMachineId) {
-                continue;
-            }
-            
             if (machine.location && machine.location.latitude && machine.location.longitude) {
-                // Si alcanzamos el límite, detenernos
-                if (markersAdded >= MAX_MARKERS) {
-                    hasLimitedMarkers = true;
-                    break;
-                }
-                
-                addSingleMachineToMap(machine, bounds);
+                bounds.extend({
+                    lat: parseFloat(machine.location.latitude),
+                    lng: parseFloat(machine.location.longitude)
+                });
                 validLocations++;
-                markersAdded++;
             }
         }
         
+        viewportOrganizationId = typeof selectedOrganizationId !== 'undefined' ? selectedOrganizationId : null;
+        
         // Si tenemos ubicaciones válidas, ajustar el mapa a esos límites
         if (validLocations > 0) {
             map.fitBounds(bounds);
@@ -354,34 +332,209 @@ function addMachinesToMap(machines) {
             }
         }
         
-        // Si hemos limitado los marcadores, mostrar un mensaje
-        if (hasLimitedMarkers) {
-            // Crear un control de información personalizado
-            const limitInfoDiv = document.createElement('div');
-            limitInfoDiv.className = 'map-info-control';
-            limitInfoDiv.innerHTML = `
-                <div class="alert alert-info p-2 m-0" style="font-size: 0.8rem; opacity: 0.9;">
-                    <i class="fas fa-info-circle"></i> 
-                    Mostrando ${markersAdded} de ${machines.filter(m => m.location && 
-                    m.location.latitude && m.location.longitude).length} ubicaciones.
-                </div>`;
-            
-            // Estilos CSS para el control personalizado
-            limitInfoDiv.style.margin = '10px';
-            limitInfoDiv.style.padding = '5px';
-            limitInfoDiv.style.backgroundColor = 'white';
-            limitInfoDiv.style.border = '1px solid #ccc';
-            limitInfoDiv.style.borderRadius = '4px';
-            limitInfoDiv.style.boxShadow = '0 2px 6px rgba(0,0,0,.3)';
-            
-            // Añadir el control al mapa
-            map.controls[google.maps.ControlPosition.BOTTOM_LEFT].push(limitInfoDiv);
+        // fitBounds no dispara 'idle' si la vista no cambia: pedir la vista actual igualmente
+        scheduleViewportLoad();
+    });
+}
+
+// Carga por vista: cuando el mapa deja de moverse se piden al servidor solo las
+// máquinas del rectángulo visible, agrupadas según el zoom
+// (/api/machines/<org>/clusters): las cercanas llegan como un único cluster
+const VIEWPORT_DEBOUNCE_MS = 250;
+let viewportOrganizationId = null;
+let viewportTimer = null;
+let viewportRequest = null;
+let viewportInfoDiv = null;
+let clusterMarkers = [];
+
+function scheduleViewportLoad() {
+    if (!viewportOrganizationId) {
+        return;
+    }
+    clearTimeout(viewportTimer);
+    viewportTimer = setTimeout(loadMachinesInView, VIEWPORT_DEBOUNCE_MS);
+}
+
+async function loadMachinesInView() {
+    const organizationId = viewportOrganizationId;
+    const bounds = map && map.getBounds();
+    if (!organizationId || !bounds) {
+        return;
+    }
+    
+    // Cancelar la petición de una vista anterior que aún no haya terminado
+    if (viewportRequest) {
+        viewportRequest.abort();
+    }
+    viewportRequest = new AbortController();
+    
+    const southWest = bounds.getSouthWest();
+    const northEast = bounds.getNorthEast();
+    const params = new URLSearchParams({
+        zoom: map.getZoom(),
+        bbox: [southWest.lng(), southWest.lat(), northEast.lng(), northEast.lat()].map(value => value.toFixed(6)).join(',')
+    });
+    
+    try {
+        const response = await fetch(`/api/machines/${organizationId}/clusters?${params}`, {
+            credentials: 'same-origin',
+            headers: { 'Accept': 'application/json' },
+            signal: viewportRequest.signal
+        });
+        if (!response.ok) {
+            throw new Error(`Error ${response.status} al obtener las máquinas de la vista`);
+        }
+        const result = await response.json();
+        // La organización pudo cambiar mientras llegaba la respuesta
+        if (organizationId !== viewportOrganizationId) {
+            return;
+        }
+        renderClusterMarkers(result.clusters);
+        const clustered = result.clusters.reduce((sum, cluster) => sum + cluster.count, 0);
+        renderViewportMachines(result.machines, result.machines.length + clustered, result.total);
+    } catch (error) {
+        if (error.name !== 'AbortError') {
+            console.error("Error al cargar las máquinas de la vista:", error);
+        }
+    }
+}
+
+// Sustituye los marcadores de cluster: un círculo con el número de máquinas que,
+// al pulsarlo, acerca el mapa hasta el zoom en el que el cluster se separa
+function renderClusterMarkers(clusters) {
+    clearClusterMarkers();
+    clusterMarkers = clusters.map(cluster => {
+        const marker = new google.maps.Marker({
+            position: { lat: cluster.latitude, lng: cluster.longitude },
+            map: map,
+            title: `${cluster.count} máquinas`,
+            label: {
+                text: cluster.count >= 1000 ? `${Math.round(cluster.count / 100) / 10}k` : String(cluster.count),
+                color: '#ffffff',
+                fontSize: '12px',
+                fontWeight: 'bold'
+            },
+            icon: {
+                path: google.maps.SymbolPath.CIRCLE,
+                // Radio según el orden de magnitud del número de máquinas
+                scale: 14 + 4 * Math.min(Math.floor(Math.log10(cluster.count)), 4),
+                fillColor: '#28a745',
+                fillOpacity: 0.85,
+                strokeColor: '#ffffff',
+                strokeWeight: 2
+            },
+            zIndex: 500
+        });
+        marker.addListener('click', function() {
+            map.setCenter(marker.getPosition());
+            map.setZoom(cluster.expansionZoom);
+        });
+        return marker;
+    });
+}
+
+// Deja en el mapa solo los marcadores de las máquinas recibidas, sin recrear los que ya estaban
+function renderViewportMachines(machines, shown, total) {
+    const visibleIds = new Set(machines.map(machine => machine.id));
+    for (const machineId of Object.keys(markers)) {
+        if (!visibleIds.has(machineId)) {
+            markers[machineId].setMap(null);
+            delete markers[machineId];
+        }
+    }
+    
+    const bounds = new google.maps.LatLngBounds();
+    for (const machine of machines) {
+        if (!markers[machine.id] && machine.location) {
+            addSingleMachineToMap(machine, bounds);
+        }
+    }
+    
+    // Aviso cuando en la vista hay más máquinas de las que devuelve el servidor
+    if (!viewportInfoDiv) {
+        viewportInfoDiv = document.createElement('div');
+        viewportInfoDiv.className = 'map-info-control';
+        viewportInfoDiv.style.margin = '10px';
+        viewportInfoDiv.style.padding = '5px';
+        viewportInfoDiv.style.backgroundColor = 'white';
+        viewportInfoDiv.style.border = '1px solid #ccc';
+        viewportInfoDiv.style.borderRadius = '4px';
+        viewportInfoDiv.style.boxShadow = '0 2px 6px rgba(0,0,0,.3)';
+        map.controls[google.maps.ControlPosition.BOTTOM_LEFT].push(viewportInfoDiv);
+    }
+    viewportInfoDiv.style.display = total > shown ? 'block' : 'none';
+    viewportInfoDiv.innerHTML = `
+        <div class="alert alert-info p-2 m-0" style="font-size: 0.8rem; opacity: 0.9;">
+            <i class="fas fa-info-circle"></i> 
+            Mostrando ${shown} de ${total} ubicaciones en la vista. Acerque el mapa para ver el resto.
+        </div>`;
+    
+    console.log(`Máquinas en la vista: ${machines.length} sueltas y ${clusterMarkers.length} clusters (${total} en total)`);
+}
+
+// Límites acumulados mientras llegan registros en streaming; el mapa se encuadra como
+// mucho una vez por fotograma, no con cada registro
+let progressiveBounds = null;
+let progressiveFitFrame = null;
+
+function scheduleProgressiveFit() {
+    if (progressiveFitFrame !== null) {
+        return;
+    }
+    progressiveFitFrame = requestAnimationFrame(() => {
+        progressiveFitFrame = null;
+        if (progressiveBounds) {
+            map.fitBounds(progressiveBounds);
         }
-        
-        console.log(`Añadidos ${markersAdded} marcadores al mapa`);
     });
 }
 
+// Prepara el mapa para recibir marcadores uno a uno (historial en streaming)
+window.startProgressiveMarkers = function() {
+    progressiveBounds = null;
+    if (progressiveFitFrame !== null) {
+        cancelAnimationFrame(progressiveFitFrame);
+        progressiveFitFrame = null;
+    }
+    // El historial dibuja sus propios marcadores: dejar de cargar por vista
+    viewportOrganizationId = null;
+    clearClusterMarkers();
+    if (window.map && typeof window.map.getCenter === 'function') {
+        clearMapMarkers();
+    }
+};
+
+// Añade al mapa un registro de /api/location-history en cuanto llega
+window.addLocationRecordToMap = function(record) {
+    if (!record || record.latitude === null || record.longitude === null || !record.id) {
+        return;
+    }
+    if (!window.map || typeof window.map.getCenter !== 'function') {
+        return;
+    }
+
+    withGoogleMaps(() => {
+        if (!progressiveBounds) {
+            progressiveBounds = new google.maps.LatLngBounds();
+        }
+
+        const machine = {
+            id: record.id,
+            name: record.name,
+            location: {
+                latitude: record.latitude,
+                longitude: record.longitude,
+                timestamp: record.timestamp
+            }
+        };
+        if (markers[machine.id]) {
+            markers[machine.id].setMap(null);
+        }
+        addSingleMachineToMap(machine, progressiveBounds);
+        scheduleProgressiveFit();
+    });
+};
+
 // Función auxiliar para añadir una máquina al mapa
 function addSingleMachineToMap(machine, bounds) {
     // Crear posición para Google Maps
@@ -580,9 +733,15 @@ window.clearMapMarkers = function() {
     });
     window.markers = {};
     markers = window.markers;
+    clearClusterMarkers();
     console.log("Marcadores del mapa limpiados exitosamente");
 }
 
+function clearClusterMarkers() {
+    clusterMarkers.forEach(marker => marker.setMap(null));
+    clusterMarkers = [];
+}
+
 // Función local para compatibilidad interna del archivo
 function clearMapMarkers() {
     // Implementar directamente sin llamar a window.clearMapMarkers para evitar recursión
@@ -599,6 +758,7 @@ function clearMapMarkers() {
     });
     window.markers = {};
     markers = window.markers;
+    clearClusterMarkers();
     console.log("Marcadores del mapa limpiados localmente");
 }
 
@@ -0,0 +1,616 @@
+"""Almacén local (SQLite) con la última telemetría conocida de la flota.
+
+Lo rellena el poller en segundo plano (fleet_poller.py) y lo leen las rutas de
+Flask, que así responden en milisegundos sin esperar a la API de John Deere.
+Cada fila guarda synced_at para que los lectores decidan si la copia es lo
+bastante reciente (TELEMETRY_MAX_AGE).
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+from config import TELEMETRY_DB_PATH, TELEMETRY_MAX_AGE
+from engine_hours import parse_time, usage_by_period
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS organizations (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    type TEXT,
+    links TEXT,
+    synced_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS machines (
+    id TEXT PRIMARY KEY,
+    organization_id TEXT NOT NULL,
+    name TEXT,
+    model TEXT,
+    category TEXT,
+    type TEXT,
+    links TEXT,
+    synced_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_machines_org ON machines (organization_id);
+CREATE TABLE IF NOT EXISTS machine_locations (
+    machine_id TEXT PRIMARY KEY,
+    latitude REAL,
+    longitude REAL,
+    timestamp TEXT,
+    synced_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS engine_hours (
+    machine_id TEXT PRIMARY KEY,
+    data TEXT,
+    synced_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS alerts (
+    machine_id TEXT NOT NULL,
+    alert_id TEXT NOT NULL,
+    timestamp TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (machine_id, alert_id)
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_machine_time ON alerts (machine_id, timestamp);
+CREATE TABLE IF NOT EXISTS location_points (
+    machine_id TEXT NOT NULL,
+    event_timestamp TEXT NOT NULL,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    PRIMARY KEY (machine_id, event_timestamp)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS movement_days (
+    machine_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    points INTEGER NOT NULL,
+    distance REAL NOT NULL,
+    moving_seconds REAL NOT NULL,
+    idle_seconds REAL NOT NULL,
+    moving_segments INTEGER NOT NULL,
+    idle_segments INTEGER NOT NULL,
+    max_speed REAL,
+    first_timestamp TEXT,
+    last_timestamp TEXT,
+    PRIMARY KEY (machine_id, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS engine_hour_readings (
+    machine_id TEXT NOT NULL,
+    report_time TEXT NOT NULL,
+    hours REAL NOT NULL,
+    PRIMARY KEY (machine_id, report_time)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS engine_hour_rollups (
+    machine_id TEXT NOT NULL,
+    period TEXT NOT NULL,
+    start TEXT NOT NULL,
+    hours REAL NOT NULL,
+    PRIMARY KEY (machine_id, period, start)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS alert_definitions (
+    id TEXT PRIMARY KEY,
+    spn INTEGER,
+    fmi INTEGER,
+    source TEXT,
+    data TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+def normalize_timestamp(timestamp):
+    """Convierte un timestamp ISO 8601 a UTC con milisegundos ('...T10:00:00.000Z').
+
+    Con un formato único las comparaciones de texto en SQLite respetan el orden
+    cronológico y los rangos se resuelven con el índice.
+    """
+    if not timestamp:
+        return None
+    timestamp = str(timestamp)
+    # Formatos habituales de la API: se resuelven sin parsear la fecha
+    if len(timestamp) == 24 and timestamp[19] == '.' and timestamp[23] == 'Z':
+        return timestamp
+    if len(timestamp) == 20 and timestamp[19] == 'Z' and timestamp[10] == 'T':
+        return timestamp[:19] + '.000Z'
+    try:
+        parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    except ValueError:
+        return timestamp
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    parsed = parsed.astimezone(timezone.utc)
+    return parsed.strftime('%Y-%m-%dT%H:%M:%S.') + f"{parsed.microsecond // 1000:03d}Z"
+
+
+def history_point(value):
+    """Extrae (timestamp, lat, lon) de un elemento de locationHistory, o None."""
+    point = value.get('point') if isinstance(value, dict) else None
+    if not point or point.get('lat') is None or point.get('lon') is None:
+        return None
+    timestamp = normalize_timestamp(value.get('eventTimestamp') or value.get('gpsFixTimestamp'))
+    if not timestamp:
+        return None
+    return timestamp, point['lat'], point['lon']
+
+
+def engine_hours_reading(value):
+    """Extrae (timestamp, horas) de una lectura de engineHours, o None."""
+    if not isinstance(value, dict):
+        return None
+    reading = value.get('reading')
+    hours = reading.get('valueAsDouble') if isinstance(reading, dict) else value.get('value')
+    timestamp = normalize_timestamp(value.get('reportTime') or value.get('timestamp'))
+    try:
+        hours = float(hours)
+        parse_time(timestamp)
+    except (AttributeError, TypeError, ValueError):
+        return None
+    return timestamp, hours
+
+
+class TelemetryStore:
+    """Acceso al fichero SQLite de telemetría (una conexión por hilo)."""
+
+    def __init__(self, path=TELEMETRY_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    # --- Estado de sincronización ---
+
+    def get_sync_time(self, key):
+        row = self._connect().execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_sync_time(self, key, value=None):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)',
+                (key, time.time() if value is None else value)
+            )
+
+    # --- Escrituras (poller) ---
+
+    def save_organizations(self, organizations):
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO organizations (id, name, type, links, synced_at) VALUES (?, ?, ?, ?, ?)',
+                [
+                    (str(org.get('id')), org.get('name'), org.get('type'), json.dumps(org.get('links', [])), now)
+                    for org in organizations
+                ]
+            )
+
+    def save_machines(self, organization_id, machines):
+        """Guarda el listado de equipos de una organización (reemplaza el anterior)."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('DELETE FROM machines WHERE organization_id = ?', (str(organization_id),))
+            conn.executemany(
+                'INSERT OR REPLACE INTO machines (id, organization_id, name, model, category, type, links, synced_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [
+                    (
+                        str(machine.get('id')), str(organization_id), machine.get('name'), machine.get('model'),
+                        machine.get('category'), machine.get('type'), json.dumps(machine.get('links', [])), now
+                    )
+                    for machine in machines if machine.get('id')
+                ]
+            )
+        self.set_sync_time(f"machines:{organization_id}", now)
+
+    def save_location(self, machine_id, location):
+        if not location:
+            return
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO machine_locations (machine_id, latitude, longitude, timestamp, synced_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (str(machine_id), location.get('latitude'), location.get('longitude'),
+                 location.get('timestamp'), time.time())
+            )
+
+    def save_engine_hours(self, machine_id, data):
+        if data is None:
+            return
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO engine_hours (machine_id, data, synced_at) VALUES (?, ?, ?)',
+                (str(machine_id), json.dumps(data), time.time())
+            )
+
+    def save_engine_hour_readings(self, machine_id, data):
+        """Guarda las lecturas nuevas de una respuesta de engineHours y actualiza los acumulados.
+
+        Cada lectura nueva resta el uso del tramo entre sus vecinas y suma el de
+        los dos tramos nuevos (ver engine_hours.py), todo en una transacción para
+        que dos escritores a la vez no cuenten un tramo dos veces.
+        Devuelve el número de lecturas nuevas.
+        """
+        values = data.get('values') if isinstance(data, dict) and isinstance(data.get('values'), list) else [data]
+        readings = sorted({reading for reading in map(engine_hours_reading, values) if reading})
+        if not readings:
+            return 0
+        machine_id = str(machine_id)
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            added = 0
+            usage = defaultdict(float)
+            for timestamp, hours in readings:
+                inserted = conn.execute(
+                    'INSERT OR IGNORE INTO engine_hour_readings (machine_id, report_time, hours) VALUES (?, ?, ?)',
+                    (machine_id, timestamp, hours)
+                ).rowcount
+                if not inserted:
+                    continue
+                added += 1
+                previous = conn.execute(
+                    'SELECT report_time, hours FROM engine_hour_readings WHERE machine_id = ? AND report_time < ? '
+                    'ORDER BY report_time DESC LIMIT 1',
+                    (machine_id, timestamp)
+                ).fetchone()
+                following = conn.execute(
+                    'SELECT report_time, hours FROM engine_hour_readings WHERE machine_id = ? AND report_time > ? '
+                    'ORDER BY report_time LIMIT 1',
+                    (machine_id, timestamp)
+                ).fetchone()
+                changes = []
+                if previous and following:
+                    changes.append((-1, usage_by_period(*previous, *following)))
+                if previous:
+                    changes.append((1, usage_by_period(*previous, timestamp, hours)))
+                if following:
+                    changes.append((1, usage_by_period(timestamp, hours, *following)))
+                for sign, periods in changes:
+                    for key, value in periods.items():
+                        usage[key] += sign * value
+            conn.executemany(
+                'INSERT INTO engine_hour_rollups (machine_id, period, start, hours) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (machine_id, period, start) DO UPDATE SET hours = hours + excluded.hours',
+                [(machine_id, period, start, value) for (period, start), value in usage.items()]
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return added
+
+    def save_alerts(self, machine_id, alerts):
+        """Inserta o actualiza alertas por ID; las ya guardadas se conservan.
+
+        Las alertas sin ID se guardan con un ID derivado de su contenido, así
+        una misma alerta recibida dos veces no se duplica.
+        """
+        rows = []
+        for alert in alerts:
+            alert_id = alert.get('id')
+            if not alert_id or alert_id == 'sin-id':
+                digest = hashlib.sha1(json.dumps(alert, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+                alert_id = f"sin-id:{digest}"
+            rows.append((str(machine_id), str(alert_id), normalize_timestamp(alert.get('timestamp')), json.dumps(alert)))
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO alerts (machine_id, alert_id, timestamp, data) VALUES (?, ?, ?, ?)',
+                rows
+            )
+        self.set_sync_time(f"alerts:{machine_id}")
+
+    def save_alert_definitions(self, definitions, source):
+        """Guarda definiciones de DTC (dicts con 'id', 'spn' y 'fmi') del catálogo local."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO alert_definitions (id, spn, fmi, source, data, synced_at) VALUES (?, ?, ?, ?, ?, ?)',
+                [
+                    (str(definition['id']), definition.get('spn'), definition.get('fmi'), source, json.dumps(definition), now)
+                    for definition in definitions if definition.get('id')
+                ]
+            )
+
+    def save_location_points(self, machine_id, values):
+        """Guarda los puntos de locationHistory; los que ya existen se omiten.
+
+        Con puntos nuevos se borra el resumen de movimiento de sus días y del día
+        anterior (su último tramo llega hasta el primer punto del día siguiente).
+        Devuelve el número de puntos nuevos.
+        """
+        rows = []
+        for value in values:
+            parsed = history_point(value)
+            if parsed:
+                rows.append((str(machine_id),) + parsed)
+        if not rows:
+            return 0
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO location_points (machine_id, event_timestamp, latitude, longitude) '
+                'VALUES (?, ?, ?, ?)',
+                rows
+            )
+            added = conn.total_changes - before
+            if added:
+                days = set()
+                for row in rows:
+                    try:
+                        day = date.fromisoformat(row[1][:10])
+                    except ValueError:
+                        continue
+                    days.update((day.isoformat(), (day - timedelta(days=1)).isoformat()))
+                conn.executemany(
+                    'DELETE FROM movement_days WHERE machine_id = ? AND day = ?',
+                    [(str(machine_id), day) for day in days]
+                )
+            return added
+
+    def save_movement_days(self, rows):
+        """Guarda resúmenes diarios de movimiento (tuplas con las columnas de movement_days)."""
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO movement_days (machine_id, day, points, distance, moving_seconds, '
+                'idle_seconds, moving_segments, idle_segments, max_speed, first_timestamp, last_timestamp) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+
+    # --- Lecturas (rutas de Flask) ---
+
+    def latest_point_timestamp(self, machine_id):
+        row = self._connect().execute(
+            'SELECT MAX(event_timestamp) FROM location_points WHERE machine_id = ?', (str(machine_id),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_location_points(self, machine_id, start=None, end=None, limit=None):
+        """Puntos de una máquina en [start, end] en orden cronológico (rango sobre la clave primaria)."""
+        query = 'SELECT event_timestamp, latitude, longitude FROM location_points WHERE machine_id = ?'
+        params = [str(machine_id)]
+        if start:
+            query += ' AND event_timestamp >= ?'
+            params.append(normalize_timestamp(start))
+        if end:
+            query += ' AND event_timestamp <= ?'
+            params.append(normalize_timestamp(end))
+        query += ' ORDER BY event_timestamp'
+        if limit:
+            query += ' LIMIT ?'
+            params.append(int(limit))
+        return [
+            {'timestamp': timestamp, 'latitude': latitude, 'longitude': longitude}
+            for timestamp, latitude, longitude in self._connect().execute(query, params)
+        ]
+
+    def get_point_rows(self, machine_id, start, end):
+        """Filas (timestamp, lat, lon) de [start, end) más el primer punto posterior, en orden."""
+        conn = self._connect()
+        rows = conn.execute(
+            'SELECT event_timestamp, latitude, longitude FROM location_points '
+            'WHERE machine_id = ? AND event_timestamp >= ? AND event_timestamp < ? ORDER BY event_timestamp',
+            (str(machine_id), start, end)
+        ).fetchall()
+        following = conn.execute(
+            'SELECT event_timestamp, latitude, longitude FROM location_points '
+            'WHERE machine_id = ? AND event_timestamp >= ? ORDER BY event_timestamp LIMIT 1',
+            (str(machine_id), end)
+        ).fetchone()
+        if following:
+            rows.append(following)
+        return rows
+
+    def get_movement_days(self, machine_ids, first_day, last_day):
+        """Resúmenes diarios guardados de las máquinas entre dos días ('YYYY-MM-DD'), inclusive."""
+        conn = self._connect()
+        rows = []
+        for machine_id in machine_ids:
+            rows.extend(conn.execute(
+                'SELECT machine_id, day, points, distance, moving_seconds, idle_seconds, moving_segments, '
+                'idle_segments, max_speed, first_timestamp, last_timestamp FROM movement_days '
+                'WHERE machine_id = ? AND day >= ? AND day <= ?',
+                (str(machine_id), first_day, last_day)
+            ))
+        return rows
+
+    def get_latest_points(self, machine_ids, start=None, end=None):
+        """Último punto de cada máquina dentro de [start, end].
+
+        Devuelve (puntos, con_historial): {machine_id: punto} para las máquinas con
+        algún punto en el rango y el conjunto de máquinas que tienen algún punto guardado.
+        """
+        conn = self._connect()
+        start = normalize_timestamp(start) if start else ''
+        end = normalize_timestamp(end) if end else '9999'
+        latest = {}
+        with_history = set()
+        for machine_id in machine_ids:
+            machine_id = str(machine_id)
+            # Cada consulta es un recorrido descendente del índice que se detiene en la primera fila
+            row = conn.execute(
+                'SELECT event_timestamp, latitude, longitude FROM location_points '
+                'WHERE machine_id = ? AND event_timestamp >= ? AND event_timestamp <= ? '
+                'ORDER BY event_timestamp DESC LIMIT 1',
+                (machine_id, start, end)
+            ).fetchone()
+            if row:
+                with_history.add(machine_id)
+                latest[machine_id] = {'timestamp': row[0], 'latitude': row[1], 'longitude': row[2]}
+            elif conn.execute('SELECT 1 FROM location_points WHERE machine_id = ? LIMIT 1', (machine_id,)).fetchone():
+                with_history.add(machine_id)
+        return latest, with_history
+
+    def _is_fresh(self, synced_at, max_age):
+        return synced_at is not None and time.time() - synced_at <= max_age
+
+    def fleet_synced_at(self, organization_id):
+        return self.get_sync_time(f"machines:{organization_id}")
+
+    def get_fleet(self, organization_id, max_age=TELEMETRY_MAX_AGE, with_links=True):
+        """Devuelve las máquinas de la organización con el formato de fetch_machines_by_organization.
+
+        Devuelve None si la organización no se ha sincronizado o la copia es antigua.
+        Con with_links=False los registros no llevan 'links'.
+        """
+        if not self._is_fresh(self.fleet_synced_at(organization_id), max_age):
+            return None
+
+        rows = self._connect().execute(
+            'SELECT m.id, m.name, m.model, m.category, m.type, m.links, l.latitude, l.longitude, l.timestamp '
+            'FROM machines m LEFT JOIN machine_locations l ON l.machine_id = m.id '
+            'WHERE m.organization_id = ? ORDER BY m.rowid',
+            (str(organization_id),)
+        ).fetchall()
+
+        machines = []
+        for machine_id, name, model, category, machine_type, links, latitude, longitude, timestamp in rows:
+            location = None
+            if latitude is not None and longitude is not None:
+                location = {'longitude': longitude, 'latitude': latitude, 'timestamp': timestamp}
+            machine = {
+                'id': machine_id,
+                'name': name,
+                'model': model,
+                'category': category,
+                'type': machine_type,
+                'location': location
+            }
+            if with_links:
+                machine['links'] = json.loads(links) if links else []
+            machines.append(machine)
+        return machines
+
+    def get_machine_links(self, organization_id):
+        """Devuelve {machine_id: links} de las máquinas guardadas de una organización."""
+        return {
+            machine_id: json.loads(links) if links else []
+            for machine_id, links in self._connect().execute(
+                'SELECT id, links FROM machines WHERE organization_id = ?', (str(organization_id),)
+            )
+        }
+
+    def get_machine_organizations(self, machine_ids):
+        """Devuelve {machine_id: organization_id} para las máquinas conocidas."""
+        machine_ids = [str(machine_id) for machine_id in machine_ids]
+        result = {}
+        conn = self._connect()
+        # Consultas en bloques para no superar el límite de parámetros de SQLite
+        for i in range(0, len(machine_ids), 500):
+            chunk = machine_ids[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            result.update(conn.execute(
+                f'SELECT id, organization_id FROM machines WHERE id IN ({placeholders})', chunk
+            ).fetchall())
+        return result
+
+    def get_alerts(self, machine_id, since=None, max_age=TELEMETRY_MAX_AGE):
+        """Devuelve las alertas guardadas de una máquina desde `since`, las más recientes primero.
+
+        Devuelve None si no hay copia reciente (max_age=None no lo comprueba).
+        Las alertas sin timestamp se incluyen siempre.
+        """
+        if max_age is not None and not self._is_fresh(self.get_sync_time(f"alerts:{machine_id}"), max_age):
+            return None
+
+        query = 'SELECT data FROM alerts WHERE machine_id = ?'
+        params = [str(machine_id)]
+        if since:
+            query += ' AND (timestamp >= ? OR timestamp IS NULL)'
+            params.append(normalize_timestamp(since))
+        query += ' ORDER BY timestamp DESC'
+        return [json.loads(row[0]) for row in self._connect().execute(query, params)]
+
+    def get_alert_definition(self, definition_id):
+        row = self._connect().execute(
+            'SELECT data, source FROM alert_definitions WHERE id = ?', (str(definition_id),)
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def iter_alert_definitions(self):
+        """Recorre todas las definiciones de DTC guardadas como (definición, origen)."""
+        for data, source in self._connect().execute('SELECT data, source FROM alert_definitions'):
+            yield json.loads(data), source
+
+    def get_engine_hours(self, machine_id, max_age=TELEMETRY_MAX_AGE):
+        row = self._connect().execute(
+            'SELECT data, synced_at FROM engine_hours WHERE machine_id = ?', (str(machine_id),)
+        ).fetchone()
+        if row is None or not self._is_fresh(row[1], max_age):
+            return None
+        return json.loads(row[0])
+
+    def get_engine_hour_rollups(self, machine_ids, period, first_start, last_start):
+        """Filas (machine_id, inicio, horas) de los acumulados de un periodo entre dos inicios, inclusive."""
+        conn = self._connect()
+        rows = []
+        for machine_id in machine_ids:
+            rows.extend(conn.execute(
+                'SELECT machine_id, start, hours FROM engine_hour_rollups '
+                'WHERE machine_id = ? AND period = ? AND start >= ? AND start <= ?',
+                (str(machine_id), period, first_start, last_start)
+            ))
+        return rows
+
+    def get_latest_engine_hour_readings(self, machine_ids):
+        """Devuelve {machine_id: (timestamp, horas)} con la última lectura guardada de cada máquina."""
+        conn = self._connect()
+        latest = {}
+        for machine_id in machine_ids:
+            row = conn.execute(
+                'SELECT report_time, hours FROM engine_hour_readings WHERE machine_id = ? '
+                'ORDER BY report_time DESC LIMIT 1',
+                (str(machine_id),)
+            ).fetchone()
+            if row:
+                latest[str(machine_id)] = row
+        return latest
+
+    def stats(self):
+        conn = self._connect()
+        return {
+            'path': self.path,
+            'organizations': conn.execute('SELECT COUNT(*) FROM organizations').fetchone()[0],
+            'machines': conn.execute('SELECT COUNT(*) FROM machines').fetchone()[0],
+            'locations': conn.execute('SELECT COUNT(*) FROM machine_locations').fetchone()[0],
+            'alerts': conn.execute('SELECT COUNT(*) FROM alerts').fetchone()[0],
+            'alert_definitions': conn.execute('SELECT COUNT(*) FROM alert_definitions').fetchone()[0],
+            'location_points': conn.execute('SELECT COUNT(*) FROM location_points').fetchone()[0],
+            'movement_days': conn.execute('SELECT COUNT(*) FROM movement_days').fetchone()[0],
+            'engine_hour_readings': conn.execute('SELECT COUNT(*) FROM engine_hour_readings').fetchone()[0]
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Devuelve el almacén de telemetría del proceso."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TelemetryStore()
+    return _store
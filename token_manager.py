@@ -0,0 +1,251 @@
+"""Gestión compartida de los tokens OAuth2 de John Deere.
+
+Antes cada fetch_* llamaba a refresh_token_if_needed() con el token de la
+sesión, y el token refrescado se descartaba: una vez expirado, cada llamada
+volvía a refrescarlo. TokenManager:
+  - refresca con antelación (TOKEN_REFRESH_MARGIN segundos antes de expirar),
+  - agrupa los refrescos simultáneos del mismo token en uno solo, dentro del
+    proceso (SingleFlight) y entre workers (lease en SQLite),
+  - guarda el token nuevo en un fichero SQLite compartido por todos los
+    workers, indexado por el token original, de modo que quien todavía tenga
+    el token viejo (en su cookie o en memoria) obtiene el nuevo sin llamar
+    al endpoint de tokens.
+
+Las consultas habituales se resuelven desde un LRU en memoria sin tocar
+SQLite ni la red.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from cache import SingleFlight, user_scope
+from config import (
+    JOHN_DEERE_CLIENT_ID,
+    JOHN_DEERE_CLIENT_SECRET,
+    JOHN_DEERE_TOKEN_URL,
+    TOKEN_REFRESH_MARGIN,
+    TOKEN_REFRESH_WAIT,
+    TOKEN_STORE_PATH
+)
+from http_pool import get_http_client
+
+logger = logging.getLogger(__name__)
+
+# Tokens recordados en memoria por proceso
+MEMORY_TOKENS = 1024
+
+
+def refresh_with_deere(token):
+    """Pide un token nuevo al endpoint de tokens con el refresh_token."""
+    # Sesión no compartida: refresh_token() modifica el token de la sesión
+    oauth = get_http_client().create_session(token=token)
+    return oauth.refresh_token(
+        JOHN_DEERE_TOKEN_URL,
+        client_id=JOHN_DEERE_CLIENT_ID,
+        client_secret=JOHN_DEERE_CLIENT_SECRET
+    )
+
+
+class TokenManager:
+    """Refresco proactivo, único y compartido de tokens OAuth2."""
+
+    def __init__(self, path=TOKEN_STORE_PATH, margin=TOKEN_REFRESH_MARGIN, refresher=refresh_with_deere,
+                 wait_seconds=TOKEN_REFRESH_WAIT):
+        self.path = path
+        self.margin = margin
+        self.refresher = refresher
+        self.wait_seconds = wait_seconds
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._flight = SingleFlight()
+        self._owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.refreshes = 0
+        self.shared_hits = 0
+        self.waits = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS oauth_tokens (
+                    key TEXT PRIMARY KEY,
+                    token TEXT NOT NULL,
+                    expires_at REAL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS token_leases (
+                    key TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+        # El fichero contiene refresh tokens: solo legible por el usuario del proceso
+        try:
+            os.chmod(path, 0o600)
+        except OSError:
+            pass
+        self.purge_expired()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def needs_refresh(self, token):
+        expires_at = token.get('expires_at')
+        return bool(expires_at) and expires_at - self.margin < time.time()
+
+    @staticmethod
+    def _newest(*tokens):
+        """El token que expira más tarde (los que no tienen expires_at no caducan)."""
+        candidates = [token for token in tokens if token]
+        return max(candidates, key=lambda token: token.get('expires_at') or float('inf'))
+
+    def _remember(self, key, token):
+        with self._lock:
+            self._memory[key] = token
+            self._memory.move_to_end(key)
+            while len(self._memory) > MEMORY_TOKENS:
+                self._memory.popitem(last=False)
+
+    def peek(self, token):
+        """Devuelve el token vigente más nuevo conocido en memoria, o None si hay que
+        consultar el almacén o refrescar (no bloquea)."""
+        with self._lock:
+            remembered = self._memory.get(user_scope(token))
+        current = self._newest(token, remembered)
+        return None if self.needs_refresh(current) else current
+
+    def ensure_fresh(self, token):
+        """Devuelve un token que no expira en los próximos TOKEN_REFRESH_MARGIN segundos.
+
+        Lanza la excepción del endpoint de tokens si el refresco falla.
+        """
+        if not token:
+            return token
+        current = self.peek(token)
+        if current is not None:
+            return current
+
+        key = user_scope(token)
+        with self._lock:
+            current = self._newest(token, self._memory.get(key))
+        stored = self._load(key)
+        if stored is not None:
+            current = self._newest(current, stored)
+            if not self.needs_refresh(current):
+                with self._lock:
+                    self.shared_hits += 1
+                self._remember(key, current)
+                return current
+
+        return self._flight.do(key, lambda: self._refresh(key, current))
+
+    def _refresh(self, key, token):
+        """Refresca el token si este proceso obtiene el lease; si no, espera el de otro worker."""
+        deadline = time.time() + self.wait_seconds
+        while not self._acquire_lease(key):
+            with self._lock:
+                self.waits += 1
+            time.sleep(0.2)
+            stored = self._load(key)
+            if stored is not None and not self.needs_refresh(stored):
+                self._remember(key, stored)
+                return stored
+            if time.time() > deadline:
+                logger.warning("Tiempo de espera agotado aguardando el refresco de token de otro worker")
+                break
+        try:
+            # Otro worker pudo terminar justo antes de que obtuviésemos el lease
+            stored = self._load(key)
+            if stored is not None and not self.needs_refresh(stored):
+                self._remember(key, stored)
+                return stored
+
+            logger.info("Refrescando token OAuth antes de su expiración")
+            refreshed = dict(self.refresher(token))
+            with self._lock:
+                self.refreshes += 1
+            self.save(key, refreshed)
+            # También bajo la clave del token nuevo (si el refresh_token rota)
+            new_key = user_scope(refreshed)
+            if new_key != key:
+                self.save(new_key, refreshed)
+            return refreshed
+        finally:
+            self._release_lease(key)
+
+    def _load(self, key):
+        row = self._connect().execute('SELECT token FROM oauth_tokens WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, key, token):
+        self._connect().execute(
+            'INSERT OR REPLACE INTO oauth_tokens (key, token, expires_at, updated_at) VALUES (?, ?, ?, ?)',
+            (key, json.dumps(token), token.get('expires_at'), time.time())
+        )
+        self._remember(key, token)
+
+    def _acquire_lease(self, key):
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM token_leases WHERE key = ? AND expires_at < ?', (key, now))
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO token_leases (key, owner, expires_at) VALUES (?, ?, ?)',
+                (key, self._owner, now + self.wait_seconds)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return cursor.rowcount == 1
+
+    def _release_lease(self, key):
+        self._connect().execute('DELETE FROM token_leases WHERE key = ? AND owner = ?', (key, self._owner))
+
+    def purge_expired(self, older_than=7 * 24 * 3600):
+        """Borra tokens caducados hace más de older_than segundos."""
+        self._connect().execute(
+            'DELETE FROM oauth_tokens WHERE expires_at IS NOT NULL AND expires_at < ?', (time.time() - older_than,)
+        )
+
+    def stats(self):
+        stored = self._connect().execute('SELECT COUNT(*) FROM oauth_tokens').fetchone()[0]
+        with self._lock:
+            return {
+                'path': self.path,
+                'stored_tokens': stored,
+                'memory_tokens': len(self._memory),
+                'refresh_margin': self.margin,
+                'refreshes': self.refreshes,
+                'shared_hits': self.shared_hits,
+                'waits': self.waits
+            }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_token_manager():
+    """Devuelve el gestor de tokens del proceso."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = TokenManager()
+    return _manager
@@ -0,0 +1,120 @@
+"""Simplificación de trayectorias del historial de ubicación.
+
+Un día de una máquina puede tener decenas de miles de puntos de
+locationHistory, muchos más de los que necesita una polilínea en el mapa.
+simplify() se queda con los puntos que definen la forma del recorrido:
+  - 'dp' (Douglas-Peucker): conserva el punto más alejado del segmento entre
+    los extremos mientras supere la tolerancia; las distancias de cada tramo
+    se calculan de una vez con NumPy,
+  - 'vw' (Visvalingam-Whyatt): quita primero los puntos cuyo triángulo con sus
+    vecinos tiene menos área; en cada pasada se eliminan a la vez todos los
+    mínimos locales que no son vecinos entre sí.
+La tolerancia está en metros, sobre una proyección plana local del recorrido;
+tolerance_for_zoom() da la que corresponde a un píxel a un zoom del mapa.
+"""
+import math
+
+import numpy as np
+
+EARTH_RADIUS_METERS = 6371008.8
+# Metros por píxel de Web Mercator en el ecuador a zoom 0
+METERS_PER_PIXEL_ZOOM_0 = 156543.03392
+METHODS = ('dp', 'vw')
+
+
+def tolerance_for_zoom(zoom, latitude, pixels=1.0):
+    """Metros que ocupan `pixels` píxeles a ese zoom y latitud."""
+    return pixels * METERS_PER_PIXEL_ZOOM_0 * math.cos(math.radians(latitude)) / 2 ** zoom
+
+
+def project(latitudes, longitudes):
+    """(x, y) en metros: proyección equirectangular alrededor de la latitud media."""
+    latitudes = np.radians(latitudes)
+    # unwrap evita el salto de 360° si el recorrido cruza el antimeridiano
+    longitudes = np.unwrap(np.radians(longitudes))
+    x = longitudes * EARTH_RADIUS_METERS * math.cos(float(np.mean(latitudes)))
+    y = latitudes * EARTH_RADIUS_METERS
+    return x, y
+
+
+def douglas_peucker(x, y, tolerance):
+    """Máscara de los puntos que conserva Douglas-Peucker con esa tolerancia (metros)."""
+    count = len(x)
+    keep = np.zeros(count, dtype=bool)
+    if count <= 2:
+        keep[:] = True
+        return keep
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx = x[last] - x[first]
+        dy = y[last] - y[first]
+        px = x[first + 1:last] - x[first]
+        py = y[first + 1:last] - y[first]
+        # Distancia al segmento (no a la recta): las idas y vueltas sobre el mismo camino se conservan
+        length = dx * dx + dy * dy
+        if length > 0:
+            t = np.clip((px * dx + py * dy) / length, 0.0, 1.0)
+            distances = np.hypot(px - t * dx, py - t * dy)
+        else:
+            distances = np.hypot(px, py)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return keep
+
+
+def visvalingam(x, y, tolerance):
+    """Máscara de los puntos que conserva Visvalingam-Whyatt con esa tolerancia (metros).
+
+    Los puntos se quitan por orden de área efectiva (el triángulo con sus
+    vecinos) mientras su distancia a la base entre los vecinos no supere la
+    tolerancia. A diferencia de Douglas-Peucker el error no se acumula con
+    límite: en una ida y vuelta exacta el extremo puede recortarse.
+    """
+    count = len(x)
+    keep = np.ones(count, dtype=bool)
+    remaining = np.arange(count)
+    while len(remaining) > 2:
+        px = x[remaining]
+        py = y[remaining]
+        areas = 0.5 * np.abs(
+            (px[:-2] - px[2:]) * (py[1:-1] - py[2:]) - (px[1:-1] - px[2:]) * (py[:-2] - py[2:])
+        )
+        # Altura del triángulo sobre la base entre los vecinos: la misma tolerancia que
+        # Douglas-Peucker. Si los vecinos coinciden (ida y vuelta) la base mide cero y se usa
+        # la distancia al vecino
+        bases = np.hypot(px[2:] - px[:-2], py[2:] - py[:-2])
+        heights = np.hypot(px[1:-1] - px[:-2], py[1:-1] - py[:-2])
+        np.divide(2 * areas, bases, out=heights, where=bases > 0)
+        padded = np.concatenate(([np.inf], areas, [np.inf]))
+        removable = (heights <= tolerance) & (areas <= padded[:-2]) & (areas <= padded[2:])
+        if not removable.any():
+            break
+        # En cada racha de candidatos consecutivos (p. ej. una máquina parada) se quita uno
+        # de cada dos, para que no se eliminen a la vez dos vecinos
+        positions = np.arange(len(areas))
+        run_start = np.maximum.accumulate(np.where(removable, -1, positions))
+        removable &= (positions - run_start) % 2 == 1
+        keep[remaining[1:-1][removable]] = False
+        remaining = np.concatenate((remaining[:1], remaining[1:-1][~removable], remaining[-1:]))
+    return keep
+
+
+def simplify(points, tolerance, method='dp'):
+    """Puntos ({timestamp, latitude, longitude}, en orden) que conserva el método elegido."""
+    if method not in METHODS:
+        raise ValueError(f"Método de simplificación desconocido: {method}")
+    if len(points) <= 2:
+        return list(points)
+    latitudes = np.fromiter((point['latitude'] for point in points), dtype=float, count=len(points))
+    longitudes = np.fromiter((point['longitude'] for point in points), dtype=float, count=len(points))
+    x, y = project(latitudes, longitudes)
+    keep = douglas_peucker(x, y, tolerance) if method == 'dp' else visvalingam(x, y, tolerance)
+    return [points[index] for index in np.flatnonzero(keep)]
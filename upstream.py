@@ -0,0 +1,352 @@
+"""Planificador central de las llamadas a la API de John Deere.
+
+Todas las peticiones (las del cliente síncrono a través del adaptador HTTP
+compartido y las del cliente asíncrono) pasan por UpstreamScheduler, que:
+  - limita el ritmo por host (partnerapi / equipmentapi) con un token bucket
+    adaptativo: ante un 429 reduce el ritmo a la mitad y lo recupera poco a
+    poco con cada respuesta correcta,
+  - reintenta las peticiones idempotentes ante 429/502/503/504 y errores de
+    conexión, esperando lo que indique Retry-After o un backoff exponencial
+    con jitter,
+  - abre un circuit breaker por endpoint (ruta con los IDs sustituidos por
+    {id}) tras varios fallos seguidos, para no insistir contra un endpoint
+    caído; pasado el enfriamiento deja pasar una petición de prueba.
+
+Los límites son por proceso (cada worker de gunicorn tiene su planificador).
+"""
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from config import (
+    JOHN_DEERE_API_BASE_URL,
+    JOHN_DEERE_EQUIPMENT_API_URL,
+    UPSTREAM_BACKOFF_BASE,
+    UPSTREAM_BACKOFF_MAX,
+    UPSTREAM_BREAKER_COOLDOWN,
+    UPSTREAM_BREAKER_FAILURES,
+    UPSTREAM_BURST,
+    UPSTREAM_MAX_RETRIES,
+    UPSTREAM_RETRY_AFTER_MAX,
+    UPSTREAM_RPS
+)
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+# Segmentos de ruta que son IDs (contienen algún dígito)
+_ID_SEGMENT = re.compile(r'/[^/]*\d[^/]*')
+
+
+class UpstreamUnavailable(Exception):
+    """El circuit breaker del endpoint está abierto: no se llama a la API."""
+
+
+def endpoint_key(url):
+    """host + ruta con los IDs sustituidos, p. ej. partnerapi.deere.com/platform/machines/{id}/alerts."""
+    parsed = urlparse(url)
+    return parsed.netloc + _ID_SEGMENT.sub('/{id}', parsed.path)
+
+
+def retry_after_seconds(value):
+    """Segundos indicados por una cabecera Retry-After (número o fecha HTTP), o None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token bucket con ritmo adaptativo (reducción multiplicativa, aumento aditivo)."""
+
+    def __init__(self, rate, burst):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = max(self.max_rate / 16, 0.5)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.throttled = 0
+        self.waited = 0.0
+
+    def reserve(self):
+        """Reserva un token y devuelve los segundos que hay que esperar para usarlo."""
+        if self.max_rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            wait = -self.tokens / self.rate
+            self.waited += wait
+            return wait
+
+    def throttle(self):
+        """La API respondió 429: reducir el ritmo a la mitad y vaciar la ráfaga."""
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+    def succeed(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.01)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rate': round(self.rate, 2),
+                'max_rate': self.max_rate,
+                'burst': self.burst,
+                'throttled': self.throttled,
+                'waited_seconds': round(self.waited, 2)
+            }
+
+
+class CircuitBreaker:
+    """closed → open tras `failures` fallos seguidos → half-open tras `cooldown` segundos."""
+
+    def __init__(self, failures=UPSTREAM_BREAKER_FAILURES, cooldown=UPSTREAM_BREAKER_COOLDOWN):
+        self.failure_threshold = failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return 'half-open'
+        return 'open'
+
+    def allow(self, caller=True):
+        """True si la petición puede salir (en half-open, solo una petición de prueba, la de `caller`)."""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self.probing:
+                self.probing = caller
+                return True
+            return False
+
+    def release(self, caller):
+        """Libera la petición de prueba de `caller` si terminó sin resultado (excepción o cancelación)."""
+        with self._lock:
+            if self.probing is caller:
+                self.probing = False
+
+    def retry_in(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.probing:
+                    self.trips += 1
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def stats(self):
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures, 'trips': self.trips}
+
+
+class UpstreamScheduler:
+    """Aplica rate limit, reintentos y circuit breaker a las llamadas a la API."""
+
+    def __init__(self, rate_limits=None, burst=UPSTREAM_BURST, default_rate=0, max_retries=UPSTREAM_MAX_RETRIES,
+                 backoff_base=UPSTREAM_BACKOFF_BASE, backoff_max=UPSTREAM_BACKOFF_MAX,
+                 retry_after_max=UPSTREAM_RETRY_AFTER_MAX):
+        if rate_limits is None:
+            rate_limits = {
+                urlparse(JOHN_DEERE_API_BASE_URL).netloc: UPSTREAM_RPS,
+                urlparse(JOHN_DEERE_EQUIPMENT_API_URL).netloc: UPSTREAM_RPS
+            }
+        self.burst = burst
+        self.default_rate = default_rate
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self._buckets = {host: TokenBucket(rate, burst) for host, rate in rate_limits.items()}
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.rejected = 0
+
+    def bucket(self, host):
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                # Hosts sin límite configurado (p. ej. el de tokens)
+                bucket = self._buckets[host] = TokenBucket(self.default_rate, self.burst)
+            return bucket
+
+    def breaker(self, endpoint):
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker()
+            return breaker
+
+    def _backoff(self, attempt):
+        # Backoff exponencial con "full jitter"
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _plan(self, method, url, caller):
+        endpoint = endpoint_key(url)
+        breaker = self.breaker(endpoint)
+        if not breaker.allow(caller):
+            with self._lock:
+                self.rejected += 1
+            raise UpstreamUnavailable(
+                f"Circuito abierto para {endpoint} tras fallos repetidos; reintentar en {breaker.retry_in():.0f}s"
+            )
+        retries = self.max_retries if method.upper() in IDEMPOTENT_METHODS else 0
+        return self.bucket(urlparse(url).netloc), breaker, retries
+
+    def _after_response(self, status, headers, bucket, breaker, attempt, retries):
+        """Registra el resultado y devuelve los segundos a esperar antes de reintentar, o None."""
+        if status < 500 and status != 429:
+            # Un 4xx distinto de 429 es un error del cliente, no del endpoint
+            breaker.record_success()
+            bucket.succeed()
+            return None
+        breaker.record_failure()
+        if status == 429:
+            bucket.throttle()
+        if status not in RETRY_STATUSES or attempt >= retries or breaker.state == 'open':
+            return None
+        delay = retry_after_seconds(headers.get('Retry-After'))
+        if delay is None:
+            delay = self._backoff(attempt)
+        elif delay > self.retry_after_max:
+            return None
+        with self._lock:
+            self.retries += 1
+        logger.info(f"Respuesta {status} de la API; reintento {attempt + 1}/{retries} en {delay:.1f}s")
+        return delay
+
+    def _after_error(self, bucket, breaker, attempt, retries, error):
+        breaker.record_failure()
+        if attempt >= retries or breaker.state == 'open':
+            return None
+        with self._lock:
+            self.retries += 1
+        delay = self._backoff(attempt)
+        logger.info(f"Error de conexión con la API ({error}); reintento {attempt + 1}/{retries} en {delay:.1f}s")
+        return delay
+
+    def call(self, method, url, send, connection_errors=(OSError,)):
+        """Ejecuta send() (que hace la petición y devuelve la respuesta) con la política completa."""
+        caller = object()
+        bucket, breaker, retries = self._plan(method, url, caller)
+        attempt = 0
+        # Cualquier otra excepción (o la cancelación) no registra resultado: sin el except
+        # la petición de prueba de half-open quedaría ocupada y el endpoint rechazado para siempre
+        try:
+            while True:
+                wait = bucket.reserve()
+                if wait:
+                    time.sleep(wait)
+                try:
+                    response = send()
+                except connection_errors as e:
+                    delay = self._after_error(bucket, breaker, attempt, retries, e)
+                    if delay is None:
+                        raise
+                else:
+                    delay = self._after_response(response.status_code, response.headers, bucket, breaker, attempt, retries)
+                    if delay is None:
+                        return response
+                    response.close()
+                time.sleep(delay)
+                attempt += 1
+        except BaseException:
+            breaker.release(caller)
+            raise
+
+    async def call_async(self, method, url, send, connection_errors=(OSError,)):
+        """Versión async de call(); send es una función que devuelve una corrutina."""
+        caller = object()
+        bucket, breaker, retries = self._plan(method, url, caller)
+        attempt = 0
+        # Cualquier otra excepción (o la cancelación) no registra resultado: sin el except
+        # la petición de prueba de half-open quedaría ocupada y el endpoint rechazado para siempre
+        try:
+            while True:
+                wait = bucket.reserve()
+                if wait:
+                    await asyncio.sleep(wait)
+                try:
+                    response = await send()
+                except connection_errors as e:
+                    delay = self._after_error(bucket, breaker, attempt, retries, e)
+                    if delay is None:
+                        raise
+                else:
+                    delay = self._after_response(response.status_code, response.headers, bucket, breaker, attempt, retries)
+                    if delay is None:
+                        return response
+                    await response.aclose()
+                await asyncio.sleep(delay)
+                attempt += 1
+        except BaseException:
+            breaker.release(caller)
+            raise
+
+    def stats(self):
+        with self._lock:
+            buckets = dict(self._buckets)
+            breakers = dict(self._breakers)
+            counters = {'retries': self.retries, 'rejected': self.rejected}
+        counters['hosts'] = {host: bucket.stats() for host, bucket in buckets.items()}
+        counters['endpoints'] = {endpoint: breaker.stats() for endpoint, breaker in breakers.items()}
+        return counters
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Devuelve el planificador del proceso."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = UpstreamScheduler()
+    return _scheduler